@@ -9,3 +9,39 @@
 ##############################################################################
 
 verbose = False
+
+# Maximum number of jobs to run in parallel (default: number of cpus)
+jobs = None
+
+# Don't start new jobs while the load average is at or above this value
+max_load = None
+
+# Maximum number of parallel jobs per named resource pool, e.g. {'link': 2}
+pools = {}
+
+# Detect changed sources by their contents rather than their status
+content_hash = False
+
+# Directory of the local object cache, disabled if None
+cache_dir = None
+
+# Size limit of the local object cache in bytes
+cache_size = 5 << 30
+
+# URL of a remote object cache shared over HTTP, disabled if None
+remote_cache = None
+
+# Only read from the remote object cache, e.g. for untrusted builds
+remote_cache_read_only = False
+
+# Workers to distribute compiles to, as (host:port, slots) pairs
+workers = []
+
+# File to write a trace event timeline of the build to, disabled if None
+trace = None
+
+# Report the time spent and work done by PAM itself at the end of the build
+stats = False
+
+# Build all projects with the time-trace feature and report compile times
+time_report = False
@@ -10,11 +10,22 @@
 
 
 import argparse
+import multiprocessing
 import os
 import sys
 import re
 import time
 from build.transform.toolchain import ToolchainRegistry, ToolchainLoader
+from build.transform.graph import BuildGraph
+from build.transform.pybuild import Job
+from build.transform.utils import Pool
+from build.transform.cache import ObjectCache, parse_size
+from build.transform.contenthash import ContentHashes
+from build.transform.distributed import Workers, parse_worker
+from build.transform.statcache import StatCache
+from build.transform.timereport import TimeReport
+from build.transform import stats
+from build.transform import trace
 from build.feature import FeatureLoader
 from build.model import ProjectRegistry, ProjectLoader
 import build
@@ -24,8 +35,11 @@ toolchains_path = os.path.join(os.path.dirname(__file__), os.pardir, "toolchains
 features_path = os.path.join(os.path.dirname(__file__), os.pardir, "features")
 
 # Import toolchains and features
+_load_times = [time.time()]
 ToolchainLoader(toolchains_path).load()
+_load_times.append(time.time())
 FeatureLoader(features_path).load()
+_load_times.append(time.time())
 
 
 def exit(msg):
@@ -49,11 +63,78 @@ available toolchains:
     parser.add_argument('-f', '--file', default='pam.py', help='project file to load (default: pam.py)')
     parser.add_argument('-t', '--toolchain', help='toolchain to use (default: all supported)')
     parser.add_argument('-i', '--inject-toolchain', help='forcibly add a toolchain to all projects')
+    parser.add_argument('-g', '--global-graph', action="store_true", help='build all projects and toolchains as one job graph')
+    parser.add_argument('-j', '--jobs', type=int, help='number of jobs to run in parallel (default: number of cpus)')
+    parser.add_argument('-l', '--max-load', type=float, help='don\'t start new jobs if the load average is at least LOAD')
+    parser.add_argument('-p', '--pool', action="append", default=[], metavar='NAME=DEPTH', help='limit the number of parallel jobs in a resource pool, e.g. link=2')
+    parser.add_argument('--cache', metavar='DIR', default=os.environ.get('PAM_CACHE_DIR'), help='cache compiled objects in DIR (default: $PAM_CACHE_DIR)')
+    parser.add_argument('--cache-size', metavar='SIZE', default='5G', help='size limit of the object cache, e.g. 500M (default: 5G)')
+    parser.add_argument('--remote-cache', metavar='URL', default=os.environ.get('PAM_REMOTE_CACHE'), help='share cached products with an HTTP cache at URL (default: $PAM_REMOTE_CACHE)')
+    parser.add_argument('--remote-cache-read-only', action="store_true", help='never upload to the remote cache')
+    parser.add_argument('-w', '--worker', action="append", default=os.environ.get('PAM_WORKERS', '').split(), metavar='HOST:PORT=SLOTS', help='distribute compiles to a worker, e.g. build1:8000=8 (default: $PAM_WORKERS)')
+    parser.add_argument('--content-hash', action="store_true", help='detect changed sources by their contents, not their timestamps')
+    parser.add_argument('--trace', metavar='FILE', help='write a timeline of the build to FILE, viewable in chrome://tracing or Perfetto')
+    parser.add_argument('--stats', action="store_true", help='report the time spent and work done by pam itself')
+    parser.add_argument('--profile', metavar='FILE', help='write cProfile data of pam itself to FILE')
+    parser.add_argument('--time-report', action="store_true", help='report the headers and translation units that take the longest to compile')
     args = parser.parse_args()
 
     if args.verbose:
         build.verbose = True
 
+    if args.jobs is not None:
+        if args.jobs < 1:
+            exit('invalid number of jobs: {}'.format(args.jobs))
+        build.jobs = args.jobs
+
+    if args.content_hash:
+        build.content_hash = True
+
+    if args.profile:
+        stats.profile(args.profile)
+
+    if args.stats:
+        build.stats = True
+        stats.add("load toolchains", _load_times[1] - _load_times[0])
+        stats.add("load features", _load_times[2] - _load_times[1])
+
+    if args.trace:
+        build.trace = args.trace
+        trace.Trace.shared().complete("load toolchains", "phase", _load_times[0], _load_times[1])
+        trace.Trace.shared().complete("load features", "phase", _load_times[1], _load_times[2])
+
+    if args.time_report:
+        build.time_report = True
+
+    if args.cache:
+        build.cache_dir = os.path.abspath(args.cache)
+        try:
+            build.cache_size = parse_size(args.cache_size)
+        except ValueError:
+            exit("invalid cache size '{}'".format(args.cache_size))
+
+    if args.remote_cache:
+        build.remote_cache = args.remote_cache
+        build.remote_cache_read_only = args.remote_cache_read_only
+
+    for worker in args.worker:
+        try:
+            build.workers.append(parse_worker(worker))
+        except ValueError:
+            exit("invalid worker '{}', expected HOST:PORT=SLOTS".format(worker))
+    if build.workers and build.jobs is None:
+        # Keep the local cores busy while waiting for the workers
+        build.jobs = multiprocessing.cpu_count() + sum(slots for _, slots in build.workers)
+
+    if args.max_load is not None:
+        build.max_load = args.max_load
+
+    for pool in args.pool:
+        name, _, depth = pool.partition('=')
+        if not name or not depth.isdigit() or int(depth) < 1:
+            exit("invalid pool '{}', expected NAME=DEPTH".format(pool))
+        build.pools[name] = int(depth)
+
     if not os.path.exists(args.file):
         exit('file not found: {}'.format(args.file))
 
@@ -63,7 +144,8 @@ available toolchains:
     else:
         args.toolchain = r'.*'
 
-    ProjectLoader(args.file).load()
+    with trace.phase("load projects", file=args.file):
+        ProjectLoader(args.file).load()
 
     if args.inject_toolchain:
         tc = ToolchainRegistry.find(args.inject_toolchain)
@@ -83,6 +165,7 @@ available toolchains:
             except ValueError as e:
                 exit("error: unrecognized project: {}".format(project))
 
+    graph = BuildGraph() if args.global_graph else None
     completed = set()
     for project in projects:
         def _build(project):
@@ -108,12 +191,53 @@ available toolchains:
             completed.add((project, toolchain))
             start_time = time.time()
             print('===== Checking: %s (%s)' % (project.name, toolchain.name if toolchain else "agnostic"))
+            if graph is not None and toolchain is not None:
+                toolchain.schedule(project, graph)
+                return
             if project.transform(toolchain):
                 elapsed = time.time() - start_time
                 print('===== Done: %dm %ds' % (elapsed / 60, elapsed % 60))
 
         if project not in completed:
             _build(project)
+
+    if graph is not None:
+        start_time = time.time()
+        print('===== Building: %d projects' % len(graph.projects))
+        if graph.transform():
+            elapsed = time.time() - start_time
+            print('===== Done: %dm %ds' % (elapsed / 60, elapsed % 60))
+    Pool.shutdown()
+    cache = ObjectCache.shared()
+    if cache:
+        cache.cleanup()
+        print('===== Cache: %d hits, %d misses, %d stored, %d evicted' % (cache.hits, cache.misses, cache.stores, cache.evictions))
+        if cache.remote:
+            remote = cache.remote
+            print('===== Remote cache: %d hits, %d misses, %d uploaded, %d errors' % (remote.hits, remote.misses, remote.uploads, remote.errors))
+    report = TimeReport.shared()
+    if report.projects:
+        lines = report.report()
+        print('===== Compile times: %s' % lines[0])
+        for line in lines[1:]:
+            print(line)
+    workers = Workers.shared()
+    if workers:
+        print('===== Workers: %d compiled remotely, %d locally' % (workers.compiled, workers.fallbacks))
+    if build.verbose:
+        stat_cache = StatCache.shared()
+        print('===== Stat cache: %d hits, %d misses, %d directories' % (stat_cache.hits, stat_cache.misses, stat_cache.scans))
+        print('===== Dirty check: %d jobs, %d digests in %.3fs' % (BuildGraph.checked, Job.hashes, BuildGraph.check_time))
+    if build.stats:
+        report = stats.Stats.shared()
+        report.count("stat calls", StatCache.shared().misses)
+        report.count("directory scans", StatCache.shared().scans)
+        report.count("digests", Job.hashes)
+        if build.content_hash:
+            report.count("files hashed", ContentHashes.shared().hashed)
+        print('===== Stats:')
+        for line in report.report():
+            print(line)
     print("===== Done")
 
 if __name__ == "__main__":
@@ -30,6 +30,22 @@ class MSBuildOptimize:
     MSVC = _MSBuildOptimize()
 
 
+class _MSBuildLTO:
+    def __init__(self):
+        self.modes = {'full': 'UseLinkTimeCodeGeneration', 'thin': 'UseFastLinkTimeCodeGeneration'}
+
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        mode = kwargs.get('mode', 'thin')
+        if mode not in self.modes:
+            raise ValueError('illegal "mode" argument provided to lto feature')
+        cxx_project.config_props.whole_program_optimization = 'true'
+        cxx_project.link.linktimecodegeneration = self.modes[mode]
+
+
+class MSBuildLTO:
+    MSVC = _MSBuildLTO()
+
+
 class MSBuildPlatformToolset:
     def __init__(self, toolset='v140', charset='MultiByte'):
         self.toolset = toolset
@@ -121,3 +137,14 @@ class _MSBuildLinkLibrary(Feature):
 
 class MSBuildLinkLibrary(_MSBuildLinkLibrary):
     pass
+
+
+class _MSBuildPrecompiledHeader(Feature):
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        if 'header' not in kwargs:
+            raise ValueError('no "header" argument provided to precompiled-header feature')
+        cxx_project.add_precompiled_header(kwargs['header'], kwargs.get('sources'))
+
+
+class MSBuildPrecompiledHeader:
+    MSVC = _MSBuildPrecompiledHeader()
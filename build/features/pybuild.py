@@ -9,11 +9,15 @@
 ##############################################################################
 
 
+import build
 from build.feature import Feature
 from build.model import CXXLibrary
+from build.transform import pgo
 from build.transform import pybuild
+from build.transform.timereport import TimeReport
 from build.tools.directory import PyBuildDirectoryCreator
 from os import path
+import multiprocessing
 
 
 class _PyBuildCustomCFlag(Feature):
@@ -168,6 +172,169 @@ class PyBuildLinkLibrary(Feature):
             cxx_project.add_library(lib)
 
 
+class PyBuildPrecompiledHeader(Feature):
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        if 'header' not in kwargs:
+            raise ValueError('no "header" argument provided to precompiled-header feature')
+        cxx_project.add_precompiled_header(kwargs['header'], kwargs.get('sources'))
+
+
+class PyBuildFastLink(Feature):
+    """ Links with a faster linker than the default one, and makes the
+        linker handle less debug info. Split debug info stays in .dwo
+        files written next to the objects, compressed debug info is
+        smaller to read and write. A gdb index spares the debugger from
+        building one on every start. """
+    linkers = ['bfd', 'gold', 'lld', 'mold']
+    debug = [None, 'split', 'compressed']
+
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        linker = kwargs.get('linker', 'lld')
+        if linker not in self.linkers:
+            raise ValueError('illegal "linker" argument provided to fast-link feature')
+        debug = kwargs.get('debug')
+        if debug not in self.debug:
+            raise ValueError('illegal "debug" argument provided to fast-link feature')
+        cxx_project.add_linkflag('-fuse-ld={}'.format(linker))
+
+        if debug == 'split':
+            cxx_project.add_cflag('-gsplit-dwarf')
+            cxx_project.add_cxxflag('-gsplit-dwarf')
+        elif debug == 'compressed':
+            cxx_project.add_cflag('-gz')
+            cxx_project.add_cxxflag('-gz')
+            cxx_project.add_linkflag('-gz')
+
+        if kwargs.get('gdb_index', linker != 'bfd'):
+            if linker == 'bfd':
+                raise ValueError('"gdb_index" argument not supported by bfd in fast-link feature')
+            cxx_project.add_linkflag('-Wl,--gdb-index')
+
+        # The number of threads is left to the linker, a count would
+        # make the command line depend on the machine
+        threads = kwargs.get('threads', True)
+        if threads and linker == 'gold':
+            cxx_project.add_linkflag('-Wl,--threads')
+        elif not threads and linker == 'lld':
+            cxx_project.add_linkflag('-Wl,--threads=1')
+        elif not threads and linker == 'mold':
+            cxx_project.add_linkflag('-Wl,--no-threads')
+
+
+class _PyBuildLTO(Feature):
+    def __init__(self, compile, link, archiver=None, archive=None, jobs=None):
+        super(_PyBuildLTO, self).__init__()
+        self.compile = compile
+        self.link = link
+        self.archiver = archiver
+        self.archive = archive or []
+        self.jobs = jobs
+
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        mode = kwargs.get('mode', 'thin')
+        if mode not in self.compile:
+            raise ValueError('illegal "mode" argument provided to lto feature')
+        for flag in self.compile[mode]:
+            cxx_project.add_cflag(flag)
+            cxx_project.add_cxxflag(flag)
+        for flag in self.archive:
+            cxx_project.add_archiveflag(flag)
+        if self.archiver:
+            cxx_project.set_archiver(self.archiver)
+
+        # The link uses as many threads as there are job slots, and holds
+        # them all while it runs rather than oversubscribing the machine
+        # with the jobs around it. A count given with -j is part of the
+        # command line, the default isn't.
+        jobs = build.jobs or self.jobs
+        cache = path.join(toolchain.attributes.output, 'lto-cache')
+        for flag in self.link[mode]:
+            if '{jobs}' in flag:
+                cxx_project.set_link_threads(build.jobs or multiprocessing.cpu_count())
+                if not jobs:
+                    continue
+            cxx_project.add_linkflag(flag.format(jobs=jobs, cache=cache))
+
+
+class PyBuildLTO:
+    # gcc partitions the program by default, like ThinLTO
+    GNU = _PyBuildLTO(
+        {'full': ['-flto'], 'thin': ['-flto']},
+        {'full': ['-flto', '-flto-partition=one'], 'thin': ['-flto={jobs}']},
+        archiver='gcc-ar', jobs='auto')
+    CLANG = _PyBuildLTO(
+        {'full': ['-flto'], 'thin': ['-flto=thin']},
+        {'full': ['-flto'], 'thin': ['-flto=thin', '-Wl,--thinlto-jobs={jobs}', '-Wl,--thinlto-cache-dir={cache}']},
+        archiver='llvm-ar')
+    # ar and ld64 load libLTO by themselves
+    DARWIN = _PyBuildLTO(
+        {'full': ['-flto'], 'thin': ['-flto=thin']},
+        {'full': ['-flto'], 'thin': ['-flto=thin', '-Wl,-mllvm,-threads={jobs}', '-Wl,-cache_path_lto,{cache}']})
+    MSVC = _PyBuildLTO(
+        {'full': ['/GL'], 'thin': ['/GL']},
+        {'full': ['/LTCG'], 'thin': ['/LTCG:incremental']},
+        archive=['/LTCG'])
+
+
+class _PyBuildPGO(Feature):
+    def __init__(self, instrument, use, merge=None):
+        super(_PyBuildPGO, self).__init__()
+        self.instrument = instrument
+        self.use = use
+        self.merge = merge
+
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        stage = kwargs.get('stage')
+        if stage == 'instrument':
+            profile = pgo.directory(cxx_project)
+            for flag in self.instrument:
+                flag = flag.format(profile=profile)
+                cxx_project.add_cflag(flag)
+                cxx_project.add_cxxflag(flag)
+                cxx_project.add_linkflag(flag)
+        elif stage == 'use':
+            if 'profile' not in kwargs:
+                raise ValueError('no "profile" argument provided to pgo feature')
+            for flag in self.use:
+                flag = flag.format(profile=kwargs['profile'])
+                cxx_project.add_cflag(flag)
+                cxx_project.add_cxxflag(flag)
+        else:
+            raise ValueError('illegal "stage" argument provided to pgo feature')
+
+
+class PyBuildPGO:
+    # gcc writes a .gcda file next to each object, and reads it from there
+    GNU = _PyBuildPGO(
+        ['-fprofile-generate'],
+        ['-fprofile-use', '-fprofile-correction', '-Wno-missing-profile'])
+    CLANG = _PyBuildPGO(
+        ['-fprofile-generate={profile}'],
+        ['-fprofile-use={profile}', '-Wno-profile-instr-unprofiled'],
+        merge='llvm-profdata merge -output={output} {input}')
+    DARWIN = _PyBuildPGO(
+        ['-fprofile-generate={profile}'],
+        ['-fprofile-use={profile}', '-Wno-profile-instr-unprofiled'],
+        merge='xcrun llvm-profdata merge -output={output} {input}')
+
+
+class _PyBuildTimeTrace(Feature):
+    def __init__(self, flag):
+        super(_PyBuildTimeTrace, self).__init__()
+        self.flag = flag
+
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        cxx_project.add_cflag(self.flag)
+        cxx_project.add_cxxflag(self.flag)
+        TimeReport.shared().add(cxx_project)
+
+
+class PyBuildTimeTrace:
+    # Clang writes a trace next to each object, gcc reports to stderr
+    GNU = _PyBuildTimeTrace('-ftime-report')
+    CLANG = _PyBuildTimeTrace('-ftime-trace')
+
+
 class GNUFeatureFactory:
     def configure(self, toolchain):
         toolchain.add_feature(PyBuildCustomCFlag.C89, 'language-c89')
@@ -178,9 +345,22 @@ class GNUFeatureFactory:
         toolchain.add_feature(PyBuildCustomCXXFlag.CXX17, 'language-c++17')
         toolchain.add_feature(PyBuildCustomCXXFlag('-g'), 'debug')
         toolchain.add_feature(PyBuildOptimize.GNU, 'optimize')
+        toolchain.add_feature(PyBuildPrecompiledHeader(), 'precompiled-header')
+        toolchain.add_feature(PyBuildFastLink(), 'fast-link')
+        toolchain.add_feature(PyBuildLTO.GNU, 'lto')
+        toolchain.add_feature(PyBuildPGO.GNU, 'pgo')
+        toolchain.add_feature(PyBuildTimeTrace.GNU, 'time-trace')
         toolchain.add_feature(PyBuildProjectMacros.GNU)
         toolchain.add_feature(PyBuildProjectIncPaths.GNU)
         toolchain.add_feature(PyBuildProjectLibPaths.GNU)
         toolchain.add_feature(PyBuildProjectDeps.GNU)
         toolchain.add_feature(PyBuildProjectLibraries.GNU)
 
+
+class ClangFeatureFactory(GNUFeatureFactory):
+    def configure(self, toolchain):
+        GNUFeatureFactory.configure(self, toolchain)
+        toolchain.add_feature(PyBuildLTO.CLANG, 'lto')
+        toolchain.add_feature(PyBuildPGO.CLANG, 'pgo')
+        toolchain.add_feature(PyBuildTimeTrace.CLANG, 'time-trace')
+
@@ -0,0 +1,23 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+from build.feature import Feature
+from build.transform.xcbuild import StringElement
+import os
+
+
+class XcBuildPrecompiledHeader(Feature):
+    def transform(self, project, cxx_project, toolchain, **kwargs):
+        # Xcode prefixes all sources of a target, 'sources' is ignored
+        if 'header' not in kwargs:
+            raise ValueError('no "header" argument provided to precompiled-header feature')
+        settings = cxx_project.target.config.build_settings
+        settings.append(StringElement('GCC_PREFIX_HEADER', os.path.abspath(kwargs['header'])))
+        settings.append(StringElement('GCC_PRECOMPILE_PREFIX_HEADER', 'YES'))
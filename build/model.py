@@ -10,6 +10,7 @@
 
 
 from build.utils import Loader
+from build.transform import stats
 from build.transform import utils
 import os
 import re
@@ -24,6 +25,7 @@ class _Filtered(object):
     def matches(self, toolchain):
         if self.filter is None:
             return True
+        stats.count("regex")
         return re.search(self.filter, toolchain) is not None
 
 
@@ -61,6 +63,20 @@ class Source(_Filtered):
         return [self]
 
 
+class _Unity(_Filtered):
+    def __init__(self, batch, exclude=None, window=None, filter=None):
+        super(_Unity, self).__init__(filter)
+        self.batch = batch
+        self.exclude = exclude
+        self.window = window
+
+
+class _Training(_Filtered):
+    def __init__(self, command, filter=None):
+        super(_Training, self).__init__(filter)
+        self.command = command
+
+
 class SourceGroup(object):
     """ A collection of source files.
 
@@ -76,6 +92,7 @@ class SourceGroup(object):
         super(SourceGroup, self).__init__()
         self._sources = []
         self.name = name
+        self._unity = None
 
     def add_sources(self, path, regex=r'.*', recurse=False, filter=None, tool=None, files=None, depends=None, **kwargs):
         """ Add sources from **path** to the group. Directories will be enumerated, 
@@ -116,6 +133,7 @@ class SourceGroup(object):
                         all_files = os.listdir(path)
                         all_files = [os.path.join(path, file) for file in all_files]
                 matching_files = [file for file in all_files if re.match(regex, file)]
+                stats.count("regex", len(all_files))
                 self._sources = [Source(source_file, filter, tool, depends, kwargs) for source_file in matching_files]
                 return self._sources
         if not files:
@@ -128,6 +146,25 @@ class SourceGroup(object):
     def sources(self):
         return [source for lazy_source in self._sources for source in lazy_source.sources]
 
+    def use_unity_build(self, batch=16, exclude=None, window=24*3600, filter=None):
+        """ Compile the C and C++ sources of the group in batches of up to
+        **batch** sources, each batch merged into a generated unity source.
+
+        Sources matching the **exclude** regex, for example sources that
+        define conflicting static symbols, are always compiled on their own.
+        So are sources that have been edited in two separate builds within
+        the last **window** seconds, so that editing them again only
+        recompiles the source itself.
+
+        The **filter** regex makes it possible to use unity builds only for
+        specific toolchains. Groups without unity settings of their own use
+        those of the project.
+        """
+        self._unity = _Unity(batch, exclude, window, filter)
+
+    def get_unity(self, toolchain):
+        return self._unity if self._unity and self._unity.matches(toolchain.name) else None
+
 
 class _Macro(_FilteredAndPublished):
     def __init__(self, key, value=None, filter=None, publish=False):
@@ -266,7 +303,7 @@ class CommandGroup(object):
 
     def add_command(self, output, inputs, command, filter=None, **kwargs):
         self.commands.append(
-            _Command(output, inputs, command, filter))
+            _Command(output, inputs, command, filter, **kwargs))
 
 
 class ProjectRegistry(object):
@@ -439,6 +476,25 @@ class CXXExecutable(CXXProject):
     def __init__(self, name):
         """ Initialized a new C++ native executable project called **name** """
         super(CXXExecutable, self).__init__(name)
+        self._training = None
+
+    def use_profile_guided_optimization(self, command, filter=None):
+        """ Optimize the executable using the profile of a training run.
+
+        An instrumented variant of the executable and its dependencies is
+        built into an output directory of its own. The training **command**
+        is then run, with {executable} replaced by the path of the
+        instrumented executable, and the profile data it writes is used
+        to optimize the sources of the executable. The sources are only
+        compiled again when the profile data changes.
+
+        The **filter** regex makes it possible to use profile guided
+        optimization only for specific toolchains.
+        """
+        self._training = _Training(command, filter)
+
+    def get_training(self, toolchain):
+        return self._training if self._training and self._training.matches(toolchain.name) else None
 
 
 
@@ -10,6 +10,13 @@
 
 
 class Tool(object):
+    # Name of the resource pool limiting how many jobs created by
+    # this tool may run in parallel
+    pool = None
+
+    # Whether sources of this tool may be merged into unity sources
+    unity = False
+
     def __init__(self):
         pass
 
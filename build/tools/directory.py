@@ -9,26 +9,27 @@
 ##############################################################################
 
 
+from build.transform import builtin
 from build.transform import pybuild
+from build.transform.statcache import StatCache
 from build.tools import Tool
+from functools import partial
 import platform
-from os import path
 
 
-class Directory(pybuild.Command):
+class Directory(pybuild.Builtin):
+    early = True
+
     def __init__(self, dirname):
-        ignore_error = False
         if platform.system() == "Windows":
             cmdline = "cmd /c if not exist \"{dir}\" mkdir \"{dir}\"".format(dir=dirname)
-            ignore_error = True
         else:
             cmdline = "mkdir -p \"{dir}\"".format(dir=dirname)
         info = ' [MKDIR] {}'.format(dirname)
-        super(Directory, self).__init__(dirname, cmdline, info, ignore_error=ignore_error)
+        super(Directory, self).__init__(dirname, cmdline, partial(builtin.mkdir, dirname), info)
 
-    @property
-    def required(self):
-        return not path.exists(self.product)
+    def outdated(self):
+        return not StatCache.shared().exists(self.product)
 
     @property
     def timestamp(self):
@@ -13,9 +13,10 @@ from build.tools import Tool
 from build.tools.directory import PyBuildDirectoryCreator
 from build.transform import pybuild
 from build.utils import DepfileParser
-from os import path, pathsep, environ
+from os import path, pathsep, environ, remove
 from copy import copy
 from functools import partial
+import hashlib
 
 
 class _ExecutableMixin(object):
@@ -33,8 +34,18 @@ class _ExecutableMixin(object):
 
 def _scan_deps(cxx_project, obj):
     depfile, _ = path.splitext(obj.product)
+    depfile += ".d"
     obj.clear_hash()
-    for dep in DepfileParser(depfile + ".d").dependencies:
+    deps = cxx_project.deps_log.get(obj.product)
+    if obj.completed or deps is None:
+        # Move freshly written depfiles into the deps log, graphs
+        # constructed later load them from there in one read
+        deps = DepfileParser(depfile).dependencies
+        if obj.completed:
+            cxx_project.deps_log.set(obj.product, deps)
+            if path.exists(depfile):
+                remove(depfile)
+    for dep in deps:
         cxx_project.add_source(dep)
         cxx_project.add_dependency(obj.product, dep)
 
@@ -50,8 +61,31 @@ class PyBuildCXXCompiler(_ExecutableMixin, Tool):
     def _product(self, cxx_project, source_file):
         return '{output}/{}{}'.format(source_file, self._output_ext, output=cxx_project.output)
 
-    def _cmdline(self, cxx_project, source_file):
+    @property
+    def unity(self):
+        return self.filetype in ('c', 'c++')
+
+    def _precompiled_header(self, cxx_project, source_file):
+        if self.filetype not in ('c', 'c++'):
+            return None
+        return cxx_project.precompiled_header(source_file)
+
+    def _pch_wrapper(self, cxx_project, header):
+        # The precompiled header is found next to a header including the
+        # real one, gcc falls back to the latter if it can't be used.
+        # Headers of the same name in different directories get their own.
+        digest = hashlib.sha1(path.abspath(header).encode('utf-8')).hexdigest()[:8]
+        return '{output}/pch/{}/{}/{}'.format(self.filetype, digest, path.basename(header), output=cxx_project.output)
+
+    def _flags(self, cxx_project, source_file):
         flags = cxx_project.cflags if self.filetype != 'c++' else cxx_project.cxxflags
+        header = self._precompiled_header(cxx_project, source_file)
+        if header:
+            flags = flags + ['-include', self._pch_wrapper(cxx_project, header), '-Winvalid-pch']
+        return flags
+
+    def _cmdline(self, cxx_project, source_file):
+        flags = self._flags(cxx_project, source_file)
 
         return "{} -x {} {} -MMD -c {} -o {}".format(
             self.executable,
@@ -60,21 +94,104 @@ class PyBuildCXXCompiler(_ExecutableMixin, Tool):
             source_file, 
             self._product(cxx_project, source_file))
 
+    def _preprocess(self, cxx_project, source_file):
+        # Used to look up the object cache, writes the depfile as well
+        if self.filetype == 'assembler':
+            return None
+        flags = self._flags(cxx_project, source_file)
+        product = self._product(cxx_project, source_file)
+
+        return "{} -x {} {} -E {} -MMD -MF {}.d -MT {}".format(
+            self.executable,
+            self.filetype,
+            ' '.join(flags),
+            source_file,
+            path.splitext(product)[0],
+            product)
+
+    def _distribute(self, cxx_project):
+        # Compiles the preprocessed source on a worker, the depfile is
+        # written when preprocessing. Precompiled headers are already
+        # expanded by then.
+        filetypes = {'c': 'cpp-output', 'c++': 'c++-cpp-output'}
+        if self.filetype not in filetypes:
+            return None
+        flags = cxx_project.cflags if self.filetype != 'c++' else cxx_project.cxxflags
+
+        return "{} -x {} {} -c {{input}} -o {{output}}".format(
+            self.executable,
+            filetypes[self.filetype],
+            ' '.join(flags))
+
+    def _outputs(self, cxx_project, source_file):
+        # Split debug info and clang time traces are written next to the
+        # object, named after it
+        if self.filetype not in ('c', 'c++'):
+            return []
+        flags = self._flags(cxx_project, source_file)
+        base = path.splitext(self._product(cxx_project, source_file))[0]
+        return [base + ext for flag, ext in (('-gsplit-dwarf', '.dwo'), ('-ftime-trace', '.json')) if flag in flags]
+
+    def _compiler(self):
+        return "{} --version".format(self.executable)
+
     def _info(self, source_file):
         return ' [{}] {}'.format(self.bare_executable.upper(), source_file)
 
+    def _pch(self, cxx_project, header):
+        wrapper = self._pch_wrapper(cxx_project, header)
+        product = wrapper + '.gch'
+        pch = cxx_project.get_job(product)
+        if pch:
+            return pch
+
+        flags = cxx_project.cflags if self.filetype != 'c++' else cxx_project.cxxflags
+        dir = self._directory(cxx_project, path.dirname(product))
+        text = cxx_project.add_textfile(wrapper, '#include "{}"\n'.format(path.abspath(header)))
+        pch = pybuild.Object(
+            product,
+            "{} -x {}-header {} -MMD -MF {}.d -c {} -o {}".format(
+                self.executable,
+                self.filetype,
+                ' '.join(flags),
+                wrapper,
+                wrapper,
+                product),
+            ' [PCH] {}'.format(header),
+            self.environ)
+        cxx_project.add_source(header)
+        cxx_project.add_job(pch)
+        cxx_project.add_dependency(text.product, dir.product)
+        cxx_project.add_dependency(pch.product, text.product)
+        cxx_project.add_dependency(pch.product, header)
+        cxx_project.add_dependency(pch.product, dir.product)
+
+        # The depfile makes the headers included by header dependencies
+        pch.on_completed = partial(_scan_deps, cxx_project)
+        pch.on_completed(pch)
+
+        return pch
+
     def transform(self, cxx_project, source_file):
         product = self._product(cxx_project, source_file.path)
         dir = self._directory(cxx_project, path.dirname(product))
+        header = self._precompiled_header(cxx_project, source_file.path)
+        pch = self._pch(cxx_project, header) if header else None
         obj =  pybuild.Object(
             product, 
             self._cmdline(cxx_project, source_file.path), 
             self._info(source_file.path),
-            self.environ)
+            self.environ,
+            preprocess=self._preprocess(cxx_project, source_file.path),
+            compiler=self._compiler(),
+            distribute=self._distribute(cxx_project),
+            outputs=self._outputs(cxx_project, source_file.path))
         cxx_project.add_source(source_file.path)
         cxx_project.add_job(obj)
         cxx_project.add_dependency(obj.product, source_file.path)
         cxx_project.add_dependency(obj.product, dir.product)
+        if pch:
+            cxx_project.add_dependency(obj.product, pch.product)
 
         obj.on_completed = partial(_scan_deps, cxx_project)
         obj.on_completed(obj)
@@ -83,6 +200,8 @@ class PyBuildCXXCompiler(_ExecutableMixin, Tool):
 
 
 class PyBuildCXXArchiver(_ExecutableMixin, Tool):
+    pool = 'archive'
+
     def __init__(self, executable='ar', *args, **kwargs):
         super(PyBuildCXXArchiver, self).__init__(executable=executable, *args, **kwargs)
         self._output_pfx = 'lib'
@@ -97,8 +216,20 @@ class PyBuildCXXArchiver(_ExecutableMixin, Tool):
     def _filelist(self, cxx_project):
         return self._product(cxx_project) + ".objects"
 
+    def _executable(self, cxx_project):
+        if cxx_project.archiver:
+            return self.prefix + cxx_project.archiver
+        return self.executable
+
     def _cmdline(self, cxx_project, object_files):
-        return "{} cr {} @{}".format(self.executable, self._product(cxx_project), self._filelist(cxx_project))
+        return "{} cr {}{} @{}".format(
+            self._executable(cxx_project),
+            ''.join(flag + ' ' for flag in cxx_project.archiveflags),
+            self._product(cxx_project),
+            self._filelist(cxx_project))
+
+    def _compiler(self, cxx_project):
+        return "{} --version".format(self._executable(cxx_project))
 
     def _info(self, cxx_project):
         return ' [{}] {}'.format(self.bare_executable.upper(), cxx_project.name)
@@ -110,7 +241,10 @@ class PyBuildCXXArchiver(_ExecutableMixin, Tool):
             product, 
             self._cmdline(cxx_project, object_files), 
             self._info(cxx_project),
-            self.environ)
+            self.environ,
+            pool=self.pool,
+            compiler=self._compiler(cxx_project),
+            inputs=list(object_files))
         filelist = cxx_project.add_filelist(self._filelist(cxx_project), object_files)
         cxx_project.add_job(library)
         cxx_project.add_dependency(library.product, dir.product)
@@ -126,6 +260,8 @@ class PyBuildCXXArchiver(_ExecutableMixin, Tool):
 
 
 class PyBuildCXXLinker(_ExecutableMixin, Tool):
+    pool = 'link'
+
     def __init__(self, executable='g++', *args, **kwargs):
         super(PyBuildCXXLinker, self).__init__(executable=executable, *args, **kwargs)
         self._output_ext = ''
@@ -152,17 +288,40 @@ class PyBuildCXXLinker(_ExecutableMixin, Tool):
             ' '.join(libpaths),
             ' '.join(libraries))
 
+    def _compiler(self):
+        return "{} --version".format(self.executable)
+
+    def _own_libraries(self, cxx_project):
+        # The archives and shared objects that -l may pick from our own
+        # output
+        external = set(cxx_project.external_libraries)
+        output = cxx_project.toolchain.attributes.output
+        return [path.join(output, lib, 'lib{}{}'.format(lib, ext))
+                for lib in cxx_project.libraries if lib not in external for ext in ('.a', '.so')]
+
+    def _libraries(self, cxx_project):
+        # Other libraries are looked up on the library path and aren't
+        # tracked, links using them are never cached
+        if cxx_project.external_libraries or any(flag.startswith('-l') for flag in cxx_project.linkflags):
+            return None
+        return self._own_libraries(cxx_project)
+
     def _info(self, cxx_project):
         return ' [{}] {}'.format(self.bare_executable.upper(), cxx_project.name)
 
     def transform(self, project, cxx_project, object_files):
         product = self._product(cxx_project)
         dir = self._directory(cxx_project, path.dirname(product))
+        libraries = self._libraries(cxx_project)
         executable = pybuild.Object(
             product, 
             self._cmdline(project, cxx_project, object_files), 
             self._info(cxx_project),
-            self.environ)
+            self.environ,
+            pool=self.pool,
+            threads=cxx_project.link_threads,
+            compiler=self._compiler(),
+            inputs=list(object_files) + libraries if libraries is not None else None)
         filelist = cxx_project.add_filelist(self._filelist(cxx_project), object_files)
         cxx_project.add_job(executable)
         cxx_project.add_dependency(executable.product, dir.product)
@@ -170,6 +329,12 @@ class PyBuildCXXLinker(_ExecutableMixin, Tool):
         cxx_project.add_dependency(filelist.product, dir.product)
         for obj in object_files:
             cxx_project.add_dependency(executable.product, obj)
+        # Relinked when the archive of a dependency changes
+        for library in self._own_libraries(cxx_project):
+            if not library.endswith('.a'):
+                continue
+            cxx_project.add_source(library)
+            cxx_project.add_dependency(executable.product, library)
 
         executable.on_completed = partial(_scan_deps, cxx_project)
         executable.on_completed(executable)
@@ -13,6 +13,7 @@ from build.tools import Tool
 from build.tools.directory import PyBuildDirectoryCreator
 from build.transform import msbuild 
 from build.transform import pybuild
+import os
 from os import path
 
 
@@ -25,9 +26,32 @@ class MSBuildCSCompiler(Tool):
 
 
 class MSBuildCXXCompiler(Tool):
+    unity = True
+
     def __init__(self, cxx=True):
         self.cxx = cxx
         
+    @staticmethod
+    def _use_pch(cl, header, mode):
+        cl.precompiledheader = mode
+        cl.precompiledheaderfile = header
+        cl.precompiledheaderoutputfile = "$(IntDir){}.pch".format(path.basename(header))
+        cl.forcedincludefiles = header
+
+    def _pch(self, cxx_project, ig, header):
+        # The precompiled header is created by compiling an empty source,
+        # it's force included into that source just like all others
+        header = path.abspath(header)
+        source = path.join(cxx_project.output, "{}.cpp".format(path.basename(header)))
+        if source not in cxx_project.pch_sources:
+            if not path.exists(cxx_project.output):
+                os.makedirs(cxx_project.output)
+            with open(source, "w") as f:
+                f.write("// Creates the precompiled header {}\n".format(header))
+            MSBuildCXXCompiler._use_pch(ig.create_clcompile(source), header, "Create")
+            cxx_project.pch_sources.append(source)
+        return header
+
     def transform(self, cxx_project, sources):
         ig = cxx_project.create_item_group()
         for source in sources:
@@ -35,6 +59,10 @@ class MSBuildCXXCompiler(Tool):
             if not self.cxx:
                 cl.compileas = "CompileAsC"
                 cl.compileaswinrt = "false"
+            # Only C++ sources share the precompiled header
+            header = cxx_project.precompiled_header(source.path) if self.cxx else None
+            if header:
+                MSBuildCXXCompiler._use_pch(cl, self._pch(cxx_project, ig, header), "Use")
         return ig
 
 
@@ -89,6 +117,8 @@ class MSBuildAppxManifest(Tool):
 
 
 class PyBuildCXXCompiler(Tool):
+    unity = True
+
     def __init__(self, cxx=False, env=None):
         self._executable = "cl.exe"
         self._output_ext = ".obj"
@@ -111,6 +141,20 @@ class PyBuildCXXCompiler(Tool):
             source_file, 
             self._product(cxx_project, source_file))
 
+    def _preprocess(self, cxx_project, source_file):
+        # Used to look up the object cache
+        flags = cxx_project.cflags if not self._cxx else cxx_project.cxxflags
+
+        return "{} /nologo {} /E /T{}{}".format(
+            self._executable,
+            ' '.join(flags),
+            'p' if self._cxx else 'c',
+            source_file)
+
+    def _compiler(self):
+        # cl.exe prints its version banner when run without arguments
+        return self._executable
+
     def _info(self, source_file):
         return ' [{}] {}'.format(self._executable.upper(), source_file)
 
@@ -121,7 +165,9 @@ class PyBuildCXXCompiler(Tool):
             product, 
             self._cmdline(cxx_project, source_file.path), 
             self._info(source_file.path),
-            self._env)
+            self._env,
+            preprocess=self._preprocess(cxx_project, source_file.path),
+            compiler=self._compiler())
         cxx_project.add_source(source_file.path)
         cxx_project.add_job(obj)
         cxx_project.add_dependency(obj.product, source_file.path)
@@ -130,6 +176,8 @@ class PyBuildCXXCompiler(Tool):
 
 
 class PyBuildCXXArchiver(Tool):
+    pool = 'archive'
+
     def __init__(self, env=None):
         self._executable = 'lib.exe'
         self._output_pfx = ''
@@ -146,8 +194,9 @@ class PyBuildCXXArchiver(Tool):
         return self._product(cxx_project) + ".objects"
 
     def _cmdline(self, cxx_project, object_files):
-        return "{} /nologo /out:{} @{}".format(
+        return "{} /nologo {}/out:{} @{}".format(
             self._executable,
+            ''.join(flag + ' ' for flag in cxx_project.archiveflags),
             self._product(cxx_project), 
             self._filelist(cxx_project))
 
@@ -161,7 +210,10 @@ class PyBuildCXXArchiver(Tool):
             product, 
             self._cmdline(cxx_project, object_files), 
             self._info(cxx_project),
-            self._env)
+            self._env,
+            pool=self.pool,
+            compiler=self._executable,
+            inputs=list(object_files))
         filelist = cxx_project.add_filelist(self._filelist(cxx_project), object_files)
         cxx_project.add_job(library)
         cxx_project.add_dependency(library.product, dir.product)
@@ -173,6 +225,8 @@ class PyBuildCXXArchiver(Tool):
 
 
 class PyBuildCXXLinker(Tool):
+    pool = 'link'
+
     def __init__(self, env=None):
         self._executable = 'link.exe'
         self._output_ext = '.exe'
@@ -201,17 +255,33 @@ class PyBuildCXXLinker(Tool):
             self._filelist(project, cxx_project),
             self._product(project, cxx_project))
 
+    def _own_libraries(self, cxx_project):
+        external = set(cxx_project.external_libraries)
+        output = cxx_project.toolchain.attributes.output
+        return [path.join(output, lib, '{}.lib'.format(lib)) for lib in cxx_project.libraries if lib not in external]
+
+    def _libraries(self, cxx_project):
+        # Links using libraries from the library path aren't cached
+        if cxx_project.external_libraries or any(flag.lower().endswith('.lib') for flag in cxx_project.linkflags):
+            return None
+        return self._own_libraries(cxx_project)
+
     def _info(self, cxx_project):
         return ' [{}] {}'.format(self._executable.upper(), cxx_project.name)
 
     def transform(self, project, cxx_project, object_files):
         product = self._product(project, cxx_project)
         dir = self._directory(cxx_project, path.dirname(product))
+        libraries = self._libraries(cxx_project)
         executable = pybuild.Object(
             product, 
             self._cmdline(project, cxx_project, object_files), 
             self._info(cxx_project),
-            self._env)
+            self._env,
+            pool=self.pool,
+            threads=cxx_project.link_threads,
+            compiler=self._executable,
+            inputs=list(object_files) + libraries if libraries is not None else None)
         filelist = cxx_project.add_filelist(self._filelist(project, cxx_project), object_files)
         cxx_project.add_job(executable)                            
         cxx_project.add_dependency(executable.product, dir.product)
@@ -219,5 +289,9 @@ class PyBuildCXXLinker(Tool):
         cxx_project.add_dependency(filelist.product, dir.product)
         for obj in object_files:
             cxx_project.add_dependency(executable.product, obj)
+        # Relinked when a library of a dependency changes
+        for library in self._own_libraries(cxx_project):
+            cxx_project.add_source(library)
+            cxx_project.add_dependency(executable.product, library)
         return executable
 
@@ -0,0 +1,52 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform.recordlog import RecordLog
+import os
+
+
+class BuildLog(RecordLog):
+    """ The hashes of all jobs built into a toolchain output directory.
+
+        The log is loaded once into memory. New hashes are appended to
+        the file in batches, each batch followed by a single fsync.
+    """
+    filename = ".pam_log"
+    header = "# pam log v1\n"
+    stale = 3
+    batch = 256
+    sync = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        super(BuildLog, self).__init__(os.path.join(directory, BuildLog.filename))
+
+    @classmethod
+    def open(cls, directory):
+        """ Returns the log of an output directory, loading it on first use. """
+        return super(BuildLog, cls).open(os.path.normpath(directory))
+
+    def _parse(self, line):
+        digest, sep, product = line.partition("\t")
+        if not sep:
+            raise ValueError(line)
+        return product, digest
+
+    def _format(self, product, digest):
+        return "{}\t{}\n".format(digest, product)
+
+    def get(self, product):
+        return self._entries.get(product)
+
+    def set(self, product, digest):
+        with self._lock:
+            if self._entries.get(product) != digest:
+                self._update(product, digest)
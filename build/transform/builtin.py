@@ -0,0 +1,57 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform import process
+from functools import partial
+import errno
+import os
+import shutil
+
+
+def mkdir(dirname):
+    """ Creates dirname and its parents, unless it already exists. """
+    try:
+        os.makedirs(dirname)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(dirname):
+            raise
+
+
+def copy(source, destination):
+    """ Copies source to destination, along with its permissions. """
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+    shutil.copy(source, destination)
+
+
+def stamp(filename):
+    """ Creates filename, or updates its modification time. """
+    with open(filename, "a"):
+        pass
+    os.utime(filename, None)
+
+
+def parse(cmdline):
+    """ Returns an action doing the same as cmdline, or None if cmdline
+        isn't one of the simple mkdir, cp and touch commands. """
+    args = process.split(cmdline) if cmdline else None
+    if not args or isinstance(args, str):
+        return None
+    program = args[0]
+    options = [arg for arg in args[1:] if arg.startswith('-')]
+    operands = [arg for arg in args[1:] if not arg.startswith('-')]
+    if program == 'mkdir' and set(options) <= set(['-p']) and len(operands) == 1:
+        return partial(mkdir, operands[0])
+    if program == 'cp' and set(options) <= set(['-f']) and len(operands) == 2:
+        return partial(copy, operands[0], operands[1])
+    if program == 'touch' and not options and len(operands) == 1:
+        return partial(stamp, operands[0])
+    return None
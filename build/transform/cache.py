@@ -0,0 +1,349 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+from build.transform import utils
+from Queue import Queue
+import errno
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+    from urllib2 import urlopen, Request, HTTPError, URLError
+except ImportError:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError, URLError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# ioctl cloning a file on copy-on-write file systems, Linux only
+FICLONE = 0x40049409
+
+# Permissions kept on cached files, never setuid, setgid or sticky
+_MODE = 0o755
+
+# Names of the files in an entry, those of Object._files and diagnostics
+_NAMES = re.compile(r"(object|output\d+|diagnostics)\Z")
+
+
+def valid_name(name):
+    """ Returns True if name may be a file of a cache entry. Names from a
+        remote cache are never trusted to stay within the entry. """
+    if "/" in name or os.sep in name or ".." in name or os.path.isabs(name):
+        return False
+    return _NAMES.match(name) is not None
+
+
+def clone(source, destination):
+    """ Makes destination a hardlink or reflink of source, or a copy when
+        neither is possible. """
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return
+    except (OSError, AttributeError):
+        pass
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except (IOError, OSError):
+            pass
+    shutil.copyfile(source, destination)
+
+
+def parse_size(size):
+    """ Parses a size such as 500M or 5G into bytes. """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    size = str(size).strip().upper()
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def pack(files):
+    """ Packs a mapping from name to (mode, contents) into a compressed
+        blob. """
+    data = []
+    for name, (mode, contents) in sorted(files.items()):
+        name = name.encode("utf-8")
+        data.append(struct.pack("<III", mode, len(name), len(contents)))
+        data.append(name)
+        data.append(contents)
+    return zlib.compress(b"".join(data))
+
+
+def unpack(blob):
+    """ Unpacks a blob created by pack. """
+    data = zlib.decompress(blob)
+    files = {}
+    offset = 0
+    while offset < len(data):
+        mode, name_size, size = struct.unpack_from("<III", data, offset)
+        offset += 12
+        name = data[offset:offset + name_size].decode("utf-8")
+        offset += name_size
+        if not valid_name(name):
+            raise ValueError("illegal name in cache entry: {!r}".format(name))
+        files[str(name)] = (mode, data[offset:offset + size])
+        offset += size
+        if offset > len(data):
+            raise ValueError("truncated cache entry")
+    return files
+
+
+class RemoteCache(object):
+    """ A shared cache spoken to over HTTP. Entries are compressed blobs,
+        fetched with GET and stored with PUT on <url>/<key>. Uploads are
+        made by a background thread, so that they never hold up the
+        build. A read-only remote cache is never written to. """
+
+    def __init__(self, url, read_only=False, timeout=30):
+        super(RemoteCache, self).__init__()
+        self.url = url.rstrip("/")
+        self.read_only = read_only
+        self.timeout = timeout
+        self._uploads = Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        """ Returns the blob stored for key, or None. """
+        try:
+            response = urlopen("{}/{}".format(self.url, key), timeout=self.timeout)
+            try:
+                blob = response.read()
+            finally:
+                response.close()
+        except HTTPError as e:
+            self._count("misses" if e.code == 404 else "errors")
+            return None
+        except (URLError, IOError, OSError):
+            self._count("errors")
+            return None
+        self._count("hits")
+        return blob
+
+    def put(self, key, entry):
+        """ Queues the upload of a local cache entry. """
+        if self.read_only:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._upload)
+                self._thread.daemon = True
+                self._thread.start()
+        self._uploads.put((key, entry))
+
+    def _upload(self):
+        while True:
+            key, entry = self._uploads.get()
+            try:
+                files = {}
+                for name in os.listdir(entry):
+                    filename = os.path.join(entry, name)
+                    with open(filename, "rb") as f:
+                        files[name] = (os.stat(filename).st_mode & _MODE, f.read())
+                request = Request("{}/{}".format(self.url, key), data=pack(files),
+                                  headers={"Content-Type": "application/octet-stream"})
+                request.get_method = lambda: "PUT"
+                urlopen(request, timeout=self.timeout).close()
+                self._count("uploads")
+            except (URLError, IOError, OSError, ValueError):
+                self._count("errors")
+            finally:
+                self._uploads.task_done()
+
+    def wait(self):
+        """ Waits for queued uploads to finish. """
+        self._uploads.join()
+
+
+class ObjectCache(object):
+    """ A local, content addressed cache of build products.
+
+        Each entry is a directory named by its key, holding the cached
+        files. An entry's modification time is updated whenever it is
+        used, and the least recently used entries are evicted once the
+        cache grows beyond its size limit. Cached files are materialized
+        as hardlinks or reflinks, the compiler must therefore never write
+        to an existing product in place.
+
+        A remote cache may be put behind the local one. Remote hits are
+        added to the local cache and new local entries are uploaded.
+    """
+    _shared = None
+    _identities = {}
+    _identities_lock = threading.Lock()
+
+    def __init__(self, directory, max_size, remote=None):
+        super(ObjectCache, self).__init__()
+        self.directory = directory
+        self.max_size = max_size
+        self.remote = remote
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.downloads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def shared():
+        """ Returns the cache configured for this build, or None. """
+        if ObjectCache._shared is None and (build.cache_dir or build.remote_cache):
+            remote = None
+            if build.remote_cache:
+                remote = RemoteCache(build.remote_cache, build.remote_cache_read_only)
+            directory = build.cache_dir or os.path.abspath(os.path.join("output", ".cache"))
+            ObjectCache._shared = ObjectCache(directory, build.cache_size, remote)
+        return ObjectCache._shared
+
+    @staticmethod
+    def identity(cmdline, env=None):
+        """ Returns the output of a command identifying a compiler, such
+            as 'gcc --version'. Each command is only run once. """
+        with ObjectCache._identities_lock:
+            identity = ObjectCache._identities.get(cmdline)
+            if identity is None:
+                _, stdout, stderr = utils.capture(cmdline, env) if cmdline else (0, "", "")
+                identity = ObjectCache._identities[cmdline] = stdout + stderr
+            return identity
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key, files):
+        """ Materializes the cached files of key, a mapping from name in
+            the cache entry to destination path. Returns True on a hit. """
+        entry = self._entry(key)
+        if self.remote and not os.path.exists(entry):
+            self._fetch_remote(key)
+        try:
+            # Fails on a miss, before any destination is touched
+            os.utime(entry, None)
+            for name, filename in files.items():
+                clone(os.path.join(entry, name), filename)
+        except (IOError, OSError):
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def _fetch_remote(self, key):
+        blob = self.remote.get(key)
+        if blob is None:
+            return
+        try:
+            files = unpack(blob)
+        except (ValueError, struct.error, zlib.error):
+            # Corrupt or hostile entries are thrown away
+            return
+        if self._add(key, {}, dict((name, contents) for name, (_, contents) in files.items()),
+                     dict((name, mode & _MODE) for name, (mode, _) in files.items())):
+            with self._lock:
+                self.downloads += 1
+
+    def read(self, key, name):
+        """ Returns the contents of a cached file, or None. """
+        try:
+            with open(os.path.join(self._entry(key), name), "rb") as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def store(self, key, files, data=None):
+        """ Adds an entry, with files a mapping from name in the entry to
+            source path and data a mapping from name to contents. """
+        if self._add(key, files, data):
+            with self._lock:
+                self.stores += 1
+            if self.remote:
+                self.remote.put(key, self._entry(key))
+
+    def _add(self, key, files, data=None, modes=None):
+        entry = self._entry(key)
+        names = list(files) + list(data or {}) + list(modes or {})
+        if os.path.exists(entry) or not all(valid_name(name) for name in names):
+            return False
+        parent = os.path.dirname(entry)
+        try:
+            if not os.path.exists(parent):
+                os.makedirs(parent)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Populate a temporary directory that is renamed into place, so
+        # that concurrent builds never see partial entries
+        tmp = tempfile.mkdtemp(dir=parent)
+        try:
+            for name, filename in files.items():
+                clone(filename, os.path.join(tmp, name))
+            for name, contents in (data or {}).items():
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(contents)
+            for name, mode in (modes or {}).items():
+                os.chmod(os.path.join(tmp, name), mode & _MODE)
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    def cleanup(self):
+        """ Finishes uploads and evicts the least recently used entries
+            until the cache fits within its size limit. """
+        if self.remote:
+            self.remote.wait()
+        if not (self.stores or self.downloads) or not os.path.exists(self.directory):
+            return
+        entries = []
+        total = 0
+        for prefix in os.listdir(self.directory):
+            parent = os.path.join(self.directory, prefix)
+            if not os.path.isdir(parent):
+                continue
+            for key in os.listdir(parent):
+                entry = os.path.join(parent, key)
+                try:
+                    size = sum(os.stat(os.path.join(entry, name)).st_size for name in os.listdir(entry))
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    continue
+                total += size
+        entries.sort()
+        for mtime, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self.evictions += 1
@@ -0,0 +1,109 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+from build.transform.recordlog import RecordLog
+import hashlib
+import multiprocessing
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+
+class ContentHashes(RecordLog):
+    """ Digests of file contents, cached by path, inode, mtime and size.
+
+        A file is only read again when its fingerprint changes, and even
+        then its digest may turn out unchanged, e.g. after switching
+        branches back and forth. Fingerprints are appended to a plain
+        text table.
+    """
+    # Coarsest modification time resolution of the file systems, in seconds
+    granularity = 2.0
+
+    # Files of at least this many bytes are hashed in parallel by prefetch
+    large = 256 * 1024
+    chunk = 1024 * 1024
+
+    _shared = None
+
+    def __init__(self, filename):
+        self.hashed = 0
+        super(ContentHashes, self).__init__(filename)
+
+    @staticmethod
+    def shared():
+        if ContentHashes._shared is None:
+            ContentHashes._shared = ContentHashes.open(os.path.join("output", ".content_hashes"))
+        return ContentHashes._shared
+
+    @staticmethod
+    def _fingerprint(st):
+        return (st.st_ino, repr(st.st_mtime), st.st_size)
+
+    def _parse(self, line):
+        filename, ino, mtime, size, digest = line.rsplit("\t", 4)
+        return filename, ((int(ino), mtime, int(size)), digest)
+
+    def _format(self, filename, entry):
+        fingerprint, digest = entry
+        return "{}\t{}\t{}\t{}\t{}\n".format(filename, fingerprint[0], fingerprint[1], fingerprint[2], digest)
+
+    def _hash(self, filename):
+        m = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for data in iter(lambda: f.read(ContentHashes.chunk), b""):
+                m.update(data)
+        return m.hexdigest()
+
+    def _cached(self, filename, st):
+        entry = self._entries.get(filename)
+        if entry and entry[0] == ContentHashes._fingerprint(st):
+            return entry[1]
+        return None
+
+    def _store(self, filename, st, digest, start):
+        with self._lock:
+            self.hashed += 1
+            # A file modified within a timestamp tick of being hashed may
+            # be written again without its fingerprint changing, its
+            # digest isn't kept until it is older
+            if st.st_mtime >= start - ContentHashes.granularity:
+                return
+            self._update(filename, (ContentHashes._fingerprint(st), digest))
+
+    def digest(self, filename, st):
+        """ Returns the digest of the contents of filename, given its
+            current status. """
+        digest = self._cached(filename, st)
+        if digest is None:
+            start = time.time()
+            digest = self._hash(filename)
+            self._store(filename, st, digest, start)
+        return digest
+
+    def prefetch(self, files):
+        """ Hashes those of the (filename, status) pairs that are large and
+            not cached, in parallel. """
+        files = [(filename, st) for filename, st in files
+                 if st is not None and st.st_size >= ContentHashes.large
+                 and self._cached(filename, st) is None]
+        if len(files) < 2:
+            return
+        start = time.time()
+        pool = ThreadPool(min(len(files), build.jobs or multiprocessing.cpu_count()))
+        try:
+            digests = pool.map(lambda item: self._hash(item[0]), files)
+        finally:
+            pool.close()
+            pool.join()
+        for (filename, st), digest in zip(files, digests):
+            self._store(filename, st, digest, start)
@@ -0,0 +1,103 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform.recordlog import RecordLog
+import os
+import struct
+
+
+class DepsLog(RecordLog):
+    """ The header dependencies of all objects built into a toolchain
+        output directory, as captured from their depfiles.
+
+        The binary log is a sequence of records, each starting with a
+        record type and payload size. A path record assigns the next id
+        to a path, a deps record lists the path ids of an object and its
+        dependencies. The whole log is read in one go and the last deps
+        record of an object wins.
+    """
+    filename = ".pam_deps"
+    header = b"# pam deps v1\n"
+    binary = True
+    stale = 3
+    batch = 256
+    sync = True
+
+    PATH = 0
+    DEPS = 1
+
+    _record = struct.Struct("<II")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._ids = {}
+        self._paths = []
+        super(DepsLog, self).__init__(os.path.join(directory, DepsLog.filename))
+
+    @classmethod
+    def open(cls, directory):
+        """ Returns the log of an output directory, loading it on first use. """
+        return super(DepsLog, cls).open(os.path.normpath(directory))
+
+    def _read(self, data):
+        offset = 0
+        records = []
+        while offset + DepsLog._record.size <= len(data):
+            kind, size = DepsLog._record.unpack_from(data, offset)
+            offset += DepsLog._record.size
+            if offset + size > len(data):
+                break
+            if kind == DepsLog.PATH:
+                path = data[offset:offset + size]
+                if not isinstance(path, str):
+                    path = path.decode("utf-8")
+                self._ids[path] = len(self._paths)
+                self._paths.append(path)
+            elif kind == DepsLog.DEPS:
+                ids = struct.unpack_from("<{}I".format(size // 4), data, offset)
+                try:
+                    records.append((self._paths[ids[0]], [self._paths[id] for id in ids[1:]]))
+                except IndexError:
+                    break
+            offset += size
+        # A partial record is left by an interrupted write
+        return records, offset == len(data)
+
+    def _compact(self):
+        self._ids = {}
+        self._paths = []
+        super(DepsLog, self)._compact()
+
+    def get(self, product):
+        return self._entries.get(product)
+
+    def set(self, product, deps):
+        with self._lock:
+            if self._entries.get(product) != deps:
+                self._update(product, deps)
+
+    def _id(self, path, out):
+        id = self._ids.get(path)
+        if id is None:
+            id = self._ids[path] = len(self._paths)
+            self._paths.append(path)
+            encoded = path if isinstance(path, bytes) else path.encode("utf-8")
+            out.append(DepsLog._record.pack(DepsLog.PATH, len(encoded)))
+            out.append(encoded)
+        return id
+
+    def _write(self, f, records):
+        out = []
+        for product, deps in records:
+            ids = [self._id(path, out) for path in [product] + deps]
+            out.append(DepsLog._record.pack(DepsLog.DEPS, 4 * len(ids)))
+            out.append(struct.pack("<{}I".format(len(ids)), *ids))
+        f.write(b"".join(out))
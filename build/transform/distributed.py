@@ -0,0 +1,188 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+from build.transform import utils
+from collections import OrderedDict
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import zlib
+
+try:
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+    from SocketServer import ThreadingMixIn
+    from xmlrpclib import Binary, ServerProxy, Error
+except ImportError:
+    from xmlrpc.server import SimpleXMLRPCServer
+    from socketserver import ThreadingMixIn
+    from xmlrpc.client import Binary, ServerProxy, Error
+
+
+# Exit codes of a shell that couldn't execute, or find, the command
+_NOT_RUN = (126, 127)
+
+
+def parse_worker(worker):
+    """ Parses a worker such as host:8000=4, a host and port with an
+        optional number of slots. """
+    address, _, slots = worker.partition('=')
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit() or (slots and not slots.isdigit()) or slots == '0':
+        raise ValueError(worker)
+    return address, int(slots or 1)
+
+
+class WorkerServer(ThreadingMixIn, SimpleXMLRPCServer):
+    """ Compiles preprocessed sources sent by other machines.
+
+        A worker runs any command line it is given, it must therefore
+        only be reachable from trusted machines. It listens on loopback
+        unless given another host. Compiles beyond the number of slots
+        wait for a slot to become free.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, slots=None, host="127.0.0.1"):
+        SimpleXMLRPCServer.__init__(self, (host, port), logRequests=False, allow_none=True)
+        self.slots = slots or multiprocessing.cpu_count()
+        self._slots = threading.Semaphore(self.slots)
+        self.compiled = 0
+        self.register_function(self.compile, "compile")
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def compile(self, cmdline, source):
+        """ Compiles a preprocessed source, given a command line with
+            {input} and {output} placeholders. Returns the exit code,
+            the diagnostics and the product. The exit code is None when
+            this worker can't run the compile, e.g. the compiler isn't
+            installed here, as opposed to the compiler failing on it. """
+        with self._slots:
+            tmp = tempfile.mkdtemp()
+            try:
+                input = os.path.join(tmp, "source")
+                output = os.path.join(tmp, "product")
+                with open(input, "wb") as f:
+                    f.write(zlib.decompress(source.data))
+                try:
+                    rc, stdout, stderr = utils.capture(cmdline.replace("{input}", input).replace("{output}", output))
+                except OSError as e:
+                    return None, str(e), Binary(zlib.compress(b""))
+                # The shell couldn't find or execute the compiler
+                if rc in _NOT_RUN:
+                    return None, (stdout + stderr).decode("utf-8", "replace"), Binary(zlib.compress(b""))
+                data = b""
+                if rc == 0:
+                    if not os.path.exists(output):
+                        return None, "no product written", Binary(zlib.compress(b""))
+                    with open(output, "rb") as f:
+                        data = f.read()
+                self.compiled += 1
+                return rc, (stdout + stderr).decode("utf-8", "replace"), Binary(zlib.compress(data))
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+
+class Workers(object):
+    """ The static list of workers compiles are distributed to.
+
+        Each compile takes a free slot on the worker with the most free
+        slots, the first one listed on a tie. When all slots are busy, or a worker can't be reached,
+        the compile is made locally instead. An unreachable worker isn't
+        tried again during the build. A worker that can't run a compile,
+        e.g. because it lacks the compiler, has it made locally as well,
+        while failures of the compiler itself are the job's.
+    """
+    _shared = None
+
+    def __init__(self, workers):
+        super(Workers, self).__init__()
+        self._free = OrderedDict(workers)
+        self._lock = threading.Lock()
+        self.compiled = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def shared():
+        """ Returns the workers configured for this build, or None. """
+        if Workers._shared is None and build.workers:
+            Workers._shared = Workers(build.workers)
+        return Workers._shared
+
+    @property
+    def slots(self):
+        return sum(self._free.values())
+
+    def _acquire(self):
+        with self._lock:
+            if not self._free:
+                return None
+            address = max(self._free, key=lambda address: self._free[address])
+            if self._free[address] <= 0:
+                return None
+            self._free[address] -= 1
+            return address
+
+    def _release(self, address, available=True):
+        with self._lock:
+            if not available:
+                self._free.pop(address, None)
+            elif address in self._free:
+                self._free[address] += 1
+
+    def compile(self, cmdline, source):
+        """ Compiles a preprocessed source on a worker. Returns the exit
+            code, the diagnostics and the product, or None if the compile
+            must be made locally. """
+        address = self._acquire()
+        if address is None:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        try:
+            proxy = ServerProxy("http://{}".format(address), allow_none=True)
+            rc, diagnostics, data = proxy.compile(cmdline, Binary(zlib.compress(source)))
+        except (Error, socket.error, IOError):
+            self._release(address, available=False)
+            utils.print_locked("worker {} unavailable, compiling locally", address)
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        self._release(address)
+        if rc is None:
+            utils.print_locked("worker {} can't compile, compiling locally: {}", address, diagnostics.strip())
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        with self._lock:
+            self.compiled += 1
+        return rc, diagnostics, zlib.decompress(data.data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve distributed compiles")
+    parser.add_argument('-p', '--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on, e.g. 0.0.0.0 for all interfaces (default: 127.0.0.1). '
+                             'Anyone who can reach it can run commands on this machine')
+    parser.add_argument('-s', '--slots', type=int, help='number of parallel compiles (default: number of cpus)')
+    args = parser.parse_args()
+
+    server = WorkerServer(args.port, args.slots, args.host)
+    print("Serving {} slots on {} port {}".format(server.slots, server.server_address[0], server.port))
+    server.serve_forever()
@@ -0,0 +1,423 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+from build.transform import stats
+from build.transform import trace
+from build.transform import utils
+from build.transform.contenthash import ContentHashes
+from build.transform.history import History
+from build.transform.recordlog import RecordLog
+from build.transform.statcache import StatCache
+from collections import OrderedDict, deque
+from Queue import Queue
+import heapq
+import itertools
+import os
+import sys
+import time
+
+
+class Scheduler(object):
+    """ Keeps track of which jobs in a dependency graph are ready to run.
+
+        The graph is a mapping from product to the products it depends on.
+        Each job holds a count of unfinished dependencies and is released
+        once the count reaches zero, so completing a job only costs work
+        proportional to its number of consumers.
+    """
+
+    def __init__(self, graph):
+        super(Scheduler, self).__init__()
+        self._pending = {}
+        self._consumers = {}
+        self._ready = deque()
+        self._remaining = len(graph)
+        for product in graph:
+            self._consumers[product] = []
+        for product, deps in graph.iteritems():
+            self._pending[product] = len(deps)
+            for dep in deps:
+                self._consumers[dep].append(product)
+            if not deps:
+                self._ready.append(product)
+
+    @property
+    def finished(self):
+        return self._remaining == 0
+
+    def take(self):
+        ready = list(self._ready)
+        self._ready.clear()
+        return ready
+
+    def complete(self, product):
+        self._remaining -= 1
+        for consumer in self._consumers[product]:
+            self._pending[consumer] -= 1
+            if self._pending[consumer] == 0:
+                self._ready.append(consumer)
+
+    def blocked(self):
+        return [product for product, count in self._pending.iteritems() if count > 0]
+
+    def consumers(self, product):
+        return self._consumers[product]
+
+    def order(self):
+        """ Returns the jobs in topological order, leaving out jobs that
+            take part in a dependency cycle. """
+        pending = dict(self._pending)
+        order = [product for product, count in pending.iteritems() if count == 0]
+        for product in order:
+            for consumer in self._consumers[product]:
+                pending[consumer] -= 1
+                if pending[consumer] == 0:
+                    order.append(consumer)
+        return order
+
+    def critical_path(self, cost):
+        """ Returns the estimated time from the start of each job until its
+            longest chain of consumers has finished, given a function
+            returning the estimated duration of a single job. """
+        path = {}
+        for product in reversed(self.order()):
+            consumers = [path[consumer] for consumer in self._consumers[product]]
+            path[product] = cost(product) + max(consumers + [0])
+        return path
+
+
+class Slots(object):
+    """ Limits the number of jobs running at once, in total and per
+        named resource pool, e.g. to keep memory hungry links apart.
+
+        The total limit is halved whenever a job gets killed and grows
+        back by one slot for every run of successful jobs.
+
+        A job running several threads, e.g. an LTO link, holds as many
+        slots, at most all of them, so that it doesn't oversubscribe the
+        machine alongside other jobs.
+    """
+
+    def __init__(self, jobs, pools=None, max_load=None):
+        super(Slots, self).__init__()
+        self.max_jobs = jobs
+        self.limit = jobs
+        self.pools = pools or {}
+        self.max_load = max_load
+        self.running = 0
+        self._busy = dict((name, 0) for name in self.pools)
+        self._waiting = dict((name, deque()) for name in self.pools)
+        self._succeeded = 0
+        self._held = {}
+
+    def _load(self):
+        try:
+            return os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return 0
+
+    def _threads(self, job):
+        return min(getattr(job, 'threads', 1), self.limit)
+
+    def available(self, job=None):
+        threads = self._threads(job) if job else 1
+        if self.running > 0 and self.running + threads > self.limit:
+            return False
+        if self.max_load and self.running > 0 and self._load() >= self.max_load:
+            return False
+        return True
+
+    def acquire(self, job):
+        pool = job.pool
+        if pool in self.pools:
+            if self._busy[pool] >= self.pools[pool]:
+                self._waiting[pool].append(job)
+                return False
+            self._busy[pool] += 1
+        self._held[job] = self._threads(job)
+        self.running += self._held[job]
+        return True
+
+    def release(self, job):
+        """ Frees the slots held by job. Returns a job that was waiting
+            for the same resource pool, if any. """
+        self.running -= self._held.pop(job, 1)
+        pool = job.pool
+        if pool in self.pools:
+            self._busy[pool] -= 1
+            if self._waiting[pool]:
+                return self._waiting[pool].popleft()
+        return None
+
+    def succeeded(self):
+        self._succeeded += 1
+        if self.limit < self.max_jobs and self._succeeded >= self.limit:
+            self.limit += 1
+            self._succeeded = 0
+
+    def backoff(self):
+        self.limit = max(1, min(self.limit, self.running + 1) // 2)
+        self._succeeded = 0
+
+
+class BuildGraph(object):
+    """ A job graph spanning one or more generated pybuild projects.
+
+        Jobs are keyed by product, so sources and other files shared between
+        projects become a single node. Projects depending on each other,
+        according to their DependencyGroup, are connected so that the
+        dependency's final job (archive or link) completes before any job
+        of the dependent project is started. Unrelated projects and
+        toolchains are free to run concurrently.
+    """
+    # Jobs checked and seconds spent deciding which jobs to run
+    checked = 0
+    check_time = 0.0
+
+    def __init__(self):
+        super(BuildGraph, self).__init__()
+        self._jobs = OrderedDict()
+        self._edges = OrderedDict()
+        self._projects = OrderedDict()
+
+    @property
+    def projects(self):
+        return self._projects.values()
+
+    @property
+    def jobs(self):
+        return self._jobs.values()
+
+    def add_project(self, cxx_project):
+        if not hasattr(cxx_project, "job"):
+            return False
+        with trace.phase("check", jobs=len(cxx_project.jobs)):
+            required = self._check(cxx_project.jobs)
+        # A dependency in the graph may still change what the project is
+        # built from, it's checked again once the dependency completes
+        if not required and not self._depends_on_graph(cxx_project):
+            return False
+        self._projects[(cxx_project.project, cxx_project.toolchain)] = cxx_project
+        for included in getattr(cxx_project, "included", []):
+            self._projects.setdefault((included.project, included.toolchain), included)
+        for job in cxx_project.jobs:
+            if job.product not in self._jobs:
+                self._jobs[job.product] = job
+        return True
+
+    def _depends_on_graph(self, cxx_project):
+        return any((dep.project, cxx_project.toolchain) in self._projects
+                   for dep in cxx_project.project.get_dependencies(cxx_project.toolchain))
+
+    @staticmethod
+    def _check(jobs):
+        """ Evaluates which jobs need to run. Each job is checked once,
+            after its dependencies, so that its digest and the digests it
+            is made from are computed a single time. Returns True if any
+            job is required. """
+        start = time.time()
+        jobs = OrderedDict((job.product, job) for job in jobs)
+        scheduler = Scheduler(OrderedDict(
+            (product, [dep for dep in job.dependencies() if dep in jobs])
+            for product, job in jobs.iteritems()))
+        if build.content_hash:
+            stats = StatCache.shared()
+            ContentHashes.shared().prefetch([(product, stats.stat(product))
+                for product, job in jobs.iteritems() if not job.executable])
+        required = False
+        for product in scheduler.order():
+            if jobs[product].required:
+                required = True
+        BuildGraph.checked += len(jobs)
+        BuildGraph.check_time += time.time() - start
+        return required
+
+    def _invalidate(self, scheduler, product):
+        """ Forgets the digests downstream of a completed job, and whether
+            those jobs are required, they are computed again from its new
+            digest when needed. """
+        pending = list(scheduler.consumers(product))
+        while pending:
+            job = self._jobs[pending.pop()]
+            job.recheck()
+            if job.clear_hash():
+                pending.extend(scheduler.consumers(job.product))
+
+    def _recheck(self, scheduler, product):
+        """ Jobs found to be required only because of a job that turned
+            out to be up to date, or whose output didn't change, are
+            checked again before they run. """
+        for consumer in scheduler.consumers(product):
+            job = self._jobs[consumer]
+            if job.executable and job.required:
+                job.recheck()
+
+    def add_edge(self, product, dependency):
+        if product not in self._edges:
+            self._edges[product] = OrderedDict()
+        self._edges[product][dependency] = True
+
+    def dependencies(self, product):
+        deps = list(self._jobs[product].dependencies())
+        edges = self._edges.get(product)
+        if edges:
+            known = set(deps)
+            deps += [dep for dep in edges if dep not in known]
+        return deps
+
+    def _estimates(self, history):
+        """ Returns a function estimating the duration of a job from its
+            previous runs. Jobs that failed last time are estimated to take
+            very long, so that they and everything they wait for go first. """
+        durations = [history.duration(product) for product in self._jobs]
+        durations = [duration for duration in durations if duration is not None]
+        default = sum(durations) / len(durations) if durations else 1.0
+
+        def estimate(product):
+            if not self._jobs[product].executable:
+                return 0
+            if history.failed(product):
+                return 1e6
+            return history.duration(product, default)
+        return estimate
+
+    def _connect(self):
+        for (project, toolchain), cxx_project in self._projects.items():
+            # Included projects are connected to their own dependencies
+            included = set(job.product for other in getattr(cxx_project, "included", []) for job in other.jobs)
+            for dep in project.get_dependencies(toolchain):
+                dep_project = self._projects.get((dep.project, toolchain))
+                if not dep_project:
+                    continue
+                for job in cxx_project.jobs:
+                    if job.executable and job.product not in included and not dep_project.get_job(job.product):
+                        self.add_edge(job.product, dep_project.job.product)
+
+    def _run_early(self, history):
+        """ Runs the required early jobs, dependencies first. Early jobs
+            depending on other jobs are left to the scheduler. """
+        runnable = {}
+
+        def run(job):
+            if job.product in runnable:
+                return runnable[job.product]
+            runnable[job.product] = False
+            for dep in self.dependencies(job.product):
+                dep = self._jobs.get(dep)
+                if dep is not None and dep.executable and not (dep.early and run(dep)):
+                    return False
+            runnable[job.product] = True
+            if job.required and not job.completed:
+                start = time.time()
+                try:
+                    utils.print_locked('[-]{}', job.info)
+                    job.execute()
+                    trace.record(job, None, start, time.time())
+                except Exception as e:
+                    trace.record(job, None, start, time.time(), e)
+                    self._fail(history, job, e, time.time() - start)
+            return True
+
+        for job in self._jobs.values():
+            if job.early:
+                run(job)
+
+    def _fail(self, history, job, error, elapsed):
+        history.record(job.product, elapsed, failed=True)
+        history.save()
+        RecordLog.save_all()
+        utils.print_locked("{}", error)
+        sys.exit(1)
+
+    def transform(self):
+        if not self._jobs:
+            return False
+        self._connect()
+
+        edges = OrderedDict((product, self.dependencies(product)) for product in self._jobs)
+        scheduler = Scheduler(edges)
+        stats.count("graph nodes", len(edges))
+        stats.count("graph edges", sum(len(deps) for deps in edges.values()))
+
+        # Ready jobs are started longest remaining chain first
+        history = History.shared()
+        priority = scheduler.critical_path(self._estimates(history))
+        sequence = itertools.count()
+        ready = []
+
+        def push(products):
+            for product in products:
+                heapq.heappush(ready, (-priority.get(product, 0), next(sequence), product))
+
+        # Output directories and the like are made in one pass up front,
+        # rather than each one making a round trip through the pool
+        self._run_early(history)
+
+        # Process jobs
+        pool = utils.Pool.shared()
+        slots = Slots(pool.size, build.pools, build.max_load)
+        results = Queue()
+        retries = {}
+        # Time spent scheduling, not waiting for jobs to complete
+        start, waited, rounds = time.time(), 0.0, 0
+        while not scheduler.finished:
+            rounds += 1
+            push(scheduler.take())
+            while ready:
+                job = self._jobs[heapq.heappop(ready)[2]]
+                if not job.executable or job.completed:
+                    scheduler.complete(job.product)
+                    push(scheduler.take())
+                    continue
+                if not slots.available(job):
+                    push([job.product])
+                    break
+                if slots.acquire(job):
+                    pool.put(job, results)
+
+            if scheduler.finished:
+                break
+            if not slots.running:
+                raise RuntimeError('dependency cycle between: {}'.format(" ".join(scheduler.blocked())))
+
+            wait = time.time()
+            completed = [pool.get(results)]
+            waited += time.time() - wait
+            item = pool.get_nowait(results)
+            while item:
+                completed.append(item)
+                item = pool.get_nowait(results)
+
+            for job, error, elapsed in completed:
+                waiting = slots.release(job)
+                if waiting:
+                    push([waiting.product])
+                if error is None:
+                    if elapsed is not None:
+                        history.record(job.product, elapsed)
+                    slots.succeeded()
+                    self._invalidate(scheduler, job.product)
+                    if not job.completed or not job.changed:
+                        self._recheck(scheduler, job.product)
+                    scheduler.complete(job.product)
+                elif isinstance(error, utils.KilledError) and retries.get(job.product, 0) < 3:
+                    retries[job.product] = retries.get(job.product, 0) + 1
+                    slots.backoff()
+                    utils.print_locked('[-] {}, retrying with {} jobs', error, slots.limit)
+                    push([job.product])
+                else:
+                    self._fail(history, job, error, elapsed)
+        stats.add("schedule", time.time() - start - waited, rounds)
+
+        history.save()
+        RecordLog.save_all()
+        return True
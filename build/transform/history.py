@@ -0,0 +1,47 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform.recordlog import RecordLog
+import os
+
+
+class History(RecordLog):
+    """ Durations and outcomes of previously executed jobs, by product.
+
+        Records are appended to a plain text log, one line per executed
+        job.
+    """
+    _shared = None
+
+    @staticmethod
+    def shared():
+        if History._shared is None:
+            History._shared = History.open(os.path.join("output", ".history"))
+        return History._shared
+
+    def _parse(self, line):
+        duration, failed, product = line.split("\t", 2)
+        return product, (float(duration), failed == "1")
+
+    def _format(self, product, entry):
+        return "{:.3f}\t{:d}\t{}\n".format(entry[0], entry[1], product)
+
+    def duration(self, product, default=None):
+        entry = self._entries.get(product)
+        return entry[0] if entry else default
+
+    def failed(self, product):
+        entry = self._entries.get(product)
+        return entry[1] if entry else False
+
+    def record(self, product, duration, failed=False):
+        with self._lock:
+            self._update(product, (duration, failed))
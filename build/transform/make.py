@@ -9,7 +9,9 @@
 ##############################################################################
 
 
+import build
 from build.transform import utils
+from build.transform.toolchain import Toolchain
 from build.tools.directory import Directory
 from build.utils import Dispatch, multidispatch
 import pybuild
@@ -17,13 +19,22 @@ import os
 import multiprocessing
 
 
+def printf_format(text):
+    """ Returns text as the quoted format of a printf in a recipe, that
+        prints it unchanged through make, the shell and printf. """
+    text = text.replace("\\", "\\\\").replace("%", "%%").replace("\n", "\\n")
+    return "'{}'".format(text.replace("'", "'\\''").replace("$", "$$"))
+
+
 class CXXProject(pybuild.CXXProject):
     def __init__(self, toolchain, name):
         super(CXXProject, self).__init__(toolchain, name)
 
     def transform(self):
-        rc, _, _ = utils.execute('make -f {}.mk -j {} all'.format(
-            self.name, multiprocessing.cpu_count()))
+        rc, _, _ = utils.execute('make -f {}.mk -j {} {} all'.format(
+            self.name,
+            build.jobs or multiprocessing.cpu_count(),
+            '-l {}'.format(build.max_load) if build.max_load else ''))
         if rc != 0:
             raise RuntimeError(rc)
         return True
@@ -32,6 +43,9 @@ class CXXProject(pybuild.CXXProject):
 class CXXToolchain(pybuild.CXXToolchain):
     dispatch = Dispatch()
 
+    # The training run and profile merge aren't expressed in makefiles
+    profile_guided = False
+
     def __init__(self, name):
         super(CXXToolchain, self).__init__(name)
 
@@ -61,6 +75,10 @@ class CXXToolchain(pybuild.CXXToolchain):
     def _visit(self, job, f):
         CXXToolchain._visit_cmd(job, f)
 
+    @multidispatch(dispatch, pybuild.Builtin, file)
+    def _visit(self, job, f):
+        CXXToolchain._visit_cmd(job, f)
+
     @multidispatch(dispatch, pybuild.Object, file)
     def _visit(self, job, f):
         CXXToolchain._visit_cmd(job, f)
@@ -81,6 +99,17 @@ class CXXToolchain(pybuild.CXXToolchain):
             f.write('\t@echo {file} >> {product}\n'.format(file=file, product=job.product))
         f.write('\n')
 
+    @multidispatch(dispatch, pybuild.TextFile, file)
+    def _visit(self, job, f):
+        f.write('{product}: | {rebuild_deps}\n'.format(
+            product=job.product,
+            rebuild_deps=" ".join(CXXToolchain._rebuild_deps(job))))
+        f.write('\t@echo {info}\n'.format(info=job.info))
+        f.write("\t@printf {text} > {product}\n".format(
+            text=printf_format(job.text),
+            product=job.product))
+        f.write('\n')
+
     @multidispatch(dispatch)
     def _visit(self, job, f):
         pass
@@ -99,3 +128,6 @@ class CXXToolchain(pybuild.CXXToolchain):
         
     def transform(self, project):
         return self.generate(project, self).transform()
+
+    def schedule(self, project, graph, toolchain=None):
+        return Toolchain.schedule(self, project, graph, toolchain)
@@ -10,7 +10,9 @@
 
 
 from build import model
+from build.transform import unity
 from build.transform import utils
+from build.transform.precompiled import PrecompiledHeaderMixin
 from build.transform.toolchain import Toolchain
 from build.transform.visual_studio import VS14VCVars
 from build.feature import FeatureRegistry
@@ -148,6 +150,7 @@ class ProjectConfigurationsItemGroup(ItemGroup):
 @Attribute('PlatformToolset', varname='toolset', child=True, values=['v110', 'v120', 'v110_xp', 'v120_xp', 'v140', 'v140_xp', 'v141'])
 @Attribute('CharacterSet', varname='charset', child=True, values=['MultiByte', None])
 @Attribute('PreferredToolArchitecture', varname='tool_architecture', child=True, values=['x64'])
+@Attribute('WholeProgramOptimization', varname='whole_program_optimization', child=True, values=['false', 'true'])
 class CXXConfigurationPropertyGroup(PropertyGroup):
     def __init__(self, project_config):
         super(CXXConfigurationPropertyGroup, self).__init__('Configuration')
@@ -200,6 +203,7 @@ class Compile(SubElement):
 @Attribute('EnablePREfast', values=['false', 'true'], child=True)
 @Attribute('ErrorReporting', values=['None', 'Prompt', 'Queue', 'Send'], child=True)
 @Attribute('ExceptionHandling', values=['false', 'Async', 'Sync', 'SyncCThrow'], child=True)
+@Attribute('ExcludedFromBuild', values=['false', 'true'], child=True)
 @Attribute('ExpandAttributedSource', values=['false', 'true'], child=True)
 @Attribute('FavorSizeOrSpeed', values=['Neither', 'Size', 'Speed'], child=True)
 @Attribute('FloatingPointExceptions', values=['false', 'true'], child=True)
@@ -348,7 +352,7 @@ class Lib(SubElement):
 @Attribute('LinkIncremental', values=['false', 'true'], child=True)
 @Attribute('LinkLibraryDependencies', values=['false', 'true'], child=True)
 @Attribute('LinkStatus', values=['false', 'true'], child=True)
-@Attribute('LinkTimeCodeGeneration', values=['false', 'true'], child=True)
+@Attribute('LinkTimeCodeGeneration', values=['false', 'true', 'Default', 'UseLinkTimeCodeGeneration', 'UseFastLinkTimeCodeGeneration'], child=True)
 @Attribute('ManifestFile', child=True)
 @Attribute('MapExports', values=['false', 'true'], child=True)
 @Attribute('MapFileName', child=True)
@@ -711,7 +715,7 @@ class CXXItemDefinitionGroup(ItemDefinitionGroup):
 #@Composition(CXXPropertyGroup, 'propertygroup')
 #@Composition(Import, 'import')
 #@Composition(ImportGroup, 'importgroup')
-class CXXProject(Project):
+class CXXProject(PrecompiledHeaderMixin, Project):
     def __init__(self, project, toolchain):
         super(CXXProject, self).__init__()
         self.project = project
@@ -771,6 +775,8 @@ class CXXProject(Project):
         self._incdir = []
         self._libdir = []
         self._deps = []
+        self._precompiled_headers = []
+        self.pch_sources = []
 
     def create_projectconfiguration(self, config_name, platform):
         return self.configs_group.create_projectconfiguration(config_name, platform)
@@ -857,10 +863,10 @@ class CXXToolchain(Toolchain):
 
         groups = project.source_groups + [project]
         for group in groups:
+            sources = [source for source in group.sources if source.matches(toolchain.name)]
+            batches, sources = unity.batches(toolchain, project, group, sources)
             tool_sources = {}
-            for source in group.sources:
-                if not source.matches(toolchain.name):
-                    continue
+            for source in sources + [batch.write() for batch in batches]:
                 if source.tool not in tool_sources:
                     tool_sources[source.tool] = []
                 tool_sources[source.tool].append(source)
@@ -871,6 +877,14 @@ class CXXToolchain(Toolchain):
                 sources = tool_sources[tool_name]
                 tool.transform(cxx_project, sources)
                 filter_project.add_sources(tool, group, sources)
+            for batch in batches:
+                # Batched sources remain visible in Visual Studio
+                tool = toolchain.get_tool(batch.tool)
+                paths = [source.path for source in batch.sources]
+                for elem in tool.transform(cxx_project, batch.sources):
+                    if elem.include in paths:
+                        elem.excludedfrombuild = 'true'
+                filter_project.add_sources(tool, group, batch.sources)
             filter_project.add_group(group)
 
         cxx_project.write('{}.vcxproj'.format(project.name))
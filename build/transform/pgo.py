@@ -0,0 +1,111 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform import builtin
+from build.transform import utils
+from build.transform.toolchain import ToolchainExtender
+import hashlib
+import os
+import shutil
+
+
+class Instrumented(ToolchainExtender):
+    """ The variant of a toolchain building instrumented binaries, into
+        an output directory of its own. It is only used on behalf of the
+        toolchain it extends, and can't be selected by name. """
+    registered = False
+    _variants = {}
+
+    def __init__(self, toolchain):
+        super(Instrumented, self).__init__(toolchain.name + "-pgo", toolchain)
+        self.use_feature('pgo', stage='instrument')
+
+    @staticmethod
+    def of(toolchain):
+        if toolchain.name not in Instrumented._variants:
+            Instrumented._variants[toolchain.name] = Instrumented(toolchain)
+        return Instrumented._variants[toolchain.name]
+
+
+def directory(cxx_project):
+    """ Where the instrumented cxx_project writes raw profile data, and
+        where the optimized cxx_project keeps the merged profile. """
+    return os.path.abspath(os.path.join(cxx_project.output, "pgo"))
+
+
+def _digest(filename):
+    with open(filename, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def _update(filename, data):
+    # Consumers of the profile are only rebuilt if it changes
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            if f.read() == data:
+                return
+    with open(filename, "wb") as f:
+        f.write(data)
+
+
+def _gcda(root):
+    for dirname, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".gcda"):
+                yield os.path.relpath(os.path.join(dirname, filename), root)
+
+
+def _copy_gcda(instrumented, optimized):
+    """ Copies the .gcda files written next to the instrumented objects
+        to the optimized objects, which gcc looks them up next to. Returns
+        a listing of their digests. """
+    listing = []
+    copied = set()
+    for name in sorted(_gcda(instrumented)):
+        source, destination = os.path.join(instrumented, name), os.path.join(optimized, name)
+        digest = _digest(source)
+        if not os.path.exists(destination) or _digest(destination) != digest:
+            builtin.mkdir(os.path.dirname(destination))
+            shutil.copy(source, destination)
+        listing.append("{} {}\n".format(digest, name))
+        copied.add(name)
+    for name in list(_gcda(optimized)):
+        if name not in copied:
+            os.remove(os.path.join(optimized, name))
+    return "".join(listing)
+
+
+def train(command, env, instrumented, optimized, profile, merge=None):
+    """ Runs the training command, then merges the profile data written
+        by the instrumented project into profile. With a merge command
+        line, the raw profile data is merged by it. Otherwise the .gcda
+        files are copied over to the optimized project. """
+    raw = os.path.join(instrumented, "pgo")
+    for name in list(_gcda(instrumented)):
+        os.remove(os.path.join(instrumented, name))
+    if os.path.exists(raw):
+        shutil.rmtree(raw)
+    builtin.mkdir(os.path.dirname(profile))
+
+    rc, stdout, stderr = utils.execute(command, env, output=False)
+    if rc != 0:
+        raise OSError("training failed: {}\n{}".format(command, "\n".join(stdout + stderr)))
+
+    if merge is None:
+        _update(profile, _copy_gcda(instrumented, optimized))
+        return
+    merged = profile + ".tmp"
+    rc, stdout, stderr = utils.execute(merge.format(input=raw, output=merged), env, output=False)
+    if rc != 0:
+        raise OSError("merging profile failed: {}\n{}".format(merge, "\n".join(stdout + stderr)))
+    with open(merged, "rb") as f:
+        _update(profile, f.read())
+    os.remove(merged)
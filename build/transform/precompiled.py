@@ -0,0 +1,30 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build.transform import stats
+import re
+
+
+class PrecompiledHeaderMixin(object):
+    """ Selects the precompiled header of each source of a project. The
+        class mixed into keeps the headers in self._precompiled_headers. """
+
+    def add_precompiled_header(self, header, sources=None):
+        """ Precompiles header for the sources matching the regular
+            expression sources, or for all sources. """
+        self._precompiled_headers.append((header, re.compile(sources or '')))
+
+    def precompiled_header(self, source):
+        for header, sources in self._precompiled_headers:
+            stats.count("regex")
+            if sources.search(source):
+                return header
+        return None
@@ -0,0 +1,267 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import errno
+import os
+import platform
+import select
+import shlex
+import subprocess
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Characters that only a shell understands
+_SHELL_CHARS = set('|&;<>()$`*?[]#~\n')
+
+# Commands that are built into the shell
+_SHELL_BUILTINS = set(['.', ':', 'cd', 'exec', 'exit', 'export', 'for', 'if', 'set',
+                       'source', 'test', 'trap', 'ulimit', 'umask', 'unset', 'while'])
+
+
+def split(cmdline):
+    """ Returns the arguments of cmdline if it can be run without a shell,
+        or None if it can't. """
+    if platform.system() == "Windows":
+        # cmd.exe builtins and syntax are many, only run programs directly
+        program = cmdline.split(None, 1)[0] if cmdline.strip() else ''
+        return cmdline if program.lower().endswith('.exe') and not set('&|<>^%') & set(cmdline) else None
+    if _SHELL_CHARS & set(cmdline):
+        return None
+    try:
+        args = shlex.split(cmdline)
+    except ValueError:
+        return None
+    if not args or args[0] in _SHELL_BUILTINS or '=' in args[0]:
+        return None
+    return args
+
+
+class Log(object):
+    """ A log file that is only created once something is written to it.
+        A previous log is removed right away, so that a log never outlives
+        the run it describes. """
+
+    def __init__(self, name):
+        super(Log, self).__init__()
+        self.name = name
+        self._file = None
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+    def write(self, data):
+        if self._file is False:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.name, "wb")
+            self._file.write(data)
+        except IOError:
+            # E.g. the directory of the product doesn't exist yet
+            self._file = False
+
+    @property
+    def written(self):
+        return bool(self._file)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class Stream(object):
+    """ Output of one pipe of a process.
+
+        Everything is written to the log file of the process, if any, but
+        only the first limit bytes are kept in memory.
+    """
+
+    def __init__(self, fd, limit, log=None, echo=None):
+        super(Stream, self).__init__()
+        self.fd = fd
+        self.limit = limit
+        self.log = log
+        self.echo = echo
+        self.dropped = 0
+        self._data = []
+        self._size = 0
+        self._partial = b''
+
+    def feed(self, data):
+        if self.log is not None:
+            self.log.write(data)
+        if self.echo:
+            lines = (self._partial + data).split(b'\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self.echo("{}", line.strip())
+        keep = max(0, min(len(data), self.limit - self._size))
+        if keep:
+            self._data.append(data[:keep])
+            self._size += keep
+        self.dropped += len(data) - keep
+
+    def close(self):
+        if self.echo and self._partial:
+            self.echo("{}", self._partial.strip())
+        self._partial = b''
+
+    def lines(self):
+        lines = [line.strip() for line in b''.join(self._data).splitlines()]
+        if self.dropped:
+            lines.append("... {} more bytes{}".format(
+                self.dropped, ", see " + self.log.name if self.log is not None and self.log.written else ""))
+        return lines
+
+
+class Process(object):
+    def __init__(self, popen, streams):
+        super(Process, self).__init__()
+        self.popen = popen
+        self.streams = streams
+        self.done = threading.Event()
+        self._open = len(streams)
+        self._lock = threading.Lock()
+
+    def close(self, stream):
+        stream.close()
+        with self._lock:
+            self._open -= 1
+            if self._open == 0:
+                self.done.set()
+
+
+class Engine(object):
+    """ Runs processes and collects their output.
+
+        The pipes of all running processes are read by one thread that
+        waits for any of them to become readable. Processes are started
+        without a shell whenever the command line allows it. Where pipes
+        can't be polled, on Windows, each pipe is read by a thread of its
+        own instead.
+    """
+    # Bytes of output kept in memory per pipe
+    limit = 64 * 1024
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        super(Engine, self).__init__()
+        self._polled = hasattr(select, 'poll') and fcntl is not None
+        self._streams = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.spawned = 0
+        self.shells = 0
+
+    @staticmethod
+    def shared():
+        with Engine._shared_lock:
+            if Engine._shared is None:
+                Engine._shared = Engine()
+            return Engine._shared
+
+    def _start(self):
+        self._poll = select.poll()
+        self._wakeup, self._notify = os.pipe()
+        for fd in (self._wakeup, self._notify):
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        self._poll.register(self._wakeup, select.POLLIN)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                events = self._poll.poll()
+            except (select.error, IOError, OSError) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd == self._wakeup:
+                    os.read(fd, 4096)
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for process, stream in pending:
+                        self._streams[stream.fd] = (process, stream)
+                        self._poll.register(stream.fd, select.POLLIN)
+                    continue
+                self._read(fd)
+
+    def _read(self, fd):
+        process, stream = self._streams[fd]
+        try:
+            data = os.read(fd, 65536)
+        except OSError:
+            data = b''
+        if data:
+            stream.feed(data)
+            return
+        self._poll.unregister(fd)
+        del self._streams[fd]
+        process.close(stream)
+
+    def _read_all(self, process, stream):
+        while True:
+            data = os.read(stream.fd, 65536)
+            if not data:
+                break
+            stream.feed(data)
+        process.close(stream)
+
+    def run(self, cmdline, env=None, echo=None, log=None):
+        """ Runs cmdline, optionally echoing its standard output line by
+            line and writing all its output to the log file. Returns the
+            exit code and the lines printed to stdout and stderr. """
+        args = split(cmdline)
+        try:
+            popen = subprocess.Popen(
+                args if args is not None else cmdline, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                shell=args is None, env=env)
+        except OSError as e:
+            # Like a shell failing to find the program
+            return 127, [], ["{}: {}".format(args[0] if args else cmdline, e.strerror)]
+        with self._lock:
+            self.spawned += 1
+            self.shells += args is None
+
+        log = Log(log) if log else None
+        streams = [Stream(popen.stdout.fileno(), self.limit, log, echo),
+                   Stream(popen.stderr.fileno(), self.limit, log)]
+        process = Process(popen, streams)
+        if self._polled:
+            with self._lock:
+                if self._thread is None:
+                    self._start()
+                self._pending.extend((process, stream) for stream in streams)
+            os.write(self._notify, b'x')
+        else:
+            for stream in streams:
+                thread = threading.Thread(target=self._read_all, args=(process, stream))
+                thread.daemon = True
+                thread.start()
+        process.done.wait()
+        popen.stdout.close()
+        popen.stderr.close()
+        popen.wait()
+        if log is not None:
+            log.close()
+        return popen.returncode, streams[0].lines(), streams[1].lines()
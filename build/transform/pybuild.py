@@ -11,27 +11,49 @@
 
 import build
 from build import model
+from build.transform import builtin
+from build.transform import pgo
+from build.transform import stats
+from build.transform import trace
+from build.transform import unity
 from build.transform import utils
+from build.transform.buildlog import BuildLog
+from build.transform.cache import ObjectCache
+from build.transform.contenthash import ContentHashes
+from build.transform.depslog import DepsLog
+from build.transform.distributed import Workers
+from build.transform.graph import BuildGraph
+from build.transform.precompiled import PrecompiledHeaderMixin
+from build.transform.statcache import StatCache
 from build.transform.toolchain import Toolchain
 from copy import copy
-from os import path, stat, environ, pathsep
+from functools import partial
+from os import path, environ, pathsep, getcwd, remove
+from stat import S_ISREG
 import hashlib
-import sys
 from collections import OrderedDict
 
 
-class Settings(object):
+class Settings(PrecompiledHeaderMixin):
     def __init__(self, template_settings=None):
         if template_settings:
             self._cflags = copy(template_settings._cflags)
             self._cxxflags = copy(template_settings._cxxflags)
             self._linkflags = copy(template_settings._linkflags)
             self._libraries = copy(template_settings._libraries)
+            self._archiveflags = copy(template_settings._archiveflags)
+            self._archiver = template_settings._archiver
+            self._precompiled_headers = copy(template_settings._precompiled_headers)
+            self._link_threads = template_settings._link_threads
         else:
             self._cflags = []
             self._cxxflags = []
             self._linkflags = []
             self._libraries = []
+            self._archiveflags = []
+            self._archiver = None
+            self._precompiled_headers = []
+            self._link_threads = 1
 
     def add_cflag(self, *flags):
         for flag in flags:
@@ -60,6 +82,33 @@ class Settings(object):
     def linkflags(self):
         return self._linkflags
 
+    def add_archiveflag(self, *flags):
+        for flag in flags:
+            if flag not in self._archiveflags:
+                self._archiveflags.append(flag)
+
+    @property
+    def archiveflags(self):
+        return self._archiveflags
+
+    def set_archiver(self, executable):
+        """ Archives with executable instead of the archiver of the
+            toolchain, e.g. one that understands LTO objects. """
+        self._archiver = executable
+
+    @property
+    def archiver(self):
+        return self._archiver
+
+    def set_link_threads(self, threads):
+        """ Makes the link hold as many job slots as the threads it runs,
+            e.g. the code generation of LTO. """
+        self._link_threads = threads
+
+    @property
+    def link_threads(self):
+        return self._link_threads
+
     def add_library(self, lib):
         if lib not in self._libraries:
             self._libraries.append(lib)
@@ -70,9 +119,18 @@ class Settings(object):
 
 
 class Job(object):
-    def __init__(self, product, driver=None):
+    # Number of digests computed
+    hashes = 0
+
+    # Whether the job only depends on other early jobs and is cheap
+    # enough to be run by the scheduler before all other jobs
+    early = False
+
+    def __init__(self, product, driver=None, pool=None, threads=1):
         self._product = path.normpath(product)
         self._driver = driver
+        self._pool = pool
+        self._threads = threads
         self._completed = False
         self._deps = OrderedDict()
         self._timestamp = 0
@@ -86,6 +144,15 @@ class Job(object):
     def driver(self):
         return self._driver
 
+    @property
+    def pool(self):
+        return self._pool
+
+    @property
+    def threads(self):
+        """ The number of job slots held while running. """
+        return self._threads
+
     @property
     def completed(self):
         return self._completed
@@ -96,21 +163,34 @@ class Job(object):
 
     def set_completed(self):
         self._completed = True
+        StatCache.shared().invalidate(self.product)
         self.on_completed(self)
 
     @property
     def required(self):
         if self._required is None:
-            deps_timestamp = max([dep.timestamp for dep in self._deps.values()] + [0])
-            deps_required = [dep for dep in self._deps.values() if dep.required]
-            self._required = deps_required or deps_timestamp > self.timestamp
-        return self._required 
+            self._required = self.outdated() or any(
+                dep.changed if dep.completed else dep.required for dep in self._deps.values())
+        return self._required
+
+    @property
+    def changed(self):
+        """ Whether running the job changed what its consumers are built from. """
+        return True
+
+    def recheck(self):
+        """ Forgets whether the job is required, e.g. because a dependency
+            turned out not to change. """
+        self._required = None
+
+    def outdated(self):
+        deps_timestamp = max([dep.timestamp for dep in self._deps.values()] + [0])
+        return deps_timestamp > self.timestamp
 
     @property
     def timestamp(self):
-        if path.exists(self.product):
-            s = stat(self.product)
-            if s: self._timestamp = s.st_mtime
+        s = StatCache.shared().stat(self.product)
+        if s: self._timestamp = s.st_mtime
         return self._timestamp
 
     def add_dependency(self, job):
@@ -125,6 +205,13 @@ class Job(object):
     def execute(self):
         pass
 
+    def clear_hash(self):
+        return False
+
+    def output_hash(self):
+        """ Returns the digest that consumers are built from. """
+        return self.get_hash()
+
     @staticmethod
     def on_completed(self):
         pass
@@ -133,56 +220,68 @@ class Job(object):
 class Source(Job):
     def __init__(self, source):
         super(Source, self).__init__(source)
+        self._stat = None
+        self._hc = None
 
     @property
     def executable(self):
         return False
 
     def get_hash(self):
+        # The stat cache hands out the same status until the file changes
+        s = StatCache.shared().stat(self.product)
+        if self._hc is not None and s is self._stat:
+            return self._hc
+        Job.hashes += 1
         m = hashlib.sha256()
-        if path.exists(self.product):
-            m.update(str(stat(self.product)))
-            #with open(self.product) as f:
-                #m.update(f.read())
-        return m.hexdigest()
+        with stats.timed("hash"):
+            if s and build.content_hash and S_ISREG(s.st_mode):
+                m.update(ContentHashes.shared().digest(self.product, s))
+            elif s:
+                m.update(str(s))
+        self._stat = s
+        self._hc = m.hexdigest()
+        return self._hc
 
 
 class HashableMixin(object):
     def __init__(self, *args, **kwargs):
         super(HashableMixin, self).__init__(*args, **kwargs)
         self._hc = None
+        self.log = None
 
     def get_hash(self):
         if self._hc is not None:
             return self._hc
+        Job.hashes += 1
         m = hashlib.sha256()
-        self.populate_hash(m)
+        with stats.timed("hash"):
+            self.populate_hash(m)
         self._hc = m.hexdigest()
         return self._hc
 
     def clear_hash(self):
+        cleared = self._hc is not None
         self._hc = None
+        return cleared
 
     def store_hash(self):
-        product_hash = self.product + ".hash"
-        digest = self.get_hash()
-        with open(product_hash, "w") as f:
-            f.write(digest)
+        if self.log is not None:
+            self.log.set(self.product, self.get_hash())
 
     def _load_hash(self):
-        product_hash = self.product + ".hash"
-        if path.exists(product_hash):
-            with open(product_hash) as f:
-                return f.read()
+        if self.log is not None:
+            return self.log.get(self.product)
         return None
     
-    @property
-    def required(self):
+    def outdated(self):
         stored_hash = self._load_hash()
-        return stored_hash != self.get_hash()
+        return stored_hash != self.get_hash() or not StatCache.shared().exists(self.product)
 
 
 class FileList(HashableMixin, Job):
+    early = True
+
     def __init__(self, product, files):
         super(FileList, self).__init__(product)
         self.files = files
@@ -202,13 +301,56 @@ class FileList(HashableMixin, Job):
         self.store_hash()
 
 
+class TextFile(HashableMixin, Job):
+    early = True
+
+    def __init__(self, product, text):
+        super(TextFile, self).__init__(product)
+        self.text = text
+
+    @property
+    def info(self):
+        return " [TEXTFILE] {}".format(self.product)
+
+    def populate_hash(self, m):
+        m.update(self.text)
+
+    def execute(self):
+        if self.completed: return
+        with open(self.product, "w") as f:
+            f.write(self.text)
+        self.set_completed()
+        self.store_hash()
+
+
 class Command(HashableMixin, Job):
-    def __init__(self, product, cmdline, info=None, env=None, ignore_error=False):
-        super(Command, self).__init__(product)
+    def __init__(self, product, cmdline, info=None, env=None, ignore_error=False, pool=None, restat=False, threads=1):
+        super(Command, self).__init__(product, pool=pool, threads=threads)
         self._cmdline = cmdline
         self._info = info
         self._env = env
         self._ignore_error = ignore_error
+        self._restat = restat
+        self._changed = True
+        self.diagnostics = []
+        self.returncode = None
+
+    @property
+    def restat(self):
+        return self._restat
+
+    @property
+    def changed(self):
+        return self._changed
+
+    def output_hash(self):
+        # Consumers of a restat command are built from the contents of
+        # its product, so that they are skipped if it comes out the same
+        if self._restat:
+            s = StatCache.shared().stat(self.product)
+            if s:
+                return ContentHashes.shared().digest(self.product, s)
+        return self.get_hash()
 
     @property
     def cmdline(self):
@@ -220,29 +362,180 @@ class Command(HashableMixin, Job):
 
     def populate_hash(self, m):
         for dep in self.dependencies():
-            m.update(self.get_dependency(dep).get_hash())
+            m.update(self.get_dependency(dep).output_hash())
         m.update(self._cmdline)
         m.update(self._info)
 
+    def _run(self):
+        return utils.execute(self._cmdline, self._env, output=False, log=self.product + ".log")
+
     def execute(self):
         if self.completed: return
         if build.verbose:
             utils.print_locked(self._cmdline)
-        rc, stdout, stderr = utils.execute(self._cmdline, self._env, output=False)
+        before = self.output_hash() if self._restat else None
+        rc, stdout, stderr = self._run()
+        self.returncode = rc
+        if rc in [137, -9] and not self._ignore_error:
+            raise utils.KilledError('job killed: ' + self._cmdline)
         if rc != 0 and not self._ignore_error: 
             utils.print_locked("{}", "\n".join(stdout))
             utils.print_locked("{}", "\n".join(stderr))
             raise RuntimeError('job failed: ' + self._cmdline)
+        self.diagnostics = stdout + stderr
         self.set_completed()
+        if self._restat:
+            self._changed = self.output_hash() != before
         self.store_hash()
 
 
+class Builtin(Command):
+    def __init__(self, product, cmdline, action, info=None, ignore_error=False, pool=None, restat=False):
+        """ A command carried out in this process by calling action. The
+            command line does the same in a shell, it's what identifies
+            the command and what generators such as make use. """
+        super(Builtin, self).__init__(product, cmdline, info, ignore_error=ignore_error, pool=pool, restat=restat)
+        self._action = action
+
+    def _run(self):
+        try:
+            self._action()
+        except (IOError, OSError) as e:
+            return 1, [], [str(e)]
+        return 0, [], []
+
+
 class Object(Command):
-    def __init__(self, product, cmdline, info=None, env=None):
-        super(Object, self).__init__(product, cmdline, info, env)
+    def __init__(self, product, cmdline, info=None, env=None, pool=None, preprocess=None, compiler=None, inputs=None, distribute=None, outputs=None, threads=1):
+        """ An object, or other product built from one source. If the tool
+            provides a command line printing the preprocessed source, and
+            one identifying the compiler, the object may come from the
+            object cache. Archives and links instead list the files they
+            read, which are then looked up by their contents. Given a
+            command line compiling a preprocessed {input} to {output}, the
+            object may be compiled by a remote worker. Outputs are files
+            written along with the product, such as split debug info. """
+        super(Object, self).__init__(product, cmdline, info, env, pool=pool, threads=threads)
+        self._preprocess = preprocess
+        self._compiler = compiler
+        self._inputs = inputs
+        self._distribute = distribute
+        self._outputs = outputs or []
+
+    @property
+    def outputs(self):
+        return self._outputs
+
+    def add_input(self, filename):
+        """ Adds a file the command reads besides its source, such as a
+            profile. Its contents are part of the cache key. Workers don't
+            have it, the object is always compiled locally. """
+        self._inputs = (self._inputs or []) + [filename]
+        self._distribute = None
+
+    def outdated(self):
+        return super(Object, self).outdated() or \
+            any(not StatCache.shared().exists(output) for output in self._outputs)
+
+    def _files(self):
+        files = {"object": self.product}
+        for index, output in enumerate(self._outputs):
+            files["output{}".format(index)] = output
+        return files
+
+    def _cache_key(self, source):
+        cwd = getcwd()
+        m = hashlib.sha256()
+        m.update(ObjectCache.identity(self._compiler, self._env))
+        m.update(self._cmdline.replace(self.product, "").replace(cwd, ""))
+        if self._preprocess is not None:
+            if source is None:
+                return None
+            m.update(source.replace(cwd, ""))
+
+        # Inputs that don't exist, e.g. the shared object of a static
+        # library, only count by name
+        for filename in self._inputs or []:
+            m.update(filename.replace(cwd, ""))
+            st = StatCache.shared().stat(filename)
+            if st is not None and S_ISREG(st.st_mode):
+                m.update(ContentHashes.shared().digest(filename, st))
+        return m.hexdigest()
+
+    def _execute_remote(self, workers, source):
+        result = workers.compile(self._distribute, source)
+        if result is None:
+            return False
+        rc, diagnostics, data = result
+        if build.verbose:
+            utils.print_locked(self._cmdline)
+        if rc != 0:
+            utils.print_locked("{}", diagnostics)
+            raise RuntimeError('job failed: ' + self._cmdline)
+        with open(self.product, "wb") as f:
+            f.write(data)
+        self.diagnostics = diagnostics.splitlines()
+        self._write_log()
+        self.set_completed()
+        self.store_hash()
+        return True
+
+    def _write_log(self):
+        # Compiles from the cache or a worker leave the log of a local one,
+        # e.g. for the time report of a later build
+        data = "\n".join(self.diagnostics)
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        with open(self.product + ".log", "wb") as f:
+            f.write(data)
+
+    @staticmethod
+    def _remove(files):
+        # Outputs of a previous run must not outlive a failed one
+        for filename in files:
+            if path.exists(filename):
+                remove(filename)
+
+    def execute(self):
+        if self.completed: return
+        cache = ObjectCache.shared()
+        if cache is not None and self._preprocess is None and self._inputs is None:
+            cache = None
+        # Workers only send back the product
+        workers = Workers.shared() if self._distribute and not self._outputs else None
+        if cache is None and workers is None:
+            self._remove(self._outputs)
+            return super(Object, self).execute()
+
+        # Preprocessed once, both to look up the cache and to distribute
+        source = None
+        if self._preprocess is not None:
+            rc, source, _ = utils.capture(self._preprocess, self._env)
+            if rc != 0:
+                source = None
+
+        key = self._cache_key(source) if cache is not None else None
+        if key is not None and cache.fetch(key, self._files()):
+            if build.verbose:
+                utils.print_locked(" [CACHED] {}", self.product)
+            self.diagnostics = (cache.read(key, "diagnostics") or "").splitlines()
+            self._write_log()
+            self.set_completed()
+            self.store_hash()
+            return
+
+        # The product may be linked to a cache entry, never write through it
+        self._remove([self.product] + self._outputs)
+        if workers is None or source is None or not self._execute_remote(workers, source):
+            super(Object, self).execute()
+        if key is not None:
+            cache.store(key, self._files(), {"diagnostics": "\n".join(self.diagnostics)})
 
 
 class CXXToolchain(Toolchain):
+    # Whether executables can be built with profile guided optimization
+    profile_guided = True
+
     def __init__(self, name):
         super(CXXToolchain, self).__init__(name)
         self._cxx_archiver = None
@@ -264,29 +557,91 @@ class CXXToolchain(Toolchain):
     def linker(self, linker_driver):
         self._cxx_linker = linker_driver
 
+    @staticmethod
+    def _add_source(cxx_project, source):
+        cxx_project.add_source(source.path)
+        for dep in source.depends:
+            cxx_project.add_source(dep)
+            cxx_project.add_dependency(source.path, dep)
+
+    def _instrument(self, project, toolchain, cxx_project):
+        """ Includes project and its dependencies, built with the
+            instrumented variant of toolchain, in cxx_project. They are
+            scheduled along with it. Returns the instrumented project. """
+        instrumented = pgo.Instrumented.of(toolchain)
+        done = set()
+
+        def include(dependency):
+            for dep in dependency.get_dependencies(instrumented):
+                if dep.project not in done:
+                    done.add(dep.project)
+                    include(dep.project)
+                    cxx_project.include(instrumented.generate(dep.project, instrumented))
+        include(project)
+        instrumented_project = instrumented.generate(project, instrumented)
+        cxx_project.include(instrumented_project)
+        return instrumented_project
+
+    def _train(self, project, cxx_project, toolchain, training, profile, merge):
+        """ Adds the job running the training command against the
+            instrumented executable, which writes the merged profile. The
+            objects depend on the profile, they are only compiled again
+            when it changes, and are cached by its contents. """
+        objects = cxx_project.objects
+        instrumented = self._instrument(project, toolchain, cxx_project)
+        env = self.get_dependency_pathenv(instrumented.toolchain, project.get_dependencies(toolchain))
+        command = training.command.format(executable=instrumented.job.product)
+        action = partial(pgo.train, command, env, instrumented.output, cxx_project.output, profile, merge)
+        train = Builtin(profile, command, action, " [TRAIN] {}".format(project.name), restat=True)
+        cxx_project.add_job(train)
+        cxx_project.add_dependency(train.product, instrumented.job.product)
+        for obj in objects:
+            cxx_project.add_dependency(obj.product, train.product)
+            obj.add_input(train.product)
+
     def generate(self, project, toolchain=None):
         toolchain = toolchain if toolchain else self
+        with trace.phase("generate", project=project.name, toolchain=toolchain.name):
+            return self._generate(project, toolchain)
+
+    def _generate(self, project, toolchain):
         cxx_project = CXXProject(toolchain, project)
-        cxx_project.toolchain.apply_features(project, cxx_project, toolchain)
+        with trace.phase("apply features"):
+            cxx_project.toolchain.apply_features(project, cxx_project, toolchain)
+        feature = toolchain.find_feature('time-trace')
+        if build.time_report and feature:
+            feature.transform(project, cxx_project, toolchain)
+
+        training = project.get_training(toolchain) if isinstance(project, model.CXXExecutable) else None
+        feature = toolchain.find_feature('pgo')
+        if not self.profile_guided or isinstance(toolchain, pgo.Instrumented) or not feature:
+            training = None
+        if training:
+            profile = path.join(cxx_project.output, "pgo", "profile")
+            feature.transform(project, cxx_project, toolchain, stage='use', profile=profile)
 
         path_env = self.get_dependency_pathenv(toolchain, project.get_dependencies(toolchain))
         for command in project.get_commands(toolchain):
-            job = cxx_project.add_command(command.output, command.cmdline, env=path_env)
+            job = cxx_project.add_command(command.output, command.cmdline, env=path_env,
+                                          restat=command.args.get('restat', False))
             for input in command.inputs:
                 cxx_project.add_source(input)
                 cxx_project.add_dependency(job.product, input)
             
         groups = project.source_groups + [project]
         for group in groups:
-            for source in group.sources:
-                if not source.matches(toolchain.name):
-                    continue
+            sources = [source for source in group.sources if source.matches(toolchain.name)]
+            batches, sources = unity.batches(toolchain, project, group, sources)
+            for batch in batches:
+                tool = toolchain.get_tool(batch.tool)
+                obj = tool.transform(cxx_project, batch.write())
+                for source in batch.sources:
+                    self._add_source(cxx_project, source)
+                    cxx_project.add_dependency(obj.product, source.path)
+            for source in sources:
                 tool = toolchain.get_tool(source.tool)
                 tool.transform(cxx_project, source)
-                cxx_project.add_source(source.path)
-                for dep in source.depends:
-                    cxx_project.add_source(dep)
-                    cxx_project.add_dependency(source.path, dep)
+                self._add_source(cxx_project, source)
 
         if isinstance(project, model.CXXLibrary):
             objects = cxx_project.objects
@@ -297,6 +652,9 @@ class CXXToolchain(Toolchain):
                 archiver = toolchain.archiver if hasattr(toolchain, 'archiver') else self.archiver
             cxx_project.job = archiver.transform(project, cxx_project, object_names)
 
+        if training:
+            self._train(project, cxx_project, toolchain, training, profile, feature.merge)
+
         if isinstance(project, model.CXXExecutable):
             objects = cxx_project.objects
             object_names = [obj.product for obj in objects]
@@ -308,14 +666,20 @@ class CXXToolchain(Toolchain):
     def transform(self, project):
         return self.generate(project).transform()
 
+    def schedule(self, project, graph, toolchain=None):
+        return graph.add_project(self.generate(project, toolchain))
+
 
 class CXXProject(Settings):
     def __init__(self, toolchain, project):
         super(CXXProject, self).__init__()
         self._jobs = OrderedDict()
+        self._included = []
         self.project = project
         self.toolchain = toolchain
         self.output = path.join(toolchain.attributes.output, project.name)
+        self.log = BuildLog.open(toolchain.attributes.output)
+        self.deps_log = DepsLog.open(toolchain.attributes.output)
 
     @property
     def name(self):
@@ -325,20 +689,49 @@ class CXXProject(Settings):
     def objects(self):
         return [job for job in self._jobs.values() if isinstance(job, Object)]
 
+    @property
+    def external_libraries(self):
+        """ The libraries linked that aren't built by a dependency in this
+            toolchain, e.g. system or third-party libraries. """
+        own = set(dep.project.name for dep in self.project.get_dependencies(self.toolchain)
+                  if isinstance(dep.project, model.CXXLibrary))
+        return [lib for lib in self.libraries if lib not in own]
+
     @property
     def commands(self):
         return [job for job in self._jobs.values() if isinstance(job, Command)]
 
     @property
     def jobs(self):
-        return self._jobs.values()
+        """ The jobs of the project and of the projects included in it. """
+        if not self._included:
+            return self._jobs.values()
+        jobs = OrderedDict(self._jobs)
+        for cxx_project in self._included:
+            for job in cxx_project.jobs:
+                jobs.setdefault(job.product, job)
+        return jobs.values()
 
-    def add_command(self, product, cmdline=None, info=None, env=None):
+    @property
+    def included(self):
+        return self._included
+
+    def include(self, cxx_project):
+        """ Builds the jobs of another project along with this one, e.g.
+            a variant of it that this project's jobs depend on. """
+        self._included.append(cxx_project)
+
+    def add_command(self, product, cmdline=None, info=None, env=None, pool=None, restat=False):
         product = path.normpath(product)
         info = info or " [COMMAND] {}".format(product)
         if product in self._jobs:
             raise RuntimeError('already know about {}'.format(product))
-        job = Command(product, cmdline, info, env)
+        action = builtin.parse(cmdline)
+        if action:
+            job = Builtin(product, cmdline, action, info, pool=pool, restat=restat)
+        else:
+            job = Command(product, cmdline, info, env, pool=pool, restat=restat)
+        job.log = self.log
         self._jobs[job.product] = job
         return job
 
@@ -353,17 +746,33 @@ class CXXProject(Settings):
         if path in self._jobs:
             return self._jobs[path]
         job = FileList(path, files)
+        job.log = self.log
+        self._jobs[job.product] = job
+        return job
+
+    def add_textfile(self, path, text):
+        if path in self._jobs:
+            return self._jobs[path]
+        job = TextFile(path, text)
+        job.log = self.log
         self._jobs[job.product] = job
         return job
 
     def add_job(self, job):
         if job.product in self._jobs:
             raise RuntimeError('already know about {}'.format(job.product))
+        if isinstance(job, HashableMixin):
+            job.log = self.log
         self._jobs[job.product] = job
         return job
 
     def get_job(self, job):
-        return self._jobs.get(path.normpath(job)) 
+        product = path.normpath(job)
+        found = self._jobs.get(product)
+        for cxx_project in self._included:
+            if found is None:
+                found = cxx_project.get_job(product)
+        return found
        
     def add_dependency(self, product1, product2):
         job1 = self.get_job(product1)
@@ -375,49 +784,7 @@ class CXXProject(Settings):
         job1.add_dependency(job2)
 
     def transform(self):
-        if not hasattr(self, "job"):
-            return False
-        if not self.job.required: 
+        graph = BuildGraph()
+        if not graph.add_project(self):
             return False
-        jobs = OrderedDict()
-        consumes = OrderedDict()
-        for product, job in self._jobs.iteritems():
-            jobs[product] = []
-            consumes[product] = []
-
-        # Build graph of inverse dependencies
-        for product, job in self._jobs.iteritems():
-            for depname in job.dependencies():
-                dep = self._jobs[depname]
-                jobs[product].append(dep)
-                if dep.product not in consumes:
-                    consumes[dep.product] = []    
-                consumes[dep.product].append(job)
-        
-        # Process jobs
-        pool = utils.Pool()
-        while jobs:
-            candidates = [self._jobs[product] for product, deplist in jobs.iteritems() if not deplist]
-            for job in candidates:
-                del jobs[job.product]
-                pool.put(job) 
-
-            completed = []
-            try:
-                job = pool.get()
-                while job:
-                    completed.append(job)
-                    job = pool.get_nowait()
-            except Exception as e:
-                print(e)
-
-            for job in completed:
-                if type(job) == str:
-                    utils.print_locked(job)
-                    sys.exit(1)
-                else:
-                    for consumer in consumes[job.product]:
-                        jobs[consumer.product].remove(job)
-
-        pool.stop()
-        return True
+        return graph.transform()
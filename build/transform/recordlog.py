@@ -0,0 +1,140 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import atexit
+import os
+import threading
+
+
+class RecordLog(object):
+    """ Entries by key, kept in an append-only log file.
+
+        Changed entries are appended as records, the last record of a key
+        wins when the log is loaded, and the log is rewritten once it
+        holds many more records than keys. A log with a header that
+        starts otherwise is of an unknown format and started over.
+
+        Subclasses parse and format one line per record, or read and
+        write the records of a binary log altogether.
+    """
+    header = None
+    binary = False
+    # Records per key tolerated before the log is rewritten
+    stale = 2
+    # Number of pending records appended at once, or None to wait for save
+    batch = None
+    # Whether writes are synced to disk
+    sync = False
+
+    _logs = {}
+
+    def __init__(self, path):
+        super(RecordLog, self).__init__()
+        self.path = path
+        self._entries = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def open(cls, *args):
+        """ Returns the log constructed from args, loading it on first use.
+            Logs opened this way are saved at exit. """
+        log = RecordLog._logs.get((cls, args))
+        if log is None:
+            if not RecordLog._logs:
+                atexit.register(RecordLog.save_all)
+            log = RecordLog._logs[(cls, args)] = cls(*args)
+        return log
+
+    @classmethod
+    def save_all(cls):
+        """ Saves the logs of this class that were opened. """
+        for (kind, _), log in list(RecordLog._logs.items()):
+            if issubclass(kind, cls):
+                log.save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb" if self.binary else "r") as f:
+            data = f.read()
+        if self.header:
+            if not data.startswith(self.header):
+                # Unknown format, start over
+                os.remove(self.path)
+                return
+            data = data[len(self.header):]
+        records, complete = self._read(data)
+        for key, value in records:
+            self._entries[key] = value
+        if not complete or len(records) > self.stale * len(self._entries) + 1000:
+            self._compact()
+
+    def _read(self, data):
+        """ Returns the (key, value) records of data, and whether data
+            ended with a complete record. """
+        records = []
+        for line in data.split("\n"):
+            try:
+                records.append(self._parse(line))
+            except ValueError:
+                continue
+        return records, True
+
+    def _write(self, f, records):
+        f.write("".join(self._format(key, value) for key, value in records))
+
+    def _parse(self, line):
+        raise NotImplementedError()
+
+    def _format(self, key, value):
+        raise NotImplementedError()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb" if self.binary else "w") as f:
+            if self.header:
+                f.write(self.header)
+            self._write(f, self._entries.items())
+            self._sync(f)
+        os.rename(tmp, self.path)
+
+    def _sync(self, f):
+        if self.sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _update(self, key, value):
+        """ Sets the entry of key, with the lock held. """
+        self._entries[key] = value
+        self._pending.append((key, value))
+        if self.batch and len(self._pending) >= self.batch:
+            self._save()
+
+    def save(self):
+        """ Appends the pending records to the log. """
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if not self._pending:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        exists = os.path.exists(self.path)
+        with open(self.path, "ab" if self.binary else "a") as f:
+            if self.header and not exists:
+                f.write(self.header)
+            self._write(f, self._pending)
+            self._sync(f)
+        self._pending = []
@@ -0,0 +1,116 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import os
+import threading
+from os import path
+
+
+class StatCache(object):
+    """ A snapshot of the file system, stating each path at most once.
+
+        The first lookup in a directory lists the whole directory, so
+        lookups of missing files never reach the file system. Files that
+        exist are stated on first lookup, on Windows the listing already
+        carries their status. When a job completes its product is
+        invalidated along with the other files in its directory, in case
+        the job wrote more files next to its product.
+    """
+    _shared = None
+
+    def __init__(self):
+        super(StatCache, self).__init__()
+        self._dirs = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.scans = 0
+
+    @staticmethod
+    def shared():
+        if StatCache._shared is None:
+            StatCache._shared = StatCache()
+        return StatCache._shared
+
+    @staticmethod
+    def reset():
+        """ Starts a new snapshot, e.g. before building again. """
+        StatCache._shared = None
+
+    def _scan(self, directory):
+        self.scans += 1
+        entries = {}
+        try:
+            scandir = getattr(os, 'scandir', None)
+            if scandir:
+                for entry in scandir(directory or os.curdir):
+                    entries[path.normcase(entry.name)] = entry.stat() if os.name == 'nt' else None
+            else:
+                for name in os.listdir(directory or os.curdir):
+                    entries[path.normcase(name)] = None
+        except OSError:
+            pass
+        self._dirs[directory] = entries
+        return entries
+
+    def stat(self, filename):
+        """ Returns the status of filename, or None if it doesn't exist. """
+        directory, name = path.split(filename)
+        name = path.normcase(name)
+        if name in ('', os.curdir, os.pardir):
+            self.misses += 1
+            return self._stat(filename)
+
+        with self._lock:
+            entries = self._dirs.get(directory)
+            if entries is None:
+                entries = self._scan(directory)
+            if name not in entries:
+                if directory not in self._dirty:
+                    self.hits += 1
+                    return None
+                entries[name] = None
+            result = entries[name]
+            if result is not None:
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = self._stat(filename)
+        with self._lock:
+            if result is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = result
+        return result
+
+    def _stat(self, filename):
+        try:
+            return os.stat(filename)
+        except OSError:
+            return None
+
+    def exists(self, filename):
+        return self.stat(filename) is not None
+
+    def invalidate(self, filename):
+        directory, name = path.split(filename)
+        with self._lock:
+            entries = self._dirs.get(directory)
+            if entries is not None:
+                # Other files in the directory may have been written too
+                for entry in entries:
+                    entries[entry] = None
+                entries[path.normcase(name)] = None
+                self._dirty.add(directory)
+            # A new directory invalidates the listing of its contents
+            self._dirs.pop(filename, None)
@@ -0,0 +1,143 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Untimed(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_untimed = _Untimed()
+
+
+class Stats(object):
+    """ The time PAM spends on its own work, per phase, and counts of the
+        work done, such as files stat'ed and hashed.
+
+        Phases are timed inclusively: a phase entered again while it is
+        already being timed on the same thread, e.g. a digest computed
+        from the digests of its dependencies, is only counted once.
+    """
+    _shared = None
+
+    def __init__(self):
+        super(Stats, self).__init__()
+        self._phases = OrderedDict()
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def shared():
+        """ Returns the statistics of this build, or None if disabled. """
+        if Stats._shared is None and build.stats:
+            Stats._shared = Stats()
+        return Stats._shared
+
+    def add(self, name, seconds, calls=1):
+        with self._lock:
+            phase = self._phases.setdefault(name, [0, 0.0])
+            phase[0] += calls
+            phase[1] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def calls(self, name):
+        """ Returns how often the named phase ran, and for how long. """
+        calls, seconds = self._phases.get(name, (0, 0.0))
+        return calls, seconds
+
+    def counter(self, name):
+        return self._counts.get(name, 0)
+
+    def timed(self, name):
+        return _Timer(self, name)
+
+    def report(self):
+        """ Returns the lines of a report in the format of ninja -d stats. """
+        lines = ["{:<24}{:>8}{:>12}{:>12}".format("metric", "count", "avg (us)", "total (ms)")]
+        for name, (calls, seconds) in self._phases.items():
+            lines.append("{:<24}{:>8}{:>12.1f}{:>12.1f}".format(
+                name, calls, seconds * 1000000 / calls if calls else 0, seconds * 1000))
+        for name, n in self._counts.items():
+            lines.append("{:<24}{:>8}".format(name, n))
+        return lines
+
+
+class _Timer(object):
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        active = self.stats._local.__dict__.setdefault("active", set())
+        if self.name not in active:
+            active.add(self.name)
+            self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        if self.start is not None:
+            self.stats.add(self.name, time.time() - self.start)
+            self.stats._local.active.discard(self.name)
+        return False
+
+
+def add(name, seconds, calls=1):
+    stats = Stats.shared()
+    if stats is not None:
+        stats.add(name, seconds, calls)
+
+
+def count(name, n=1):
+    stats = Stats.shared()
+    if stats is not None:
+        stats.count(name, n)
+
+
+def timed(name):
+    """ Times the body as a phase, if statistics are enabled. """
+    stats = Stats.shared()
+    return stats.timed(name) if stats is not None else _untimed
+
+
+def profile(filename):
+    """ Profiles the rest of the run with cProfile, written to filename
+        at exit for pstats or snakeviz. Where tracemalloc is available,
+        a snapshot of the memory allocated is written next to it. """
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        import tracemalloc
+        tracemalloc.start()
+    except ImportError:
+        tracemalloc = None
+
+    def save():
+        profiler.disable()
+        profiler.dump_stats(filename)
+        if tracemalloc is not None:
+            tracemalloc.take_snapshot().dump(filename + ".tracemalloc")
+            tracemalloc.stop()
+
+    atexit.register(save)
+    profiler.enable()
@@ -0,0 +1,170 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from collections import OrderedDict
+import json
+import os
+import re
+
+
+# Phases of a gcc -ftime-report, by whether they belong to the frontend
+_GCC_FRONTEND = set(["phase setup", "phase parsing", "phase lang. deferred", "phase late parsing cleanups"])
+_GCC_BACKEND = set(["phase opt and generate", "phase last asm", "phase finalize"])
+
+# A line of a gcc -ftime-report: name, then user, system and wall time
+_GCC_LINE = re.compile(r"^\s*([^|:\s][^:]*?)\s*:\s*([\d.]+)\s*(?:\(\s*\d+%\))?\s+([\d.]+)\s*(?:\(\s*\d+%\))?\s+([\d.]+)")
+
+
+class Unit(object):
+    """ Compile times of a translation unit, in seconds. Headers map
+        each header included to the time spent parsing it, including
+        its own includes and the templates instantiated meanwhile. """
+
+    def __init__(self, product, total, frontend, backend, headers=None):
+        super(Unit, self).__init__()
+        self.product = product
+        self.total = total
+        self.frontend = frontend
+        self.backend = backend
+        self.headers = headers or {}
+
+
+def parse_trace(product, data):
+    """ Returns the unit of a clang -ftime-trace, or None if data isn't one. """
+    if not isinstance(data, dict) or not isinstance(data.get("traceEvents"), list):
+        return None
+    total, frontend, backend = 0, 0, 0
+    headers = {}
+    for event in data["traceEvents"]:
+        if event.get("ph") != "X":
+            continue
+        name, duration = event.get("name"), event.get("dur", 0) / 1000000.0
+        if name == "ExecuteCompiler":
+            total += duration
+        elif name == "Frontend":
+            frontend += duration
+        elif name == "Backend":
+            backend += duration
+        elif name == "Source":
+            header = event.get("args", {}).get("detail")
+            if header:
+                headers[header] = headers.get(header, 0) + duration
+    return Unit(product, total or frontend + backend, frontend, backend, headers)
+
+
+def parse_report(product, lines):
+    """ Returns the unit of a gcc -ftime-report printed among lines, or None
+        if there isn't one. Gcc doesn't tell the time spent per header. """
+    total, frontend, backend = None, 0, 0
+    for line in lines:
+        match = _GCC_LINE.match(line)
+        if not match:
+            continue
+        name, wall = match.group(1), float(match.group(4))
+        if name == "TOTAL":
+            total = wall
+        elif name in _GCC_FRONTEND:
+            frontend += wall
+        elif name in _GCC_BACKEND:
+            backend += wall
+    if total is None:
+        return None
+    return Unit(product, total, frontend, backend)
+
+
+def load(obj):
+    """ Returns the unit compiled to obj, from the time trace written next
+        to it, or the time report found in its output. """
+    trace = os.path.splitext(obj.product)[0] + ".json"
+    if os.path.exists(trace):
+        try:
+            with open(trace) as f:
+                return parse_trace(obj.product, json.load(f))
+        except (IOError, ValueError):
+            return None
+    lines = obj.diagnostics
+    if not lines and os.path.exists(obj.product + ".log"):
+        with open(obj.product + ".log") as f:
+            lines = f.read().splitlines()
+    return parse_report(obj.product, lines)
+
+
+class TimeReport(object):
+    """ Aggregates the compile times of the projects built with the
+        time-trace feature into the headers and translation units that
+        took the longest, across all of them.
+
+        Units are loaded after the build, so that units that were up to
+        date are reported from the traces of the build that compiled them.
+    """
+    _shared = None
+
+    def __init__(self):
+        super(TimeReport, self).__init__()
+        self._projects = OrderedDict()
+
+    @staticmethod
+    def shared():
+        if TimeReport._shared is None:
+            TimeReport._shared = TimeReport()
+        return TimeReport._shared
+
+    @property
+    def projects(self):
+        return self._projects.keys()
+
+    def add(self, cxx_project):
+        self._projects[cxx_project] = True
+
+    def _load(self):
+        """ Returns the units found, by product, and the products of the
+            objects without a trace or report. """
+        units = OrderedDict()
+        missing = set()
+        for cxx_project in self._projects:
+            for obj in getattr(cxx_project, "objects", []):
+                if obj.product not in units and obj.product not in missing:
+                    unit = load(obj)
+                    if unit is not None:
+                        units[obj.product] = unit
+                    else:
+                        missing.add(obj.product)
+        return units, missing
+
+    def units(self):
+        return self._load()[0].values()
+
+    def report(self, limit=10):
+        """ Returns the lines of a report of the limit most expensive
+            headers and translation units. """
+        units, missing = self._load()
+        units = units.values()
+        headers = {}
+        for unit in units:
+            for header, seconds in unit.headers.items():
+                total, count = headers.get(header, (0, 0))
+                headers[header] = (total + seconds, count + 1)
+
+        lines = ["%d units in %.2fs, %.2fs frontend, %.2fs backend" % (
+            len(units), sum(unit.total for unit in units),
+            sum(unit.frontend for unit in units), sum(unit.backend for unit in units))]
+        if missing:
+            lines.append("%d units without timing data, e.g. %s" % (len(missing), sorted(missing)[0]))
+        if headers:
+            lines.append("Most expensive headers:")
+            for header, (total, count) in sorted(headers.items(), key=lambda item: -item[1][0])[:limit]:
+                lines.append("  %8.0f ms  %4d units  %s" % (total * 1000, count, header))
+        if units:
+            lines.append("Slowest translation units:")
+            for unit in sorted(units, key=lambda unit: -unit.total)[:limit]:
+                lines.append("  %8.0f ms  frontend %.0f ms, backend %.0f ms  %s" % (
+                    unit.total * 1000, unit.frontend * 1000, unit.backend * 1000, unit.product))
+        return lines
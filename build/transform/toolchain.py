@@ -59,6 +59,9 @@ class ToolchainAttributes(object):
 
 
 class Toolchain(object):
+    # Whether the toolchain can be selected by name, e.g. with -t
+    registered = True
+
     def __init__(self, name):
         super(Toolchain, self).__init__()
         self._tools = {}
@@ -67,7 +70,8 @@ class Toolchain(object):
         self._requirements = []
         self.name = name
         self.attributes = ToolchainAttributes(self)
-        ToolchainRegistry.add(self)
+        if self.registered:
+            ToolchainRegistry.add(self)
 
     def add_feature(self, feature, name=None):
         if not name:
@@ -77,6 +81,9 @@ class Toolchain(object):
             # while named features are optional and selected by the project
             self._features_with_name[name] = feature
             
+    def find_feature(self, name):
+        return self._features_with_name.get(name)
+
     def apply_feature(self, project, transformed_project, toolchain, feature):
         if feature.matches(self.name):
             name, args = feature.name, feature.args
@@ -125,6 +132,11 @@ class Toolchain(object):
     def transform(self, project):
         pass
 
+    def schedule(self, project, graph, toolchain=None):
+        # Toolchains that can't contribute to a shared build graph
+        # are built right away.
+        return (toolchain or self).transform(project)
+
 
 class ToolchainExtender(Toolchain):
     def __init__(self, name, toolchain):
@@ -136,9 +148,15 @@ class ToolchainExtender(Toolchain):
     def supported(self):
         return self.toolchain.supported and super(ToolchainExtender, self).supported
 
+    def find_feature(self, name):
+        return super(ToolchainExtender, self).find_feature(name) or self.toolchain.find_feature(name)
+
     def apply_features(self, project, transformed_project, toolchain):
-        for feature in self._used_features:
-            self.apply_feature(project, transformed_project, toolchain, feature)
+        # Features used by the extender may come from the extended toolchain
+        for used in self._used_features:
+            feature = self.find_feature(used.name)
+            if feature and used.matches(self.name):
+                feature.transform(project, transformed_project, toolchain, **used.args)
         self.toolchain.apply_features(project, transformed_project, toolchain)
         super(ToolchainExtender, self).apply_features(project, transformed_project, toolchain)
         
@@ -160,3 +178,6 @@ class ToolchainExtender(Toolchain):
     def transform(self, project):
         self.generate(project, self).transform()
 
+    def schedule(self, project, graph, toolchain=None):
+        return self.toolchain.schedule(project, graph, toolchain or self)
+
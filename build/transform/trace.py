@@ -0,0 +1,116 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+import build
+from build.transform import stats
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Thread of the events that don't run in a job slot
+MAIN = 0
+
+
+class Trace(object):
+    """ A timeline of the build in the trace event format read by
+        chrome://tracing and Perfetto.
+
+        Jobs are drawn on one track per job slot, the phases of the build
+        such as loading projects and checking which jobs to run on a track
+        of their own. Events are kept in memory and written at exit.
+    """
+    _shared = None
+
+    def __init__(self, filename):
+        super(Trace, self).__init__()
+        self.filename = filename
+        self._events = []
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._thread(MAIN, "pam")
+
+    @staticmethod
+    def shared():
+        """ Returns the trace of this build, or None if not tracing. """
+        if Trace._shared is None and build.trace:
+            Trace._shared = Trace(build.trace)
+            atexit.register(Trace._shared.save)
+        return Trace._shared
+
+    def _thread(self, tid, name):
+        if tid in self._threads:
+            return
+        self._threads.add(tid)
+        self._events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}})
+        self._events.append({"name": "thread_sort_index", "ph": "M", "pid": self._pid, "tid": tid, "args": {"sort_index": tid}})
+
+    def complete(self, name, category, start, end, tid=MAIN, **args):
+        """ Records an event that started and ended at the given times. """
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1000000),
+            "dur": int((end - start) * 1000000),
+            "pid": self._pid,
+            "tid": tid,
+            "args": args}
+        with self._lock:
+            if tid != MAIN:
+                self._thread(tid, "slot {}".format(tid - 1))
+            self._events.append(event)
+
+    def save(self):
+        with self._lock:
+            with open(self.filename, "w") as f:
+                json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, f)
+
+
+def kind(job):
+    """ What a job does: links and archives are told apart from other
+        objects by their pool. """
+    if job.pool in ("link", "archive"):
+        return job.pool
+    return type(job).__name__
+
+
+def record(job, slot, start, end, error=None):
+    """ Records a job executed in slot, or outside of the pool if slot
+        is None. """
+    trace = Trace.shared()
+    if trace is None:
+        return
+    args = {"product": job.product, "type": kind(job)}
+    rc = getattr(job, "returncode", None)
+    if rc is not None:
+        args["exit"] = rc
+    if error is not None:
+        args["error"] = str(error)
+    trace.complete(job.info.strip(), args["type"], start, end, MAIN if slot is None else slot + 1, **args)
+
+
+@contextmanager
+def phase(name, **args):
+    """ Records the time spent in the body as a phase of the build. """
+    trace = Trace.shared()
+    start = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        stats.add(name, end - start)
+        if trace is not None:
+            trace.complete(name, "phase", start, end, **args)
@@ -0,0 +1,134 @@
+##############################################################################
+#
+# (C) 2017 - Robert Andersson - All rights reserved.
+#
+# This file and its contents are the property of Robert Andersson
+# and may not be distributed, copied, or disclosed, in whole or in part,
+# for any reason without written consent of the copyright holder.
+#
+##############################################################################
+
+
+from build import model
+from build.transform import stats
+from build.transform.recordlog import RecordLog
+from build.transform.statcache import StatCache
+from collections import OrderedDict
+import os
+import re
+import time
+
+
+class Edits(RecordLog):
+    """ Modification times of the sources of unity builds, and when each
+        source was last edited between builds.
+
+        Records are appended to a plain text log, one line per changed
+        source.
+    """
+    _shared = None
+
+    @staticmethod
+    def shared():
+        if Edits._shared is None:
+            Edits._shared = Edits.open(os.path.join("output", ".unity_edits"))
+        return Edits._shared
+
+    def _parse(self, line):
+        mtime, previous, last, filename = line.split("\t", 3)
+        return filename, (mtime, float(previous), float(last))
+
+    def _format(self, filename, entry):
+        return "{}\t{!r}\t{!r}\t{}\n".format(entry[0], entry[1], entry[2], filename)
+
+    def frequent(self, filename, window):
+        """ Whether filename was edited in two separate builds within the
+            last window seconds. """
+        s = StatCache.shared().stat(filename)
+        if s is None:
+            return False
+        mtime = repr(s.st_mtime)
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or entry[0] != mtime:
+                # The first time a source is seen isn't an edit
+                entry = (mtime, entry[2], s.st_mtime) if entry else (mtime, 0.0, 0.0)
+                self._update(filename, entry)
+        return time.time() - entry[1] < window
+
+
+def update(filename, text):
+    """ Writes text to filename unless it already has that content, so
+        that its consumers aren't rebuilt needlessly. """
+    if os.path.exists(filename):
+        with open(filename) as f:
+            if f.read() == text:
+                return False
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(filename, "w") as f:
+        f.write(text)
+    return True
+
+
+class Batch(object):
+    """ Sources of one tool merged into a generated unity source. """
+
+    def __init__(self, path, tool, sources):
+        super(Batch, self).__init__()
+        self.path = path
+        self.tool = tool
+        self.sources = sources
+
+    @property
+    def text(self):
+        return "".join('#include "{}"\n'.format(os.path.abspath(source.path)) for source in self.sources)
+
+    def write(self):
+        """ Writes the unity source, returns it as a source of the tool. """
+        update(self.path, self.text)
+        return model.Source(self.path, tool=self.tool)
+
+
+def batches(toolchain, project, group, sources):
+    """ Splits the sources of a group into unity batches, following the
+        unity settings of the group or else those of the project. Returns
+        the batches and the sources that are compiled on their own. """
+    unity = group.get_unity(toolchain) or project.get_unity(toolchain)
+    if not unity or unity.batch < 2:
+        return [], sources
+
+    exclude = re.compile(unity.exclude) if unity.exclude else None
+    singles = []
+    tool_sources = OrderedDict()
+    for source in sources:
+        tool = toolchain.get_tool(source.tool)
+        if exclude:
+            stats.count("regex")
+        if not getattr(tool, 'unity', False) or (exclude and exclude.search(source.path)):
+            singles.append(source)
+        else:
+            tool_sources.setdefault(source.tool, []).append(source)
+
+    # Sources are assigned to batches before frequently edited ones are
+    # taken out, so that taking one out only changes its own batch
+    groups = project.source_groups + [project]
+    output = os.path.join(toolchain.attributes.get_project_output(project), "unity")
+    result = []
+    for tool, tool_sources in tool_sources.items():
+        tool_sources.sort(key=lambda source: source.path)
+        for index in range(0, len(tool_sources), unity.batch):
+            batch = []
+            for source in tool_sources[index:index + unity.batch]:
+                if unity.window and Edits.shared().frequent(source.path, unity.window):
+                    singles.append(source)
+                else:
+                    batch.append(source)
+            if len(batch) < 2:
+                singles.extend(batch)
+                continue
+            path = os.path.join(output, "{}-{}{}".format(
+                groups.index(group), index // unity.batch, tool))
+            result.append(Batch(path, tool, batch))
+    return result, singles
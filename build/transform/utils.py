@@ -14,7 +14,12 @@ import os
 import threading
 import multiprocessing
 from Queue import Queue, Empty
+import atexit
 import sys
+import time
+import build
+from build.transform import process
+from build.transform import trace
 
 _lock = threading.Lock()
 
@@ -24,87 +29,107 @@ def print_locked(format, *args, **kwargs):
 	_lock.release()
 
 
-def execute(cmdline, env=os.environ, output=True):
-	p = subprocess.Popen(cmdline, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, env=env)
+def execute(cmdline, env=os.environ, output=True, log=None):
+	""" Runs cmdline and returns its exit code and the lines it printed
+	to stdout and stderr, stdout is echoed if output is True. All output
+	is written to the log file, if any, but only the beginning of it is
+	returned. """
+	return process.Engine.shared().run(cmdline, env, print_locked if output else None, log)
 
-	class Reader(threading.Thread):
-		def __init__(self, stream, output=None):
-			super(Reader, self).__init__()
-			self.output = output
-			self.stream = stream
-			self.buffer = []
-			self.start()
 
-		def run(self):
-			try:
-				for line in iter(self.stream.readline, b''):
-					line = line.strip()
-					if self.output:
-						self.output("{}", line)
-					self.buffer.append(line)
-			except Exception as e:
-				self.output("{}", str(e))
+def capture(cmdline, env=None):
+	""" Runs cmdline and returns its exit code and unmodified output. """
+	args = process.split(cmdline)
+	p = subprocess.Popen(args if args is not None else cmdline,
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=args is None, env=env)
+	stdout, stderr = p.communicate()
+	return p.returncode, stdout, stderr
 
-	stdout = Reader(p.stdout, output=print_locked if output else None)
-	stderr = Reader(p.stderr)
-	p.wait()
 
-	return p.returncode, stdout.buffer, stderr.buffer
+class KilledError(RuntimeError):
+	""" Raised when a job's process was killed, typically by the
+	out-of-memory killer. The job may succeed if retried with less
+	work running in parallel. """
+	pass
 
 
 class Thread(threading.Thread):
-	def __init__(self, index, input, output):
+	def __init__(self, index, input):
 		super(Thread, self).__init__()
 		self.daemon = True
 		self.index = index
 		self.input = input
-		self.output = output
 
 	def run(self):
 		while True:
-			job = self.input.get()
-			if not job:
+			item = self.input.get()
+			if not item:
 				return
+			job, output = item
+			start = time.time()
+			elapsed = None
 			try:
 				if job.executable and job.required and not job.completed:
 					print_locked('[{}]{}', self.index, job.info)
 					job.execute()
-				self.output.put(job)
+					elapsed = time.time() - start
+					trace.record(job, self.index, start, start + elapsed)
+				output.put((job, None, elapsed))
 			except Exception as e:
-				self.output.put(e.message)
+				trace.record(job, self.index, start, time.time(), e)
+				output.put((job, e, time.time() - start))
 
 
 class Pool(object):
-	def __init__(self):
+	_shared = None
+
+	def __init__(self, size=None):
+		self.size = size or build.jobs or multiprocessing.cpu_count()
 		self.input = Queue()
 		self.output = Queue()
 		self.threads = []
-		print('Threads: {}'.format(multiprocessing.cpu_count()))
-		for i in range(multiprocessing.cpu_count()):
-			thread = Thread(i, self.input, self.output)
+		print('Threads: {}'.format(self.size))
+		for i in range(self.size):
+			thread = Thread(i, self.input)
 			self.threads.append(thread)
 			thread.start()
 
-	def put(self, job):
-		self.input.put(job)
+	@staticmethod
+	def shared():
+		""" Returns the pool shared by all builds in this process. It is
+		started on first use and stopped at exit. """
+		if Pool._shared is None:
+			Pool._shared = Pool()
+			atexit.register(Pool.shutdown)
+		return Pool._shared
+
+	@staticmethod
+	def shutdown():
+		if Pool._shared is not None:
+			Pool._shared.stop()
+			Pool._shared = None
 
-	def get(self):
-		item = self.output.get()
-		if isinstance(item, Exception):
-			raise item
-		return item
+	def put(self, job, output=None):
+		self.input.put((job, output or self.output))
 
-	def get_nowait(self):
+	def get(self, output=None):
+		return (output or self.output).get()
+
+	def get_nowait(self, output=None):
 		try:
-			item = self.output.get_nowait()		
-			if isinstance(item, Exception):
-				raise item
-			return item            
+			return (output or self.output).get_nowait()
 		except Empty:
 			return None
 
 	def stop(self):
+		# Drop jobs that haven't started, e.g. after a failed build.
+		try:
+			while True:
+				self.input.get_nowait()
+		except Empty:
+			pass
 		for thread in self.threads:
 			self.input.put(None)
 		for thread in self.threads:
 			thread.join()
+		self.threads = []
@@ -579,7 +579,7 @@ class CXXToolchain(Toolchain):
                 add_target(dep)
        
         add_target(project)
-        toolchain.apply_features(project, cxx_project)
+        toolchain.apply_features(project, cxx_project, toolchain)
 
         sources_by_tool = {}
         groups = project.source_groups + [project]
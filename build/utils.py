@@ -12,6 +12,8 @@
 import sys
 import os
 import imp
+import mmap
+import re
 
 
 class Loader(object):
@@ -72,27 +74,102 @@ def multidispatch(dispatch, *types):
     return register
 
 
-class DepfileParser:
-    def __init__(self, filename):
-        self.data = ""
+class DepfileParser(object):
+    """ Parses the Makefile rules written by gcc and clang with -MD/-MMD.
+
+        The file is tokenized in a single pass. Spaces escaped with a
+        backslash, \\# and $$ are unescaped, backslashes elsewhere are
+        kept as in Windows paths and a colon only separates targets when
+        followed by whitespace. The prerequisites of all rules for the
+        first rule's targets are collected, empty rules such as the phony
+        targets written by -MP are ignored.
+
+        Depfiles larger than mmap_threshold are memory mapped rather than
+        read, unless use_mmap says otherwise.
+    """
+    mmap_threshold = 1 << 20
+
+    _token = re.compile(br"""
+          (?P<newline>\r?\n)
+        | (?P<space>(?:[ \t]|\\\r?\n)+)
+        | (?P<colon>:(?=[ \t]|\\?\r?\n|\Z))
+        | (?P<word>(?:
+              [^\s\\:$]+
+            | (?:\\\\)*\\[ ]
+            | \\\#
+            | \$\$
+            | \\+(?!\r?\n)
+            | :(?![ \t]|\\?\r?\n|\Z)
+            | \$
+            )+)
+        """, re.X)
+    _escape = re.compile(br"(?:\\\\)*\\[ ]|\\\#|\$\$")
+
+    def __init__(self, filename, use_mmap=None):
         self.product = ""
+        self.targets = []
         self.dependencies = []
 
         if not os.path.exists(filename):
             return
 
-        with open(filename) as f:
-            self.data = f.read()
-
-        self.data = self.data.replace("\n", "")
-        self.data = self.data.replace("\r", "")
-        self.data = self.data.replace("\\", "")
-
-        index = self.data.find(":")
-        if index < 0:
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if use_mmap is None:
+                use_mmap = size >= DepfileParser.mmap_threshold
+            if use_mmap and size > 0:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    self._parse(data)
+                finally:
+                    data.close()
+            else:
+                self._parse(f.read())
+
+        if self.targets:
+            self.product = self.targets[0]
+
+    @staticmethod
+    def _unescape_match(match):
+        token = match.group()
+        if token.endswith(b" "):
+            return token[:(len(token) - 2) // 2] + b" "
+        return token[1:]
+
+    @staticmethod
+    def _name(token):
+        if b"\\" in token or b"$" in token:
+            token = DepfileParser._escape.sub(DepfileParser._unescape_match, token)
+        if not isinstance(token, str):
+            token = token.decode("utf-8")
+        return os.path.normpath(token)
+
+    def _parse(self, data):
+        seen = set()
+        targets, deps = [], []
+        in_deps = False
+        for match in DepfileParser._token.finditer(data):
+            kind = match.lastgroup
+            if kind == "word":
+                (deps if in_deps else targets).append(match.group())
+            elif kind == "colon":
+                in_deps = True
+            elif kind == "newline":
+                self._rule(targets, deps, seen)
+                targets, deps = [], []
+                in_deps = False
+        self._rule(targets, deps, seen)
+
+    def _rule(self, targets, deps, seen):
+        if not targets or not deps:
             return
-
-        self.data = self.data[index+1:]
-        self.product = self.data[0:index]
-        self.dependencies = [dep for dep in self.data.split(" ") if dep]
-        self.dependencies = [os.path.normpath(dep) for dep in self.dependencies]
+        targets = [DepfileParser._name(target) for target in targets]
+        if not self.targets:
+            self.targets = targets
+        elif not set(targets) & set(self.targets):
+            return
+        for dep in deps:
+            dep = DepfileParser._name(dep)
+            if dep not in seen:
+                seen.add(dep)
+                self.dependencies.append(dep)
@@ -6,6 +6,7 @@ import os
 
 
 class FlatbufferCompiler(Tool):
+    pool = 'codegen'
     def __init__(self, *args, **kwargs):
         super(FlatbufferCompiler, self).__init__(*args, **kwargs)
         self._output_ext = ".h"
@@ -31,7 +32,7 @@ class FlatbufferCompiler(Tool):
         product = self._product(cxx_project, source_file.path)
         dir = self._directory(cxx_project, os.path.dirname(product))
         cxx_project.add_source(source_file.path)
-        cxx_project.add_command(product, self._cmdline(cxx_project, source_file.path), self._info(source_file.path))
+        cxx_project.add_command(product, self._cmdline(cxx_project, source_file.path), self._info(source_file.path), pool=self.pool, restat=True)
         cxx_project.add_dependency(product, source_file.path)
         cxx_project.add_dependency(product, dir.product)
 
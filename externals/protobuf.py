@@ -7,6 +7,7 @@ import os
 
 
 class ProtobufCompiler(Tool):
+    pool = 'codegen'
     dispatch = Dispatch()
 
     def __init__(self, *args, **kwargs):
@@ -35,7 +36,7 @@ class ProtobufCompiler(Tool):
         product = self._product(cxx_project, source_file.path)
         dir = self._directory(cxx_project, os.path.dirname(product))
         cxx_project.add_source(source_file.path)
-        cxx_project.add_command(product, self._cmdline(cxx_project, source_file.path), self._info(source_file.path))
+        cxx_project.add_command(product, self._cmdline(cxx_project, source_file.path), self._info(source_file.path), pool=self.pool, restat=True)
         cxx_project.add_dependency(product, source_file.path)
         cxx_project.add_dependency(product, dir.product)
 
@@ -0,0 +1,74 @@
+""" Benchmarks of the scheduler and the depfile parser, kept out of the
+    test suite since their timings depend on the machine. Run with:
+
+        python -m test.benchmark
+"""
+import gc
+import os
+import shutil
+import tempfile
+import time
+from build.transform.graph import Scheduler
+from build.utils import DepfileParser
+from test.depfile import CORPUS, corpus
+from test.graph import drain, synthetic_graph
+
+
+def best(measure, size, runs=3):
+    return min(measure(size) for _ in range(runs))
+
+
+def scheduler():
+    def measure(size):
+        graph = synthetic_graph(size)
+        # Keep the cyclic garbage collector from skewing the numbers,
+        # its full collections grow with the number of live objects.
+        gc.disable()
+        try:
+            start = time.time()
+            order = drain(Scheduler(graph))
+            elapsed = time.time() - start
+        finally:
+            gc.enable()
+        assert len(order) == size
+        return elapsed
+
+    # Twice the jobs should cost roughly twice the time, a quadratic
+    # scheduler would need four times as long
+    small, large = best(measure, 50000), best(measure, 100000)
+    print("scheduler: 50k jobs {:.3f}s, 100k jobs {:.3f}s, ratio {:.1f}".format(small, large, large / small))
+
+
+def depfile():
+    for name in sorted(os.listdir(CORPUS)):
+        size = os.path.getsize(corpus(name))
+        start = time.time()
+        for i in range(200):
+            parser = DepfileParser(corpus(name))
+        elapsed = (time.time() - start) / 200
+        print("depfile: {:<24} {:>4} deps {:>7} bytes {:8.1f}us".format(
+            name, len(parser.dependencies), size, elapsed * 1e6))
+
+    # A single huge depfile should parse in time linear to its size
+    directory = tempfile.mkdtemp()
+    try:
+        def measure(count):
+            deps = " \\\n".join(" /usr/include/very/long/path/to/header{}.h".format(i) for i in range(count))
+            filename = os.path.join(directory, "huge.d")
+            with open(filename, "wb") as f:
+                f.write(("out/huge.o: " + deps + "\n").encode("utf-8"))
+            start = time.time()
+            parser = DepfileParser(filename)
+            elapsed = time.time() - start
+            assert len(parser.dependencies) == count
+            return elapsed
+
+        small, large = best(measure, 50000), best(measure, 100000)
+        print("depfile: 50k deps {:.3f}s, 100k deps {:.3f}s, ratio {:.1f}".format(small, large, large / small))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    scheduler()
+    depfile()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import shutil
+import tempfile
+from build.transform.buildlog import BuildLog
+from build.transform.depslog import DepsLog
+from build.transform.recordlog import RecordLog
+
+
+class BuildLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_buildlog_reload(self):
+        log = BuildLog(self.directory)
+        log.set('a.o', '1')
+        log.set('b.o', '2')
+        log.set('a.o', '3')
+        self.assertEqual(log.get('a.o'), '3')
+        log.save()
+        log = BuildLog(self.directory)
+        self.assertEqual(log.get('a.o'), '3')
+        self.assertEqual(log.get('b.o'), '2')
+        self.assertIsNone(log.get('c.o'))
+
+    def test_buildlog_compact(self):
+        log = BuildLog(self.directory)
+        for i in range(2000):
+            log.set('a.o', str(i))
+        log.save()
+        with open(log.path) as f:
+            self.assertEqual(len(f.readlines()), 2001)
+        log = BuildLog(self.directory)
+        self.assertEqual(log.get('a.o'), '1999')
+        with open(log.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_buildlog_unknown_format(self):
+        with open(os.path.join(self.directory, BuildLog.filename), 'w') as f:
+            f.write('garbage\n')
+        log = BuildLog(self.directory)
+        self.assertIsNone(log.get('garbage'))
+        log.set('a.o', '1')
+        log.save()
+        self.assertEqual(BuildLog(self.directory).get('a.o'), '1')
+
+    def test_buildlog_open(self):
+        log = BuildLog.open(self.directory)
+        try:
+            self.assertIs(BuildLog.open(self.directory + os.sep), log)
+            self.assertIsNot(DepsLog.open(self.directory), log)
+            log.set('a.o', '1')
+            RecordLog.save_all()
+            self.assertEqual(BuildLog(self.directory).get('a.o'), '1')
+        finally:
+            RecordLog._logs.pop((BuildLog, (self.directory,)))
+            RecordLog._logs.pop((DepsLog, (self.directory,)))
+
+
+class DepsLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_depslog_reload(self):
+        log = DepsLog(self.directory)
+        log.set('a.o', ['a.cpp', 'a.h', 'common.h'])
+        log.set('b.o', ['b.cpp', 'common.h'])
+        log.set('a.o', ['a.cpp', 'common.h'])
+        log.save()
+        log = DepsLog(self.directory)
+        self.assertEqual(log.get('a.o'), ['a.cpp', 'common.h'])
+        self.assertEqual(log.get('b.o'), ['b.cpp', 'common.h'])
+        self.assertIsNone(log.get('c.o'))
+
+    def test_depslog_truncated(self):
+        log = DepsLog(self.directory)
+        log.set('a.o', ['a.cpp'])
+        log.save()
+        log.set('b.o', ['b.cpp'])
+        log.save()
+        with open(log.path, 'rb+') as f:
+            f.seek(-2, os.SEEK_END)
+            f.truncate()
+        log = DepsLog(self.directory)
+        self.assertEqual(log.get('a.o'), ['a.cpp'])
+        self.assertIsNone(log.get('b.o'))
+        log.set('b.o', ['b.cpp'])
+        log.save()
+        self.assertEqual(DepsLog(self.directory).get('b.o'), ['b.cpp'])
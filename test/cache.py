@@ -0,0 +1,215 @@
+import unittest
+import os
+import shutil
+import tempfile
+import build
+from build.transform import pybuild
+from build.transform.statcache import StatCache
+from build.transform.cache import ObjectCache, RemoteCache, clone, pack, parse_size, unpack
+from test.cacheserver import CacheServer
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        ObjectCache._shared = None
+        build.cache_dir = None
+        build.remote_cache = None
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(data)
+        return filename
+
+    def test_cache_parse_size(self):
+        self.assertEqual(parse_size('1024'), 1024)
+        self.assertEqual(parse_size('500M'), 500 << 20)
+        self.assertEqual(parse_size('1.5k'), 1536)
+        self.assertRaises(ValueError, parse_size, 'lots')
+
+    def test_cache_clone(self):
+        a = self.write('a.o', 'object')
+        b = os.path.join(self.directory, 'b.o')
+        clone(a, b)
+        with open(b) as f:
+            self.assertEqual(f.read(), 'object')
+        self.assertEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+
+    def test_cache_store_fetch(self):
+        cache = ObjectCache(self.cache_dir, 1 << 20)
+        product = self.write('a.o', 'object')
+        cache.store('ab' * 32, {'object': product}, {'diagnostics': 'warning'})
+        os.remove(product)
+        self.assertFalse(cache.fetch('cd' * 32, {'object': product}))
+        self.assertTrue(cache.fetch('ab' * 32, {'object': product}))
+        self.assertEqual(cache.read('ab' * 32, 'diagnostics'), 'warning')
+        with open(product) as f:
+            self.assertEqual(f.read(), 'object')
+        self.assertEqual((cache.hits, cache.misses, cache.stores), (1, 1, 1))
+
+    def test_cache_eviction(self):
+        cache = ObjectCache(self.cache_dir, 2500)
+        keys = ['{:064x}'.format(i) for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.store(key, {'object': self.write('{}.o'.format(i), 'x' * 1000)})
+            os.utime(cache._entry(key), (i, i))
+        # Using an entry makes it the most recently used one
+        self.assertTrue(cache.fetch(keys[0], {'object': os.path.join(self.directory, 'used.o')}))
+        cache.cleanup()
+        self.assertEqual(cache.evictions, 2)
+        self.assertTrue(os.path.exists(cache._entry(keys[0])))
+        self.assertFalse(os.path.exists(cache._entry(keys[1])))
+        self.assertFalse(os.path.exists(cache._entry(keys[2])))
+        self.assertTrue(os.path.exists(cache._entry(keys[3])))
+
+    def test_cache_object(self):
+        build.cache_dir = self.cache_dir
+        source = self.write('a.c', 'int a;')
+        product = os.path.join(self.directory, 'a.o')
+        counter = os.path.join(self.directory, 'count')
+
+        def compile():
+            obj = pybuild.Object(
+                product, 'cp {} {} && echo >> {} && echo warning >&2'.format(source, product, counter), 'a.c',
+                preprocess='cat {}'.format(source), compiler='echo compiler 1.0')
+            obj.execute()
+            with open(product) as f, open(counter) as c:
+                return f.read(), len(c.read())
+
+        self.assertEqual(compile(), ('int a;', 1))
+        os.remove(product)
+        os.remove(product + '.log')
+        self.assertEqual(compile(), ('int a;', 1))
+        # A cache hit leaves the log of the compile
+        with open(product + '.log') as f:
+            self.assertEqual(f.read().strip(), 'warning')
+        self.write('a.c', 'int b;')
+        self.assertEqual(compile(), ('int b;', 2))
+        cache = ObjectCache.shared()
+        self.assertEqual((cache.hits, cache.misses, cache.stores), (1, 2, 2))
+
+    def test_cache_pack(self):
+        files = {'object': (0o755, b'\0\1' * 1000), 'diagnostics': (0o644, b'')}
+        blob = pack(files)
+        self.assertLess(len(blob), 100)
+        self.assertEqual(unpack(blob), files)
+
+    def test_cache_illegal_names(self):
+        for name in ['../../x', '/tmp/x', 'object/../../x', 'other']:
+            self.assertRaises(ValueError, unpack, pack({name: (0o644, b'x')}))
+        # A hostile remote entry is a miss, nothing is written outside the cache
+        server = CacheServer().start()
+        try:
+            files = {'object': (0o644, b'x'), '../../../escaped': (0o644, b'x')}
+            server.entries['/' + 'ab' * 32] = pack(files)
+            cache = ObjectCache(self.cache_dir, 1 << 20, RemoteCache(server.url))
+            self.assertFalse(cache.fetch('ab' * 32, {'object': os.path.join(self.directory, 'a.o')}))
+            self.assertFalse(os.path.exists(cache._entry('ab' * 32)))
+            self.assertFalse(os.path.exists(os.path.join(self.directory, 'escaped')))
+        finally:
+            server.stop()
+
+    def test_cache_remote_modes(self):
+        # Special bits from a remote entry never reach the products
+        server = CacheServer().start()
+        try:
+            server.entries['/' + 'ab' * 32] = pack({'object': (0o6777, b'x')})
+            cache = ObjectCache(self.cache_dir, 1 << 20, RemoteCache(server.url))
+            product = os.path.join(self.directory, 'a.o')
+            self.assertTrue(cache.fetch('ab' * 32, {'object': product}))
+            self.assertEqual(os.stat(product).st_mode & 0o7777, 0o755)
+        finally:
+            server.stop()
+
+    def test_cache_remote(self):
+        server = CacheServer().start()
+        try:
+            product = self.write('a.o', 'object')
+            os.chmod(product, 0o755)
+            first = ObjectCache(os.path.join(self.directory, 'first'), 1 << 20, RemoteCache(server.url))
+            first.store('ab' * 32, {'object': product}, {'diagnostics': 'warning'})
+            first.cleanup()
+            self.assertEqual((first.remote.uploads, server.puts), (1, 1))
+
+            # Another local cache is filled from the remote one
+            os.remove(product)
+            second = ObjectCache(os.path.join(self.directory, 'second'), 1 << 20, RemoteCache(server.url))
+            self.assertFalse(second.fetch('cd' * 32, {'object': product}))
+            self.assertTrue(second.fetch('ab' * 32, {'object': product}))
+            self.assertTrue(second.fetch('ab' * 32, {'object': product}))
+            self.assertEqual(second.read('ab' * 32, 'diagnostics'), 'warning')
+            with open(product) as f:
+                self.assertEqual(f.read(), 'object')
+            self.assertEqual(os.stat(product).st_mode & 0o777, 0o755)
+            self.assertEqual((second.remote.hits, second.remote.misses), (1, 1))
+
+            # A read-only remote cache is never written to
+            third = ObjectCache(os.path.join(self.directory, 'third'), 1 << 20, RemoteCache(server.url, read_only=True))
+            third.store('ef' * 32, {'object': product})
+            third.cleanup()
+            self.assertEqual((third.stores, server.puts), (1, 1))
+        finally:
+            server.stop()
+
+    def test_cache_remote_unavailable(self):
+        server = CacheServer()
+        url = server.url
+        server.server_close()
+        cache = ObjectCache(self.cache_dir, 1 << 20, RemoteCache(url, timeout=1))
+        product = self.write('a.o', 'object')
+        self.assertFalse(cache.fetch('ab' * 32, {'object': product}))
+        cache.store('ab' * 32, {'object': product})
+        cache.cleanup()
+        self.assertEqual(cache.remote.errors, 2)
+        self.assertTrue(cache.fetch('ab' * 32, {'object': product}))
+
+    def test_cache_archive(self):
+        build.cache_dir = self.cache_dir
+        objects = [self.write('a.o', 'a'), self.write('b.o', 'b')]
+        product = os.path.join(self.directory, 'lib.a')
+        counter = os.path.join(self.directory, 'count')
+
+        def archive():
+            lib = pybuild.Object(
+                product, 'cat {} > {} && echo >> {}'.format(' '.join(objects), product, counter), 'lib',
+                compiler='echo archiver 1.0', inputs=objects + [os.path.join(self.directory, 'missing.a')])
+            lib.execute()
+            StatCache.reset()
+            with open(product) as f, open(counter) as c:
+                return f.read(), len(c.read())
+
+        self.assertEqual(archive(), ('ab', 1))
+        os.remove(product)
+        self.assertEqual(archive(), ('ab', 1))
+        self.write('b.o', 'c')
+        self.assertEqual(archive(), ('ac', 2))
+
+    def test_cache_outputs(self):
+        build.cache_dir = self.cache_dir
+        source = self.write('a.c', 'int a;')
+        product = os.path.join(self.directory, 'a.o')
+        dwo = os.path.join(self.directory, 'a.dwo')
+        counter = os.path.join(self.directory, 'count')
+
+        def compile():
+            obj = pybuild.Object(
+                product, 'cp {} {} && cp {} {} && echo >> {}'.format(source, product, source, dwo, counter), 'a.c',
+                preprocess='cat {}'.format(source), compiler='echo compiler 1.0', outputs=[dwo])
+            StatCache.reset()
+            self.assertEqual(obj.outputs, [dwo])
+            outdated = obj.outdated()
+            obj.execute()
+            with open(dwo) as f, open(counter) as c:
+                return outdated, f.read(), len(c.read())
+
+        self.assertEqual(compile(), (True, 'int a;', 1))
+        # A missing output makes the object outdated, it comes from the cache
+        os.remove(dwo)
+        self.assertEqual(compile(), (True, 'int a;', 1))
+        cache = ObjectCache.shared()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
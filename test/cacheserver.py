@@ -0,0 +1,65 @@
+""" A minimal stand-in for a remote object cache, storing entries in memory.
+
+    python -m test.cacheserver [PORT]
+"""
+import sys
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        blob = self.server.entries.get(self.path)
+        if blob is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(blob)))
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def do_PUT(self):
+        blob = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.entries[self.path] = blob
+        self.server.puts += 1
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class CacheServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        HTTPServer.__init__(self, ("127.0.0.1", port), _Handler)
+        self.entries = {}
+        self.puts = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    server = CacheServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print("Serving cache at {}".format(server.url))
+    server.serve_forever()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import shutil
+import tempfile
+from build.utils import DepfileParser
+
+
+CORPUS = os.path.join(os.path.dirname(__file__), "depfiles")
+
+
+def corpus(name):
+    return os.path.join(CORPUS, name)
+
+
+class DepfileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        filename = os.path.join(self.directory, "test.d")
+        with open(filename, "wb") as f:
+            f.write(data)
+        return filename
+
+    def test_depfile_missing(self):
+        parser = DepfileParser(os.path.join(self.directory, "missing.d"))
+        self.assertEqual(parser.product, "")
+        self.assertEqual(parser.dependencies, [])
+
+    def test_depfile_gcc_escapes(self):
+        parser = DepfileParser(corpus("gcc_mmd_mp.d"))
+        self.assertEqual(parser.product, "out/main file.cpp.o")
+        self.assertEqual(parser.dependencies, [
+            "main file.cpp", "dir with space/my header.h", "hash#name.h"])
+
+    def test_depfile_gcc_dollar(self):
+        parser = DepfileParser(corpus("gcc_dollar.d"))
+        self.assertEqual(parser.product, "out/dollar$x.cpp.o")
+        self.assertEqual(parser.dependencies, ["dollar$x.cpp", "dir with space/my header.h"])
+
+    def test_depfile_gcc_multiple_targets(self):
+        parser = DepfileParser(corpus("gcc_multi_target.d"))
+        self.assertEqual(parser.targets, ["out/a.o", "out/b.o"])
+        self.assertEqual(parser.product, "out/a.o")
+        self.assertEqual(len(parser.dependencies), 3)
+
+    def test_depfile_gcc_system(self):
+        parser = DepfileParser(corpus("gcc_md_system.d"))
+        self.assertEqual(parser.product, "out/main file.cpp.o")
+        self.assertEqual(parser.dependencies[0], "main file.cpp")
+        self.assertIn("/usr/include/stdc-predef.h", parser.dependencies)
+        self.assertIn("hash#name.h", parser.dependencies)
+        for dep in parser.dependencies:
+            self.assertNotIn("\\", dep)
+            self.assertFalse(dep.endswith(":"))
+
+    def test_depfile_clang(self):
+        parser = DepfileParser(corpus("clang_linux.d"))
+        self.assertEqual(parser.product, "out/src/widget.cpp.o")
+        self.assertEqual(len(parser.dependencies), 10)
+        self.assertEqual(parser.dependencies[-1], "include/detail/widget_impl.h")
+        parser = DepfileParser(corpus("clang_mp.d"))
+        self.assertEqual(parser.dependencies, [
+            "src/widget.cpp", "include/widget.h", "include/detail/widget_impl.h"])
+
+    def test_depfile_windows_crlf(self):
+        parser = DepfileParser(corpus("clang_windows_crlf.d"))
+        self.assertEqual(parser.product, "C:\\src\\app\\out\\main.cpp.obj")
+        self.assertEqual(len(parser.dependencies), 5)
+        self.assertIn("C:\\Program Files (x86)\\Windows Kits\\10\\Include\\10.0.19041.0\\ucrt\\stdio.h",
+            parser.dependencies)
+
+    def test_depfile_backslashes(self):
+        parser = DepfileParser(self.write(b"a.o: a\\\\ b\\\\\\ c d\\e\n"))
+        self.assertEqual(parser.dependencies, ["a\\\\", "b\\ c", "d\\e"])
+
+    def test_depfile_mmap(self):
+        for name in sorted(os.listdir(CORPUS)):
+            read = DepfileParser(corpus(name), use_mmap=False)
+            mapped = DepfileParser(corpus(name), use_mmap=True)
+            self.assertEqual(read.targets, mapped.targets)
+            self.assertEqual(read.dependencies, mapped.dependencies)
+        self.assertEqual(DepfileParser(self.write(b""), use_mmap=True).dependencies, [])
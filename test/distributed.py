@@ -0,0 +1,104 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import build
+from build.transform import pybuild
+from build.transform.distributed import WorkerServer, Workers, parse_worker
+
+
+class DistributedTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        Workers._shared = None
+        build.workers = []
+        shutil.rmtree(self.directory)
+
+    def start_worker(self, slots):
+        process = subprocess.Popen(
+            [sys.executable, '-u', '-m', 'build.transform.distributed', '--port', '0', '--slots', str(slots)],
+            stdout=subprocess.PIPE)
+        self.processes.append(process)
+        port = process.stdout.readline().split()[-1].decode('utf-8')
+        return '127.0.0.1:{}'.format(port)
+
+    def write(self, name, data):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(data)
+        return filename
+
+    def compile(self, name, distribute='cp {input} {output}'):
+        source = self.write(name + '.c', 'int {};'.format(name))
+        product = os.path.join(self.directory, name + '.o')
+        obj = pybuild.Object(
+            product, 'cp {} {}'.format(source, product), name,
+            preprocess='cat {}'.format(source), distribute=distribute)
+        obj.execute()
+        with open(product) as f:
+            return f.read()
+
+    def compile_all(self, names):
+        results = {}
+        def run(name):
+            results[name] = self.compile(name)
+        threads = [threading.Thread(target=run, args=(name,)) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_distributed_parse_worker(self):
+        self.assertEqual(parse_worker('build1:8000=8'), ('build1:8000', 8))
+        self.assertEqual(parse_worker('build1:8000'), ('build1:8000', 1))
+        self.assertRaises(ValueError, parse_worker, 'build1')
+        self.assertRaises(ValueError, parse_worker, 'build1:8000=0')
+
+    def test_distributed_loopback(self):
+        server = WorkerServer()
+        try:
+            self.assertEqual(server.server_address[0], '127.0.0.1')
+        finally:
+            server.server_close()
+
+    def test_distributed_compile(self):
+        build.workers = [(self.start_worker(2), 2), (self.start_worker(2), 2)]
+        names = ['a', 'b', 'c', 'd']
+        results = self.compile_all(names)
+        self.assertEqual(results, dict((name, 'int {};'.format(name)) for name in names))
+        workers = Workers.shared()
+        self.assertEqual(workers.compiled + workers.fallbacks, 4)
+        self.assertGreater(workers.compiled, 0)
+
+    def test_distributed_failure(self):
+        build.workers = [(self.start_worker(1), 1)]
+        self.assertRaises(RuntimeError, self.compile, 'a', 'false')
+
+    def test_distributed_worker_error(self):
+        build.workers = [(self.start_worker(1), 1)]
+        # A compiler missing on the worker isn't a failure of the job
+        self.assertEqual(self.compile('a', 'pam-missing-compiler {input} {output}'), 'int a;')
+        self.assertEqual(self.compile('b', 'true'), 'int b;')
+        workers = Workers.shared()
+        self.assertEqual((workers.compiled, workers.fallbacks, workers.slots), (0, 2, 1))
+
+    def test_distributed_fallback(self):
+        build.workers = [(self.start_worker(1), 1), (self.start_worker(1), 1)]
+        self.processes[0].kill()
+        self.processes[0].wait()
+        for name in ['a', 'b', 'c']:
+            self.assertEqual(self.compile(name), 'int {};'.format(name))
+        workers = Workers.shared()
+        # The dead worker is only tried once
+        self.assertEqual((workers.compiled, workers.fallbacks, workers.slots), (2, 1, 1))
@@ -0,0 +1,362 @@
+import unittest
+import json
+import random
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from build.transform.graph import BuildGraph, Scheduler, Slots
+from build.transform.history import History
+from build.transform.buildlog import BuildLog
+from build.transform.statcache import StatCache
+from build.transform import builtin
+from build.transform import pybuild
+from build.transform import stats
+from build.transform import trace
+from build.tools.directory import Directory
+
+
+def synthetic_graph(size, fanin=8, seed=0):
+    """ A layered graph resembling a large build: most jobs depend on a
+    handful of earlier jobs, a few (archives, links) depend on many. """
+    rnd = random.Random(seed)
+    graph = OrderedDict()
+    for i in range(size):
+        product = 'job{}'.format(i)
+        if i < fanin:
+            graph[product] = []
+        elif i % 1000 == 0:
+            graph[product] = ['job{}'.format(j) for j in range(i - 1000, i)]
+        else:
+            graph[product] = list(set('job{}'.format(rnd.randrange(0, i)) for _ in range(fanin)))
+    return graph
+
+
+class FakeProject(object):
+    """ A generated project made of jobs, without a model project or
+        toolchain behind it. All jobs but sources record their digests
+        in log, the final job defaults to the last one. Dependencies
+        are other fake projects. """
+
+    class Model(object):
+        def __init__(self, dependencies):
+            self.dependencies = dependencies
+
+        def get_dependencies(self, toolchain):
+            return self.dependencies
+
+    def __init__(self, jobs, log, job=None, dependencies=()):
+        self.project, self.toolchain = FakeProject.Model(list(dependencies)), None
+        self.jobs = jobs
+        self.job = job or jobs[-1]
+        for job in jobs:
+            if not isinstance(job, pybuild.Source):
+                job.log = log
+
+    def get_job(self, product):
+        return next((job for job in self.jobs if job.product == product), None)
+
+
+def drain(scheduler):
+    order = []
+    while not scheduler.finished:
+        ready = scheduler.take()
+        if not ready:
+            break
+        for product in ready:
+            order.append(product)
+            scheduler.complete(product)
+    return order
+
+
+class GraphTest(unittest.TestCase):
+    def test_scheduler_order(self):
+        graph = synthetic_graph(5000)
+        order = drain(Scheduler(graph))
+        self.assertEqual(len(order), len(graph))
+        done = set()
+        for product in order:
+            for dep in graph[product]:
+                self.assertIn(dep, done)
+            done.add(product)
+
+    def test_scheduler_cycle(self):
+        graph = OrderedDict([('a', []), ('b', ['a', 'c']), ('c', ['b'])])
+        scheduler = Scheduler(graph)
+        self.assertEqual(drain(scheduler), ['a'])
+        self.assertFalse(scheduler.finished)
+        self.assertEqual(sorted(scheduler.blocked()), ['b', 'c'])
+
+    def test_scheduler_critical_path(self):
+        graph = OrderedDict([
+            ('descriptor.o', []), ('message.o', []), ('util.o', []),
+            ('protobuf.a', ['descriptor.o', 'message.o']),
+            ('tool', ['protobuf.a', 'util.o'])])
+        cost = {'descriptor.o': 20, 'message.o': 5, 'util.o': 1, 'protobuf.a': 2, 'tool': 3}
+        path = Scheduler(graph).critical_path(cost.get)
+        self.assertEqual(path['descriptor.o'], 25)
+        self.assertEqual(path['message.o'], 10)
+        self.assertEqual(path['util.o'], 4)
+        self.assertEqual(path['tool'], 3)
+
+    def test_history(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmp, 'output', '.history')
+            history = History(filename)
+            history.record('a.o', 1.5)
+            history.record('b.o', 0.25, failed=True)
+            history.record('a.o', 2.0)
+            history.save()
+            history = History(filename)
+            self.assertEqual(history.duration('a.o'), 2.0)
+            self.assertEqual(history.duration('c.o', 7), 7)
+            self.assertTrue(history.failed('b.o'))
+            self.assertFalse(history.failed('a.o'))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_dirty_check(self):
+        def make_project(graph, log):
+            jobs = []
+            sources = [pybuild.Source(os.path.join(tmp, 'source{}'.format(i))) for i in range(8)]
+            for product, deps in graph.iteritems():
+                job = pybuild.Command(os.path.join(tmp, product), 'touch ' + product, product)
+                for dep in deps:
+                    job.add_dependency(jobs[int(dep[3:])])
+                job.add_dependency(sources[len(jobs) % len(sources)])
+                jobs.append(job)
+            return FakeProject(jobs + sources, log, jobs[-1])
+
+        tmp = tempfile.mkdtemp()
+        try:
+            graph = synthetic_graph(2000)
+            for product in list(graph) + ['source{}'.format(i) for i in range(8)]:
+                with open(os.path.join(tmp, product), 'w'):
+                    pass
+            log = BuildLog(tmp)
+            for job in make_project(graph, log).jobs[:len(graph)]:
+                log.set(job.product, job.get_hash())
+
+            # Null build, every digest is computed exactly once
+            pybuild.Job.hashes = 0
+            project = make_project(graph, log)
+            self.assertFalse(BuildGraph().add_project(project))
+            self.assertEqual(pybuild.Job.hashes, len(project.jobs))
+
+            # Only jobs downstream of a changed job are required
+            changed = project.jobs[1500]
+            log.set(changed.product, 'changed')
+            project = make_project(graph, log)
+            self.assertTrue(BuildGraph().add_project(project))
+            required = set(job.product for job in project.jobs if job.required)
+            self.assertIn(changed.product, required)
+            for job in project.jobs:
+                if job.product in required and job.product != changed.product:
+                    self.assertTrue(any(dep in required for dep in job.dependencies()))
+            self.assertLess(len(required), len(graph) // 2)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_restat(self):
+        def make_project(log):
+            source = pybuild.Source(path('input'))
+            gen = pybuild.Command(path('gen'), "grep -v '^#' {} > {}".format(path('input'), path('gen')), 'gen', restat=True)
+            use = pybuild.Command(path('use'), "cp {} {} && echo >> {}".format(path('gen'), path('use'), path('count')), 'use')
+            final = pybuild.Command(path('final'), "cp {} {}".format(path('use'), path('final')), 'final')
+            gen.add_dependency(source)
+            use.add_dependency(gen)
+            final.add_dependency(use)
+            return FakeProject([source, gen, use, final], log)
+
+        def build(data):
+            with open(path('input'), 'w') as f:
+                f.write(data)
+            StatCache.reset()
+            graph = BuildGraph()
+            if graph.add_project(make_project(log)):
+                graph.transform()
+            with open(path('count')) as f:
+                return len(f.read())
+
+        tmp = tempfile.mkdtemp()
+        path = lambda name: os.path.join(tmp, name)
+        try:
+            log = BuildLog(tmp)
+            self.assertEqual(build('# comment\nint x;\n'), 1)
+            self.assertEqual(build('# edited comment\nint x;\n'), 1)
+            self.assertEqual(build('# edited comment\nint xy;\n'), 2)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_dependency_changed(self):
+        def build(source):
+            with open(path('a.c'), 'w') as f:
+                f.write(source)
+            StatCache.reset()
+            source = pybuild.Source(path('a.c'))
+            lib = pybuild.Command(path('liba'), 'cp {} {}'.format(path('a.c'), path('liba')), 'liba')
+            lib.add_dependency(source)
+            archive = pybuild.Source(path('liba'))
+            exe = pybuild.Command(path('exe'), 'cp {} {} && echo >> {}'.format(path('liba'), path('exe'), path('count')), 'exe')
+            exe.add_dependency(archive)
+            a = FakeProject([source, lib], log)
+            b = FakeProject([archive, exe], log, dependencies=[a])
+            # Scheduled like -g does, each project checked before any is built
+            graph = BuildGraph()
+            added = [graph.add_project(a), graph.add_project(b)]
+            if any(added):
+                graph.transform()
+            with open(path('count')) as f:
+                return added, len(f.read())
+
+        tmp = tempfile.mkdtemp()
+        path = lambda name: os.path.join(tmp, name)
+        try:
+            log = BuildLog(tmp)
+            self.assertEqual(build('int a;'), ([True, True], 1))
+            self.assertEqual(build('int a;'), ([False, False], 1))
+            # The dependent isn't up to date yet when it's scheduled
+            self.assertEqual(build('int ab;'), ([True, True], 2))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_builtin(self):
+        self.assertIsNone(builtin.parse('cp -r a b'))
+        self.assertIsNone(builtin.parse('cat a > b'))
+        self.assertEqual(builtin.parse('mkdir -p "a b"').args, ('a b',))
+
+        tmp = tempfile.mkdtemp()
+        path = lambda name: os.path.join(tmp, name)
+        try:
+            with open(path('input'), 'w') as f:
+                f.write('data')
+            StatCache.reset()
+            source = pybuild.Source(path('input'))
+            directory = Directory(path('out/sub'))
+            copy = pybuild.Builtin(path('out/sub/copy'), 'cp input out/sub/copy',
+                                   builtin.parse('cp {} {}'.format(path('input'), path('out/sub/copy'))), 'copy')
+            copy.add_dependency(source)
+            copy.add_dependency(directory)
+            graph = BuildGraph()
+            self.assertTrue(graph.add_project(FakeProject([source, directory, copy], BuildLog(tmp))))
+            trace.Trace._shared = trace.Trace(path('trace.json'))
+            graph.transform()
+            with open(path('out/sub/copy')) as f:
+                self.assertEqual(f.read(), 'data')
+
+            # The directory is made up front, the copy goes through the pool
+            trace.Trace.shared().save()
+            with open(path('trace.json')) as f:
+                events = dict((event['args']['product'], event['tid'])
+                              for event in json.load(f)['traceEvents'] if event['ph'] == 'X')
+            self.assertEqual(events[directory.product], trace.MAIN)
+            self.assertNotEqual(events[copy.product], trace.MAIN)
+        finally:
+            trace.Trace._shared = None
+            shutil.rmtree(tmp)
+
+    def test_precompiled_header(self):
+        settings = pybuild.Settings()
+        settings.add_precompiled_header('pch.h', r'\.cpp$')
+        settings.add_precompiled_header('other.h')
+        settings = pybuild.Settings(settings)
+        self.assertEqual(settings.precompiled_header('a.cpp'), 'pch.h')
+        self.assertEqual(settings.precompiled_header('a.c'), 'other.h')
+
+        tmp = tempfile.mkdtemp()
+        try:
+            text = pybuild.TextFile(os.path.join(tmp, 'pch.h'), '#include "big.h"\n')
+            text.execute()
+            with open(text.product) as f:
+                self.assertEqual(f.read(), '#include "big.h"\n')
+            other = pybuild.TextFile(text.product, '#include "other.h"\n')
+            self.assertNotEqual(text.get_hash(), other.get_hash())
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_trace(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            self.assertIsNone(trace.Trace.shared())
+            trace.Trace._shared = trace.Trace(os.path.join(tmp, 'trace.json'))
+            with trace.phase('load projects', file='pam.py'):
+                pass
+            link = pybuild.Object(os.path.join(tmp, 'e'), 'true', ' [G++] e', pool='link')
+            link.execute()
+            trace.record(link, 3, 10.0, 10.5)
+            trace.Trace.shared().save()
+            with open(trace.Trace.shared().filename) as f:
+                events = [event for event in json.load(f)['traceEvents'] if event['ph'] == 'X']
+            self.assertEqual([event['name'] for event in events], ['load projects', '[G++] e'])
+            self.assertEqual(events[0]['args'], {'file': 'pam.py'})
+            self.assertEqual((events[1]['tid'], events[1]['ts'], events[1]['dur']), (4, 10000000, 500000))
+            self.assertEqual(events[1]['args'], {'product': link.product, 'type': 'link', 'exit': 0})
+        finally:
+            trace.Trace._shared = None
+            shutil.rmtree(tmp)
+
+    def test_stats(self):
+        self.assertIsNone(stats.Stats.shared())
+        stats.Stats._shared = stats.Stats()
+        try:
+            with stats.timed('hash'):
+                with stats.timed('hash'):
+                    pass
+            with trace.phase('check'):
+                pass
+            stats.count('regex', 2)
+            stats.count('regex')
+            report = stats.Stats.shared()
+            self.assertEqual(report.calls('hash')[0], 1)
+            self.assertEqual(report.calls('check')[0], 1)
+            self.assertEqual(report.counter('regex'), 3)
+            self.assertEqual([line.split()[0] for line in report.report()], ['metric', 'hash', 'check', 'regex'])
+        finally:
+            stats.Stats._shared = None
+
+    def test_slots_pools(self):
+        class Job(object):
+            def __init__(self, pool=None):
+                self.pool = pool
+
+        slots = Slots(4, pools={'link': 1})
+        link1, link2, compile = Job('link'), Job('link'), Job()
+        self.assertTrue(slots.acquire(link1))
+        self.assertFalse(slots.acquire(link2))
+        self.assertTrue(slots.acquire(compile))
+        self.assertEqual(slots.running, 2)
+        self.assertIs(slots.release(link1), link2)
+        self.assertTrue(slots.acquire(link2))
+
+    def test_slots_threads(self):
+        class Job(object):
+            def __init__(self, threads=1):
+                self.pool = None
+                self.threads = threads
+
+        slots = Slots(4)
+        compile, link = Job(), Job(threads=8)
+        self.assertTrue(slots.acquire(compile))
+        self.assertFalse(slots.available(link))
+        slots.release(compile)
+        self.assertTrue(slots.available(link))
+        self.assertTrue(slots.acquire(link))
+        self.assertEqual(slots.running, 4)
+        self.assertFalse(slots.available(compile))
+        slots.release(link)
+        self.assertEqual(slots.running, 0)
+
+    def test_slots_backoff(self):
+        slots = Slots(8)
+        for i in range(8):
+            self.assertTrue(slots.available())
+            slots.running += 1
+        self.assertFalse(slots.available())
+        slots.running -= 1
+        slots.backoff()
+        self.assertEqual(slots.limit, 4)
+        slots.running = 0
+        for i in range(4):
+            slots.succeeded()
+        self.assertEqual(slots.limit, 5)
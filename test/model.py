@@ -3,7 +3,15 @@ import sys
 import unittest
 import shutil
 import os
+import multiprocessing
+import subprocess
+import tempfile
+import build
+from build.features import pybuild as features
+from build.transform import make, pybuild
 from build.transform.toolchain import ToolchainLoader, ToolchainRegistry
+from build.transform.graph import BuildGraph
+from build.transform import timereport
 from build.model import CXXLibrary, CXXExecutable
 
 
@@ -74,3 +82,189 @@ class ModelTest(unittest.TestCase):
             exe.add_sources('test/src/test_cxx_dep_link.cpp')
             exe.add_dependency(lib)
             exe.transform(toolchain)
+
+    def test_cxxproject_lto(self):
+        for toolchain in ToolchainRegistry.this_system():
+            dep = CXXLibrary('test_cxxlib_lto_transitive-{}'.format(toolchain.name))
+            dep.add_sources('test/src/test_cxx_dep_transitive.cpp')
+            dep.use_feature('lto', mode='full')
+            dep.transform(toolchain)
+
+            lib = CXXLibrary('test_cxxlib_lto-{}'.format(toolchain.name))
+            lib.add_sources('test/src/test_cxx_dep.cpp')
+            lib.add_dependency(dep)
+            lib.use_feature('lto')
+            lib.transform(toolchain)
+
+            exe = CXXExecutable('test_cxxexe_lto-{}'.format(toolchain.name))
+            exe.add_sources('test/src/test_cxx_dep_link.cpp')
+            exe.add_dependency(lib)
+            exe.use_feature('lto')
+            exe.transform(toolchain)
+
+            # The link holds the job slots of the threads it runs
+            cxx_project = toolchain.generate(exe, toolchain)
+            if not cxx_project.objects:
+                # Generated for another build system
+                continue
+            self.assertEqual(cxx_project.job.threads, build.jobs or multiprocessing.cpu_count())
+
+    def test_clang_features(self):
+        toolchain = pybuild.CXXToolchain('test-clang')
+        features.ClangFeatureFactory().configure(toolchain)
+        self.assertIs(toolchain.find_feature('lto'), features.PyBuildLTO.CLANG)
+        self.assertIs(toolchain.find_feature('pgo'), features.PyBuildPGO.CLANG)
+        self.assertIs(toolchain.find_feature('time-trace'), features.PyBuildTimeTrace.CLANG)
+        self.assertIs(toolchain.find_feature('optimize'), features.PyBuildOptimize.GNU)
+
+    def test_cxxproject_pgo(self):
+        for toolchain in ToolchainRegistry.this_system():
+            lib = CXXLibrary('test_cxxlib_pgo-{}'.format(toolchain.name))
+            lib.add_sources('test/src/test_cxx_dep.cpp')
+            lib.add_sources('test/src/test_cxx_dep_transitive.cpp')
+            lib.transform(toolchain)
+
+            exe = CXXExecutable('test_cxxexe_pgo-{}'.format(toolchain.name))
+            exe.add_sources('test/src/test_cxx_dep_link.cpp')
+            exe.add_dependency(lib)
+            exe.use_profile_guided_optimization('{executable}')
+            exe.transform(toolchain)
+
+            cxx_project = toolchain.generate(exe, toolchain)
+            if not cxx_project.objects:
+                # Generated for another build system
+                continue
+            profile = os.path.join(cxx_project.output, 'pgo', 'profile')
+            objects = [obj for obj in cxx_project.objects if obj is not cxx_project.job]
+            self.assertTrue(objects)
+            for obj in objects:
+                self.assertIn(profile, obj.dependencies())
+            self.assertNotIn(toolchain.name + '-pgo', ToolchainRegistry.names())
+
+            # Training again with the same profile doesn't compile the sources again
+            exe.use_profile_guided_optimization('{executable} ')
+            cxx_project = toolchain.generate(exe, toolchain)
+            cxx_project.transform()
+            self.assertTrue(cxx_project.get_job(profile).completed)
+            self.assertFalse(any(obj.completed for obj in objects if obj is not cxx_project.job))
+
+    def test_cxxproject_time_trace(self):
+        timereport.TimeReport._shared = None
+        try:
+            for toolchain in ToolchainRegistry.this_system():
+                lib = CXXLibrary('test_cxxlib_time_trace-{}'.format(toolchain.name))
+                lib.add_sources('test/src/test_cxx_dep.cpp')
+                lib.use_feature('time-trace')
+                lib.transform(toolchain)
+            # Projects generated for make are compiled outside of pam
+            self.assertTrue(timereport.TimeReport.shared().units())
+        finally:
+            timereport.TimeReport._shared = None
+
+    def test_time_report_missing(self):
+        class Object(object):
+            def __init__(self, product, diagnostics):
+                self.product = product
+                self.diagnostics = diagnostics
+
+        class Project(object):
+            objects = [Object('a.o', ['TOTAL  :   0.45          0.25          0.74           35M']),
+                       Object('missing/b.o', [])]
+
+        report = timereport.TimeReport()
+        report.add(Project())
+        self.assertEqual(len(report.units()), 1)
+        self.assertIn('1 units without timing data, e.g. missing/b.o', report.report())
+
+    def test_time_report_trace(self):
+        def event(name, dur, detail=None):
+            return {'ph': 'X', 'name': name, 'dur': dur, 'args': {'detail': detail} if detail else {}}
+        unit = timereport.parse_trace('a.o', {'traceEvents': [
+            event('Source', 300000, 'a.h'), event('Source', 100000, 'b.h'), event('Total Source', 400000),
+            event('Frontend', 500000), event('Backend', 200000), event('ExecuteCompiler', 800000)]})
+        self.assertEqual((unit.total, unit.frontend, unit.backend), (0.8, 0.5, 0.2))
+        self.assertEqual(unit.headers, {'a.h': 0.3, 'b.h': 0.1})
+        unit = timereport.parse_report('b.o', [
+            'Time variable                                   usr           sys          wall           GGC',
+            'phase parsing                      :   0.31 ( 69%)   0.22 ( 88%)   0.54 ( 73%)    25M ( 73%)',
+            'phase opt and generate             :   0.08 ( 18%)   0.01 (  4%)   0.09 ( 12%)  3307k (  9%)',
+            '|name lookup                       :   0.07 ( 16%)   0.05 ( 20%)   0.15 ( 20%)  1474k (  4%)',
+            'TOTAL                              :   0.45          0.25          0.74           35M'])
+        self.assertEqual((unit.total, unit.frontend, unit.backend), (0.74, 0.54, 0.09))
+        self.assertIsNone(timereport.parse_report('c.o', ['warning: unused variable']))
+
+    def test_cxxproject_external_libraries(self):
+        for toolchain in ToolchainRegistry.this_system():
+            lib = CXXLibrary('test_cxxlib_external-{}'.format(toolchain.name))
+            lib.add_sources('test/src/test_cxx_dep.cpp')
+
+            exe = CXXExecutable('test_cxxexe_external-{}'.format(toolchain.name))
+            exe.add_sources('test/src/test_cxx_dep_link.cpp')
+            exe.add_dependency(lib)
+            cxx_project = toolchain.generate(exe, toolchain)
+            if not cxx_project.objects:
+                # Generated for another build system
+                continue
+            self.assertEqual(cxx_project.external_libraries, [])
+            exe.add_library('m')
+            self.assertEqual(toolchain.generate(exe, toolchain).external_libraries, ['m'])
+
+    def test_cxxproject_precompiled_headers(self):
+        directory = tempfile.mkdtemp()
+        try:
+            headers = []
+            for name in ['a', 'b']:
+                os.mkdir(os.path.join(directory, name))
+                headers.append(os.path.join(directory, name, 'pch.h'))
+                with open(headers[-1], 'w') as f:
+                    f.write('#define PCH_{} 1\n'.format(name.upper()))
+            for toolchain in ToolchainRegistry.this_system():
+                lib = CXXLibrary('test_cxxlib_pch-{}'.format(toolchain.name))
+                lib.add_sources('test/src/test_cxx_dep.cpp')
+                lib.add_sources('test/src/test_cxx_dep_transitive.cpp')
+                lib.use_feature('precompiled-header', header=headers[0], sources=r'dep\.cpp$')
+                lib.use_feature('precompiled-header', header=headers[1], sources=r'transitive\.cpp$')
+                cxx_project = toolchain.generate(lib, toolchain)
+                if not cxx_project.objects:
+                    # Generated for another build system
+                    continue
+                # Headers of the same name are precompiled separately
+                pchs = [obj for obj in cxx_project.objects if obj.product.endswith('.gch')]
+                self.assertEqual(len(pchs), 2)
+                for header in headers:
+                    self.assertEqual(len([pch for pch in pchs if header in pch.dependencies()]), 1)
+                cxx_project.transform()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_make_printf_format(self):
+        text = "#define A '%d' \\\n$(HOME) \"$x\"\n"
+        directory = tempfile.mkdtemp()
+        try:
+            makefile = os.path.join(directory, 'Makefile')
+            product = os.path.join(directory, 'text')
+            with open(makefile, 'w') as f:
+                f.write('all:\n\t@printf {} > {}\n'.format(make.printf_format(text), product))
+            subprocess.check_call(['make', '-s', '-f', makefile])
+            with open(product) as f:
+                self.assertEqual(f.read(), text)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cxxproject_global_graph(self):
+        graph = BuildGraph()
+        for toolchain in ToolchainRegistry.this_system():
+            dep = CXXLibrary('test_cxxlib_graph_transitive-{}'.format(toolchain.name))
+            dep.add_sources('test/src/test_cxx_dep_transitive.cpp')
+            toolchain.schedule(dep, graph)
+
+            lib = CXXLibrary('test_cxxlib_graph-{}'.format(toolchain.name))
+            lib.add_sources('test/src/test_cxx_dep.cpp')
+            lib.add_dependency(dep)
+            toolchain.schedule(lib, graph)
+
+            exe = CXXExecutable('test_cxxexe_graph-{}'.format(toolchain.name))
+            exe.add_sources('test/src/test_cxx_dep_link.cpp')
+            exe.add_dependency(lib)
+            toolchain.schedule(exe, graph)
+        graph.transform()
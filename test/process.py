@@ -0,0 +1,63 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from build.transform import process
+
+
+class ProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = process.Engine()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def python(self, code):
+        return '{} -c "{}"'.format(sys.executable, code)
+
+    def test_process_split(self):
+        self.assertEqual(process.split('gcc -c "a b.c" -o a.o'), ['gcc', '-c', 'a b.c', '-o', 'a.o'])
+        self.assertEqual(process.split('mkdir -p "output/x"'), ['mkdir', '-p', 'output/x'])
+        for cmdline in ['cd x && make', 'cat a > b', 'ls *.c', 'CC=gcc make', 'echo $HOME', 'exit 1', '']:
+            self.assertIsNone(process.split(cmdline), cmdline)
+
+    def test_process_run(self):
+        rc, stdout, stderr = self.engine.run(self.python('import sys; print(1); sys.stderr.write(\'2\\n\'); sys.exit(3)'))
+        self.assertEqual((rc, stdout, stderr), (3, ['1'], ['2']))
+        rc, stdout, _ = self.engine.run('echo a b | tr a c')
+        self.assertEqual((rc, stdout), (0, ['c b']))
+        self.assertEqual((self.engine.spawned, self.engine.shells), (2, 2))
+        rc, _, stderr = self.engine.run('no-such-program --version')
+        self.assertEqual(rc, 127)
+
+    def test_process_log(self):
+        log = os.path.join(self.directory, 'job.log')
+        self.engine.limit = 1000
+        rc, stdout, _ = self.engine.run(self.python('print(\'x\' * 99999)'), log=log)
+        self.assertEqual(rc, 0)
+        self.assertEqual(stdout, ['x' * 1000, '... 99000 more bytes, see ' + log])
+        with open(log) as f:
+            self.assertEqual(f.read().strip(), 'x' * 99999)
+        # A log isn't left behind by a later run without output
+        self.engine.run('true', log=log)
+        self.assertFalse(os.path.exists(log))
+
+    def test_process_echo(self):
+        lines = []
+        self.engine.run(self.python('print(1); print(2)'), echo=lambda format, line: lines.append(line))
+        self.assertEqual(lines, ['1', '2'])
+
+    def test_process_parallel(self):
+        results = {}
+        def run(index):
+            results[index] = self.engine.run('echo {}'.format(index))
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((index, (0, [str(index)], [])) for index in range(32)))
+        self.assertEqual(self.engine.shells, 0)
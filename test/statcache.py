@@ -0,0 +1,149 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import build
+from build.transform.pybuild import Source
+from build.transform.statcache import StatCache
+from build.transform.contenthash import ContentHashes
+
+
+class StatCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ('a.h', 'b.h'):
+            self.touch(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def touch(self, name):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(name)
+        return filename
+
+    def test_statcache_counters(self):
+        cache = StatCache()
+        a = os.path.join(self.directory, 'a.h')
+        self.assertIsNotNone(cache.stat(a))
+        self.assertEqual((cache.hits, cache.misses, cache.scans), (0, 1, 1))
+        for i in range(10):
+            self.assertEqual(cache.stat(a), cache.stat(a))
+            self.assertTrue(cache.exists(os.path.join(self.directory, 'b.h')))
+            self.assertFalse(cache.exists(os.path.join(self.directory, 'c.h')))
+        self.assertEqual(cache.scans, 1)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hits, 39)
+
+    def test_statcache_invalidate(self):
+        cache = StatCache()
+        c = os.path.join(self.directory, 'c.h')
+        d = os.path.join(self.directory, 'd.h')
+        self.assertFalse(cache.exists(c))
+        self.touch('c.h')
+        self.touch('d.h')
+        self.assertFalse(cache.exists(c))
+        cache.invalidate(c)
+        self.assertTrue(cache.exists(c))
+        # Files written next to an invalidated product are found as well
+        self.assertTrue(cache.exists(d))
+
+    def test_statcache_new_directory(self):
+        cache = StatCache()
+        subdir = os.path.join(self.directory, 'sub')
+        e = os.path.join(subdir, 'e.h')
+        self.assertFalse(cache.exists(subdir))
+        self.assertFalse(cache.exists(e))
+        os.mkdir(subdir)
+        cache.invalidate(subdir)
+        self.assertTrue(cache.exists(subdir))
+        self.touch(os.path.join('sub', 'e.h'))
+        cache.invalidate(e)
+        self.assertTrue(cache.exists(e))
+
+
+class ContentHashesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.table = os.path.join(self.directory, 'hashes')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data, age=3600):
+        # Files are dated back, those just written aren't remembered
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(data)
+        # Whole seconds survive setting the time back exactly
+        mtime = int(time.time()) - age
+        os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_contenthash_fingerprint(self):
+        a = self.write('a.h', 'int a;')
+        hashes = ContentHashes(self.table)
+        digest = hashes.digest(a, os.stat(a))
+        self.assertEqual(hashes.digest(a, os.stat(a)), digest)
+        self.assertEqual(hashes.hashed, 1)
+        hashes.save()
+
+        hashes = ContentHashes(self.table)
+        self.assertEqual(hashes.digest(a, os.stat(a)), digest)
+        self.assertEqual(hashes.hashed, 0)
+
+        # Touched, read again but the digest is unchanged
+        st = os.stat(a)
+        os.utime(a, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(hashes.digest(a, os.stat(a)), digest)
+        self.assertEqual(hashes.hashed, 1)
+        self.write('a.h', 'int b;')
+        os.utime(a, (st.st_atime, st.st_mtime + 20))
+        self.assertNotEqual(hashes.digest(a, os.stat(a)), digest)
+
+    def test_contenthash_racy(self):
+        # Rewritten within the same timestamp tick, with the same size
+        a = self.write('a.h', 'int a;', age=0)
+        st = os.stat(a)
+        hashes = ContentHashes(self.table)
+        digest = hashes.digest(a, st)
+        self.write('a.h', 'int b;', age=0)
+        os.utime(a, (st.st_atime, st.st_mtime))
+        self.assertEqual(ContentHashes._fingerprint(os.stat(a)), ContentHashes._fingerprint(st))
+        self.assertNotEqual(hashes.digest(a, os.stat(a)), digest)
+        hashes.save()
+        self.assertFalse(os.path.exists(self.table))
+
+    def test_contenthash_source(self):
+        a = self.write('a.h', 'int a;', age=0)
+        st = os.stat(a)
+        build.content_hash = True
+        ContentHashes._shared = ContentHashes(self.table)
+        try:
+            StatCache.reset()
+            digest = Source(a).get_hash()
+            # Rewritten within the same tick, the source is still changed
+            self.write('a.h', 'int b;', age=0)
+            os.utime(a, (st.st_atime, st.st_mtime))
+            StatCache.reset()
+            self.assertNotEqual(Source(a).get_hash(), digest)
+        finally:
+            build.content_hash = False
+            ContentHashes._shared = None
+            StatCache.reset()
+
+    def test_contenthash_prefetch(self):
+        files = []
+        for i in range(4):
+            filename = self.write('large{}.h'.format(i), str(i) * ContentHashes.large)
+            files.append((filename, os.stat(filename)))
+        small = self.write('small.h', 'small')
+        files.append((small, os.stat(small)))
+        hashes = ContentHashes(self.table)
+        hashes.prefetch(files)
+        self.assertEqual(hashes.hashed, 4)
+        digests = [hashes.digest(filename, st) for filename, st in files]
+        self.assertEqual(hashes.hashed, 5)
+        self.assertEqual(len(set(digests)), 5)
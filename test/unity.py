@@ -0,0 +1,93 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from build import model
+from build.transform import unity
+from build.transform.statcache import StatCache
+
+
+class Tool(object):
+    def __init__(self, unity):
+        self.unity = unity
+
+
+class Attributes(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_project_output(self, project):
+        return os.path.join(self.directory, project.name)
+
+
+class Toolchain(object):
+    def __init__(self, directory):
+        self.name = 'test'
+        self.attributes = Attributes(directory)
+
+    def get_tool(self, tool):
+        return Tool(tool != '.s')
+
+
+class UnityTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.toolchain = Toolchain(self.directory)
+        unity.Edits._shared = unity.Edits(os.path.join(self.directory, '.unity_edits'))
+        StatCache.reset()
+
+    def tearDown(self):
+        unity.Edits._shared = None
+        StatCache.reset()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(data)
+        return filename
+
+    def project(self, names, **kwargs):
+        project = model.CXXLibrary('unity')
+        project.add_sources(self.directory, files=[self.write(name, name) for name in names])
+        project.use_unity_build(**kwargs)
+        return project
+
+    def batches(self, project):
+        batches, singles = unity.batches(self.toolchain, project, project, project.sources)
+        return ([[os.path.basename(source.path) for source in batch.sources] for batch in batches],
+                sorted(os.path.basename(source.path) for source in singles))
+
+    def test_unity_batches(self):
+        project = self.project(['a.cpp', 'b.cpp', 'c.cpp', 'x.cpp', 'd.c', 'e.c', 'f.s', 'g.c'],
+                               batch=2, exclude=r'x\.cpp$')
+        self.assertEqual(self.batches(project), ([['a.cpp', 'b.cpp'], ['d.c', 'e.c']], ['c.cpp', 'f.s', 'g.c', 'x.cpp']))
+        batches, _ = unity.batches(self.toolchain, project, project, project.sources)
+        source = batches[0].write()
+        self.assertEqual(source.tool, '.cpp')
+        with open(source.path) as f:
+            self.assertEqual(f.read(), '#include "{}"\n#include "{}"\n'.format(
+                os.path.join(self.directory, 'a.cpp'), os.path.join(self.directory, 'b.cpp')))
+        self.assertFalse(unity.update(source.path, batches[0].text))
+
+    def test_unity_filter(self):
+        project = self.project(['a.cpp', 'b.cpp'], filter='other')
+        self.assertEqual(self.batches(project), ([], ['a.cpp', 'b.cpp']))
+
+    def test_unity_frequent_edits(self):
+        project = self.project(['a.cpp', 'b.cpp', 'c.cpp', 'd.cpp'], batch=2)
+        self.assertEqual(self.batches(project), ([['a.cpp', 'b.cpp'], ['c.cpp', 'd.cpp']], []))
+        for edit in range(2):
+            now = time.time() - 10 + edit
+            os.utime(os.path.join(self.directory, 'a.cpp'), (now, now))
+            os.utime(os.path.join(self.directory, 'c.cpp'), (0, edit))
+            StatCache.reset()
+            batches = self.batches(project)
+        # Only a.cpp was edited recently, the other batch stays intact
+        self.assertEqual(batches, ([['c.cpp', 'd.cpp']], ['a.cpp', 'b.cpp']))
+
+        unity.Edits.shared().save()
+        edits = unity.Edits(unity.Edits.shared().path)
+        self.assertTrue(edits.frequent(os.path.join(self.directory, 'a.cpp'), 60))
+        self.assertFalse(edits.frequent(os.path.join(self.directory, 'c.cpp'), 60))
@@ -2,6 +2,7 @@ from build.transform import xcbuild
 from build.transform.toolchain import ToolchainExtender
 from build.tools import clang
 from build.features.pybuild import *
+from build.features.xcbuild import *
 from build.requirement import HostRequirement
 
 
@@ -11,6 +12,7 @@ xcbuild.add_tool('.cc', clang.XcBuildCXXCompiler('c++'))
 xcbuild.add_tool('.cpp', clang.XcBuildCXXCompiler('c++'))
 xcbuild.add_tool('.cxx', clang.XcBuildCXXCompiler('c++'))
 xcbuild.add_requirement(HostRequirement.DARWIN)
+xcbuild.add_feature(XcBuildPrecompiledHeader(), 'precompiled-header')
 #xcbuild.add_feature(PyBuildCustomCFlag('-std=c89'), 'language-c89')
 #cbuild.add_feature(PyBuildCustomCFlag('-std=c99'), 'language-c99')
 #xcbuild.add_feature(PyBuildCustomCFlag('-std=c11'), 'language-c11')
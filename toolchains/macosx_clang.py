@@ -18,6 +18,9 @@ macosx.add_feature(PyBuildCustomCXXFlag.CXX11, 'language-c++11')
 macosx.add_feature(PyBuildCustomCXXFlag.CXX14, 'language-c++14')
 macosx.add_feature(PyBuildCustomCXXFlag.CXX17, 'language-c++17')
 macosx.add_feature(PyBuildOptimize.GNU, 'optimize')
+macosx.add_feature(PyBuildLTO.DARWIN, 'lto')
+macosx.add_feature(PyBuildPGO.DARWIN, 'pgo')
+macosx.add_feature(PyBuildTimeTrace.CLANG, 'time-trace')
 macosx.add_feature(PyBuildProjectMacros.GNU)
 macosx.add_feature(PyBuildProjectIncPaths.GNU)
 macosx.add_feature(PyBuildProjectLibPaths.GNU)
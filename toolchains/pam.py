@@ -1,4 +1,4 @@
-from build.tools import gnu, msvc
+from build.tools import clang, gnu, msvc
 import build.features.pybuild as pybuild
 from build.transform.toolchain import *
 import build.transform.pybuild as pybuildtc
@@ -13,9 +13,14 @@ def pam_gnu_toolchain(
     prefix=None,
     path=None,
     sysroot=None,
+    compiler='gcc',
 ):
     if inherits:
         tc = ToolchainRegistry.find(inherits)
+    elif compiler == 'clang':
+        tc = pybuildtc.CXXToolchain(name)
+        clang.ClangToolFactory(prefix=prefix, path=path).configure(tc)
+        pybuild.ClangFeatureFactory().configure(tc)
     else:
         tc = pybuildtc.CXXToolchain(name)
         gnu.GNUToolFactory(prefix=prefix, path=path).configure(tc)
@@ -89,6 +89,8 @@ win_x86_vs12_msbuild.add_feature(FeatureError('c++11 is not supported by vs12'),
 win_x86_vs12_msbuild.add_feature(FeatureError('c++14 is not supported by vs12'), 'language-c++14')
 win_x86_vs12_msbuild.add_feature(FeatureError('c++17 is not supported by vs12'), 'language-c++17')
 win_x86_vs12_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x86_vs12_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x86_vs12_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x86_vs12_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x86_vs12_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x86_vs12_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -113,6 +115,8 @@ win_x64_vs12_msbuild.add_feature(FeatureError('c++11 is not supported by vs12'),
 win_x64_vs12_msbuild.add_feature(FeatureError('c++14 is not supported by vs12'), 'language-c++14')
 win_x64_vs12_msbuild.add_feature(FeatureError('c++17 is not supported by vs12'), 'language-c++17')
 win_x64_vs12_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x64_vs12_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x64_vs12_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x64_vs12_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x64_vs12_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x64_vs12_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -138,6 +142,8 @@ win_x86_vs14_msbuild.add_requirement(_vs14_path_req)
 win_x86_vs14_msbuild.add_feature(FeatureError('c++14 is not supported by vs14'), 'language-c++14')
 win_x86_vs14_msbuild.add_feature(FeatureError('c++17 is not supported by vs14'), 'language-c++17')
 win_x86_vs14_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x86_vs14_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x86_vs14_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x86_vs14_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x86_vs14_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x86_vs14_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -161,6 +167,8 @@ win_x64_vs14_msbuild.add_requirement(_vs14_path_req)
 win_x64_vs14_msbuild.add_feature(FeatureError('c++14 is not supported by vs14'), 'language-c++14')
 win_x64_vs14_msbuild.add_feature(FeatureError('c++17 is not supported by vs14'), 'language-c++17')
 win_x64_vs14_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x64_vs14_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x64_vs14_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x64_vs14_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x64_vs14_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x64_vs14_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -185,6 +193,8 @@ win_x86_vs15_msbuild.add_requirement(_vs15_path_req)
 win_x86_vs15_msbuild.add_feature(FeatureError('c++14 is not supported by vs15'), 'language-c++14')
 win_x86_vs15_msbuild.add_feature(FeatureError('c++17 is not supported by vs15'), 'language-c++17')
 win_x86_vs15_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x86_vs15_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x86_vs15_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x86_vs15_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x86_vs15_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x86_vs15_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -207,6 +217,8 @@ win_x64_vs15_msbuild.add_requirement(_vs15_path_req)
 win_x64_vs15_msbuild.add_feature(FeatureError('c++14 is not supported by vs15'), 'language-c++14')
 win_x64_vs15_msbuild.add_feature(FeatureError('c++17 is not supported by vs15'), 'language-c++17')
 win_x64_vs15_msbuild.add_feature(MSBuildOptimize.MSVC, 'optimize')
+win_x64_vs15_msbuild.add_feature(MSBuildLTO.MSVC, 'lto')
+win_x64_vs15_msbuild.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 win_x64_vs15_msbuild.add_feature(MSBuildProjectMacros.MSVC)
 win_x64_vs15_msbuild.add_feature(MSBuildProjectIncPaths.MSVC)
 win_x64_vs15_msbuild.add_feature(MSBuildProjectLibPaths.MSVC)
@@ -224,6 +236,7 @@ pam_vs12.add_feature(FeatureError('c++11 is not supported by vs12'), 'language-c
 pam_vs12.add_feature(FeatureError('c++14 is not supported by vs12'), 'language-c++14')
 pam_vs12.add_feature(FeatureError('c++17 is not supported by vs12'), 'language-c++17')
 pam_vs12.add_feature(PyBuildOptimize.MSVC, 'optimize')
+pam_vs12.add_feature(PyBuildLTO.MSVC, 'lto')
 pam_vs12.add_feature(PyBuildProjectMacros.MSVC)
 pam_vs12.add_feature(PyBuildProjectIncPaths.MSVC)
 pam_vs12.add_feature(PyBuildProjectLibPaths.MSVC)
@@ -259,6 +272,7 @@ pam_vs14.add_requirement(_vs14_path_req)
 pam_vs14.add_feature(FeatureError('c++14 is not supported by vs12'), 'language-c++14')
 pam_vs14.add_feature(FeatureError('c++17 is not supported by vs12'), 'language-c++17')
 pam_vs14.add_feature(PyBuildOptimize.MSVC, 'optimize')
+pam_vs14.add_feature(PyBuildLTO.MSVC, 'lto')
 pam_vs14.add_feature(PyBuildProjectMacros.MSVC)
 pam_vs14.add_feature(PyBuildProjectIncPaths.MSVC)
 pam_vs14.add_feature(PyBuildProjectLibPaths.MSVC)
@@ -294,6 +308,7 @@ pam_vs15.add_requirement(_vs15_path_req)
 pam_vs15.add_feature(FeatureError('c++14 is not supported by vs12'), 'language-c++14')
 pam_vs15.add_feature(FeatureError('c++17 is not supported by vs12'), 'language-c++17')
 pam_vs15.add_feature(PyBuildOptimize.MSVC, 'optimize')
+pam_vs15.add_feature(PyBuildLTO.MSVC, 'lto')
 pam_vs15.add_feature(PyBuildProjectMacros.MSVC)
 pam_vs15.add_feature(PyBuildProjectIncPaths.MSVC)
 pam_vs15.add_feature(PyBuildProjectLibPaths.MSVC)
@@ -337,6 +352,7 @@ vs14_clang.add_feature(PyBuildCustomCXXFlag('-std=c++11'), 'language-c++11')
 vs14_clang.add_feature(PyBuildCustomCXXFlag('-std=c++14'), 'language-c++14')
 vs14_clang.add_feature(PyBuildCustomCXXFlag('-std=c++17'), 'language-c++17')
 vs14_clang.add_feature(PyBuildOptimize.GNU, 'optimize')
+vs14_clang.add_feature(PyBuildPrecompiledHeader(), 'precompiled-header')
 vs14_clang.add_feature(PyBuildProjectMacros.GNU)
 vs14_clang.add_feature(PyBuildProjectIncPaths.GNU)
 vs14_clang.add_feature(PyBuildProjectLibPaths.GNU)
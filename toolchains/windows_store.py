@@ -68,6 +68,8 @@ winstore_x86_vs14.add_feature(NoPrecompiledHeader())
 winstore_x86_vs14.add_feature(FeatureError('c++14 is not supported by vs14'), 'c++14')
 winstore_x86_vs14.add_feature(FeatureError('c++17 is not supported by vs14'), 'c++17')
 winstore_x86_vs14.add_feature(MSBuildOptimize.MSVC, 'optimize')
+winstore_x86_vs14.add_feature(MSBuildLTO.MSVC, 'lto')
+winstore_x86_vs14.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 winstore_x86_vs14.add_requirement(HostRequirement.WINDOWS)
 winstore_x86_vs14.add_requirement(PathRequirement(_vs14_x86_vars._scripts))
 winstore_x86_vs14.add_feature(MSBuildProjectMacros.MSVC)
@@ -95,6 +97,8 @@ winstore_arm_vs14.add_feature(NoPrecompiledHeader())
 winstore_arm_vs14.add_feature(FeatureError('c++14 is not supported by vs14'), 'c++14')
 winstore_arm_vs14.add_feature(FeatureError('c++17 is not supported by vs14'), 'c++17')
 winstore_arm_vs14.add_feature(MSBuildOptimize.MSVC, 'optimize')
+winstore_arm_vs14.add_feature(MSBuildLTO.MSVC, 'lto')
+winstore_arm_vs14.add_feature(MSBuildPrecompiledHeader.MSVC, 'precompiled-header')
 winstore_arm_vs14.add_requirement(HostRequirement.WINDOWS)
 winstore_arm_vs14.add_requirement(PathRequirement(_vs14_arm_vars._scripts))
 winstore_arm_vs14.add_feature(MSBuildProjectMacros.MSVC)